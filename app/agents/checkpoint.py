@@ -0,0 +1,118 @@
+# app/agents/checkpoint.py
+"""
+Checkpointer durable para el grafo del analizador.
+
+Guarda el estado tras cada nodo en un SQLite local, indexado por `thread_id`.
+Si un análisis falla (p. ej. en `preparacion_resultado` después de varias
+llamadas al LLM), reintentar con el mismo `thread_id` reanuda desde el último
+nodo completado en lugar de empezar otra vez desde `decicion_node`.
+
+El estado se codifica en msgpack con JsonPlusSerializer, lo que conserva las
+claves tupla del AST. Los valores que msgpack no soporta (p. ej. expresiones
+sympy devueltas por `resolver_sumatorias`) caen a pickle.
+
+Los análisis que terminan bien borran su checkpoint. Los que fallan y no se
+reanudan se borran cuando pasan CHECKPOINT_TTL_SECONDS desde su último
+intento (la limpieza corre al registrar un análisis, como máximo una vez
+por minuto).
+
+Variables de entorno:
+    CHECKPOINTER=none | sqlite     (por defecto none: no escribe a disco)
+    CHECKPOINT_DB=.cache/checkpoints.sqlite3
+    CHECKPOINT_TTL_SECONDS=86400
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+_checkpointer: Optional[Any] = None
+_checkpointer_lock = threading.Lock()
+_last_prune = 0.0
+
+
+def get_checkpointer():
+    """
+    Retorna el checkpointer SQLite del proceso, o None si está desactivado.
+
+    La conexión se comparte entre hilos (FastAPI ejecuta los endpoints
+    síncronos en un threadpool); SqliteSaver serializa el acceso internamente.
+    """
+    global _checkpointer
+    if (os.getenv("CHECKPOINTER", "none") or "none").lower() != "sqlite":
+        return None
+    if _checkpointer is None:
+        with _checkpointer_lock:
+            if _checkpointer is None:
+                # Import perezoso: langgraph-checkpoint-sqlite es un paquete aparte
+                from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+                from langgraph.checkpoint.sqlite import SqliteSaver
+
+                path = Path(os.getenv("CHECKPOINT_DB", ".cache/checkpoints.sqlite3"))
+                path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                saver = SqliteSaver(conn, serde=JsonPlusSerializer(pickle_fallback=True))
+                saver.setup()
+                # Último intento de cada análisis, para borrar los abandonados
+                with saver.lock, conn:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS analysis_threads "
+                        "(thread_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+                    )
+                _checkpointer = saver
+    return _checkpointer
+
+
+def _prune(saver, now: float) -> None:
+    """Borra los checkpoints de análisis sin actividad en CHECKPOINT_TTL_SECONDS."""
+    global _last_prune
+    if now - _last_prune < 60:
+        return
+    _last_prune = now
+    ttl = float(os.getenv("CHECKPOINT_TTL_SECONDS", "86400"))
+    with saver.lock:
+        expired = [
+            row[0] for row in saver.conn.execute(
+                "SELECT thread_id FROM analysis_threads WHERE updated_at < ?", (now - ttl,)
+            )
+        ]
+    for thread_id in expired:
+        delete_thread(thread_id)
+
+
+def track_thread(thread_id: str) -> None:
+    """Registra un intento del análisis `thread_id` y limpia los vencidos."""
+    saver = get_checkpointer()
+    if saver is None:
+        return
+    now = time.time()
+    with saver.lock, saver.conn:
+        saver.conn.execute(
+            "INSERT OR REPLACE INTO analysis_threads (thread_id, updated_at) VALUES (?, ?)",
+            (thread_id, now),
+        )
+    _prune(saver, now)
+
+
+def delete_thread(thread_id: str) -> None:
+    """Borra el checkpoint de un análisis (terminado o vencido)."""
+    saver = get_checkpointer()
+    if saver is None:
+        return
+    saver.delete_thread(thread_id)
+    with saver.lock, saver.conn:
+        saver.conn.execute("DELETE FROM analysis_threads WHERE thread_id = ?", (thread_id,))
+
+
+def thread_config(thread_id: str) -> dict:
+    """Config de LangGraph para un análisis identificado por `thread_id`."""
+    return {"configurable": {"thread_id": thread_id}}
+
+
+__all__ = ["get_checkpointer", "track_thread", "delete_thread", "thread_config"]
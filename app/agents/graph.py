@@ -3,7 +3,9 @@ Definición del grafo de LangGraph para el analizador de complejidad.
 Implementa flujos bifurcados para algoritmos iterativos y recursivos.
 """
 from app.agents.nodes import *
+from app.agents.checkpoint import get_checkpointer
 from app.agents.state import AnalyzerState
+from app.constants import env_flag
 from langgraph.graph import StateGraph, START, END
 
 
@@ -18,6 +20,10 @@ def create_nodes(graph: StateGraph[AnalyzerState]) -> StateGraph[AnalyzerState]:
         - validate_node: Valida y corrige sintaxis
         - generate_ast: Genera AST y detecta modo (iterativo/recursivo)
         - preparacion_resultado: Genera resultado final
+        - fused_front: (FUSED_FRONTEND=1) reemplaza decicion_node y
+          code_description/parse_code en una sola llamada
+        - speculative_front: (SPECULATIVE_FRONTEND=1) decicion_node con el
+          sucesor probable ejecutándose en paralelo
     
     Nodos iterativos:
         - calcular_costo_temporal_iterativo
@@ -29,9 +35,14 @@ def create_nodes(graph: StateGraph[AnalyzerState]) -> StateGraph[AnalyzerState]:
         - calcular_costo_espacial_recursivo: Analiza pila y auxiliar
     """
     # Nodos compartidos
-    graph.add_node("decicion_node", initial_decision_node)
-    graph.add_node("code_description", code_description_node)
-    graph.add_node("parse_code", parse_code_node)
+    if env_flag("FUSED_FRONTEND"):
+        graph.add_node("fused_front", fused_front_node)
+    elif env_flag("SPECULATIVE_FRONTEND"):
+        graph.add_node("speculative_front", speculative_front_node)
+    else:
+        graph.add_node("decicion_node", initial_decision_node)
+        graph.add_node("code_description", code_description_node)
+        graph.add_node("parse_code", parse_code_node)
     graph.add_node("validate_node", validate_node)
     graph.add_node("generate_ast", generate_ast_node)
     graph.add_node("preparacion_resultado", result_node)
@@ -55,6 +66,12 @@ def create_edges(graph: StateGraph[AnalyzerState]) -> StateGraph[AnalyzerState]:
     Flujo principal:
         START → decicion_node → [code_description | parse_code] → validate_node
               → generate_ast → [ITERATIVO | RECURSIVO] → preparacion_resultado → END
+
+    Flujo principal fusionado (FUSED_FRONTEND=1):
+        START → fused_front → validate_node → generate_ast → ...
+
+    Flujo principal especulativo (SPECULATIVE_FRONTEND=1):
+        START → speculative_front → validate_node → generate_ast → ...
     
     Flujo iterativo:
         generate_ast → costo_temporal_iterativo → costo_espacial_iterativo → resultado
@@ -63,25 +80,34 @@ def create_edges(graph: StateGraph[AnalyzerState]) -> StateGraph[AnalyzerState]:
         generate_ast → build_recurrence → costo_temporal_recursivo 
                      → costo_espacial_recursivo → resultado
     """
-    # Entrada inicial
-    graph.add_edge(START, "decicion_node")
-    
-    # Decisión: ¿Es pseudocódigo o lenguaje natural?
-    def is_pseudocode(state: AnalyzerState) -> bool:
-        return state.get("pseudocode", "") != ""
+    if env_flag("FUSED_FRONTEND"):
+        # Una sola llamada clasifica, genera/describe el código y fija el modo
+        graph.add_edge(START, "fused_front")
+        graph.add_edge("fused_front", "validate_node")
+    elif env_flag("SPECULATIVE_FRONTEND"):
+        # Decisión y sucesor adivinado en paralelo dentro de un solo nodo
+        graph.add_edge(START, "speculative_front")
+        graph.add_edge("speculative_front", "validate_node")
+    else:
+        # Entrada inicial
+        graph.add_edge(START, "decicion_node")
 
-    graph.add_conditional_edges(
-        "decicion_node",
-        is_pseudocode,
-        {
-            True: "code_description",
-            False: "parse_code",
-        },
-    )
+        # Decisión: ¿Es pseudocódigo o lenguaje natural?
+        def is_pseudocode(state: AnalyzerState) -> bool:
+            return state.get("pseudocode", "") != ""
 
-    # Ambos flujos convergen en validación
-    graph.add_edge("code_description", "validate_node")
-    graph.add_edge("parse_code", "validate_node")
+        graph.add_conditional_edges(
+            "decicion_node",
+            is_pseudocode,
+            {
+                True: "code_description",
+                False: "parse_code",
+            },
+        )
+
+        # Ambos flujos convergen en validación
+        graph.add_edge("code_description", "validate_node")
+        graph.add_edge("parse_code", "validate_node")
     
     # Validación → Generación de AST
     graph.add_edge("validate_node", "generate_ast")
@@ -151,6 +177,16 @@ def build_graph() -> StateGraph[AnalyzerState]:
     return graph
 
 
+def compile_graph():
+    """
+    Compila el grafo con el checkpointer durable (si está activo).
+
+    `build_graph()` se mantiene sin compilar para `langgraph dev`, que aporta
+    su propia persistencia.
+    """
+    return build_graph().compile(checkpointer=get_checkpointer())
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # DIAGRAMA DEL GRAFO (para referencia)
 # ═══════════════════════════════════════════════════════════════════════════════
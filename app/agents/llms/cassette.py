@@ -0,0 +1,188 @@
+"""
+Grabación y reproducción de llamadas al LLM (cassettes).
+
+    LLM_RECORD=1          graba cada llamada de `invoke_llm`/`stream_llm` hecha
+                          con el proveedor real.
+    LLM_PROVIDER=replay   sirve las respuestas grabadas, sin red ni API key.
+                          Una llamada no grabada falla con CassetteMissError
+                          y el nodo usa su fallback determinístico.
+    LLM_CASSETTE_DIR=cassettes
+
+La clave de cada llamada es (nodo, schema, tools, mensajes); el modelo no
+forma parte de la clave, así que una grabación sirve con cualquier ruteo.
+Cada llamada se guarda en `<dir>/<nodo>__<hash>.json`.
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Iterator, Optional, Sequence, Type
+
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    message_to_dict,
+    messages_from_dict,
+)
+from pydantic import BaseModel
+
+from app.agents.llms.providers import provider_name
+from app.constants import env_flag
+
+_write_lock = threading.Lock()
+
+
+class CassetteMissError(LookupError):
+    """No hay respuesta grabada para la llamada."""
+
+
+def replaying() -> bool:
+    return provider_name() == "replay"
+
+
+def recording() -> bool:
+    return env_flag("LLM_RECORD") and not replaying()
+
+
+def cassette_dir() -> str:
+    return os.getenv("LLM_CASSETTE_DIR", "cassettes")
+
+
+def _message_key(message: Any) -> Dict[str, Any]:
+    # Sin ids: cambian entre ejecuciones
+    if isinstance(message, BaseMessage):
+        out: Dict[str, Any] = {"type": message.type, "content": message.content}
+        if getattr(message, "tool_calls", None):
+            out["tool_calls"] = [{"name": c["name"], "args": c["args"]} for c in message.tool_calls]
+        return out
+    return {"content": str(message)}
+
+
+def cassette_key(
+    node: str, schema: Optional[Type[BaseModel]], tools: Optional[Sequence[Any]], messages: list
+) -> str:
+    payload = {
+        "node": node,
+        "schema": schema.__name__ if schema is not None else None,
+        "tools": sorted(getattr(t, "name", str(t)) for t in (tools or [])),
+        "messages": [_message_key(m) for m in messages],
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _path(node: str, key: str) -> str:
+    return os.path.join(cassette_dir(), f"{node or 'llm'}__{key[:24]}.json")
+
+
+def _save(node: str, key: str, entry: Dict[str, Any]) -> None:
+    path = _path(node, key)
+    with _write_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, indent=2, default=str)
+        os.replace(tmp, path)
+
+
+def _load(node: str, key: str) -> Dict[str, Any]:
+    try:
+        with open(_path(node, key), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise CassetteMissError(f"Sin grabación para {node} ({key[:12]})") from None
+
+
+def _message(data: Dict[str, Any]) -> BaseMessage:
+    return messages_from_dict([data])[0]
+
+
+class RecordingRunnable:
+    """Envuelve el runnable real y graba cada respuesta exitosa."""
+
+    def __init__(
+        self, node: str, inner: Any, schema: Optional[Type[BaseModel]], tools: Optional[Sequence[Any]]
+    ):
+        self.node = node
+        self.inner = inner
+        self.schema = schema
+        self.tools = tools
+
+    def _save(self, messages: list, **entry: Any) -> None:
+        entry = {"node": self.node, "schema": self.schema.__name__ if self.schema else None, **entry}
+        _save(self.node, cassette_key(self.node, self.schema, self.tools, messages), entry)
+
+    def invoke(self, messages: list) -> Any:
+        response = self.inner.invoke(messages)
+        if isinstance(response, dict) and "parsed" in response:
+            if response.get("parsing_error") is not None or response.get("parsed") is None:
+                return response
+            self._save(
+                messages, kind="structured",
+                data=response["parsed"].model_dump(), raw=message_to_dict(response["raw"]),
+            )
+        elif isinstance(response, BaseMessage):
+            self._save(messages, kind="message", data=message_to_dict(response))
+        elif isinstance(response, BaseModel):
+            self._save(messages, kind="structured", data=response.model_dump())
+        return response
+
+    def stream(self, messages: list) -> Iterator[Any]:
+        text = ""
+        for chunk in self.inner.stream(messages):
+            text += chunk.text
+            yield chunk
+        self._save(messages, kind="stream", data=text)
+
+
+class ReplayRunnable:
+    """Sirve las respuestas grabadas con la misma forma que el runnable real."""
+
+    # Tamaño de los fragmentos al reproducir un stream
+    CHUNK_CHARS = 64
+
+    def __init__(self, node: str, schema: Optional[Type[BaseModel]], tools: Optional[Sequence[Any]]):
+        self.node = node
+        self.schema = schema
+        self.tools = tools
+
+    def _entry(self, messages: list) -> Dict[str, Any]:
+        return _load(self.node, cassette_key(self.node, self.schema, self.tools, messages))
+
+    def invoke(self, messages: list) -> Any:
+        entry = self._entry(messages)
+        kind, data = entry["kind"], entry["data"]
+        if self.schema is not None and kind in ("structured", "stream"):
+            # Una grabación en streaming también sirve a la llamada sin streaming
+            if kind == "stream":
+                raw, parsed = AIMessage(content=data), self.schema.model_validate_json(data)
+            else:
+                raw = _message(entry["raw"]) if entry.get("raw") else AIMessage(content="")
+                parsed = self.schema.model_validate(data)
+            return {"raw": raw, "parsed": parsed, "parsing_error": None}
+        if kind == "stream":
+            return AIMessage(content=data)
+        return _message(data)
+
+    def stream(self, messages: list) -> Iterator[Any]:
+        entry = self._entry(messages)
+        kind, data = entry["kind"], entry["data"]
+        if kind == "stream":
+            text = data
+        elif kind == "structured":
+            text = json.dumps(data, ensure_ascii=False)
+        else:
+            text = str(_message(data).content)
+        for i in range(0, len(text), self.CHUNK_CHARS):
+            yield AIMessageChunk(content=text[i:i + self.CHUNK_CHARS])
+
+
+__all__ = [
+    "CassetteMissError",
+    "RecordingRunnable",
+    "ReplayRunnable",
+    "cassette_key",
+    "recording",
+    "replaying",
+]
@@ -0,0 +1,382 @@
+"""
+Gateway asíncrono para endpoints compatibles con la API de OpenAI
+(vLLM, llama.cpp server, Ollama, LM Studio...), p. ej. un modelo servido en
+el mismo host.
+
+- Un único `httpx.AsyncClient` (pool keep-alive) vive en un event loop propio
+  en un hilo de fondo. Las llamadas síncronas de los nodos y las asíncronas
+  (`ainvoke`) comparten ese pool.
+- Coalescencia opcional: las llamadas cortas que llegan dentro de una
+  ventana de OPENAI_COMPAT_COALESCE_WINDOW_MS se retienen y se despachan
+  juntas, y las idénticas se envían una sola vez. No es batching: la API de
+  `/chat/completions` no acepta varias conversaciones por petición, así que
+  cada llamada distinta sigue siendo un POST propio. Lo único que cambia es
+  que el servidor las recibe en ráfaga (y puede agruparlas en su batching
+  continuo) a cambio de sumar hasta la ventana a la latencia de cada una.
+- Streaming real (`stream: true`, Server-Sent Events): `stream_llm` recibe
+  el texto a medida que el servidor lo genera. Las llamadas en streaming no
+  pasan por la coalescencia, y las que llevan tools se piden completas y
+  llegan en un solo fragmento.
+
+Variables de entorno:
+    OPENAI_COMPAT_BASE_URL=http://127.0.0.1:8001/v1
+    OPENAI_COMPAT_API_KEY=                   (opcional)
+    OPENAI_COMPAT_TIMEOUT=60
+    OPENAI_COMPAT_MAX_CONNECTIONS=32
+    OPENAI_COMPAT_COALESCE_WINDOW_MS=0       (0 = sin coalescencia; antes
+                                              OPENAI_COMPAT_BATCH_WINDOW_MS)
+    OPENAI_COMPAT_COALESCE_MAX_CHARS=2000    (tamaño máximo de prompt retenido;
+                                              antes OPENAI_COMPAT_BATCH_MAX_CHARS)
+"""
+import asyncio
+import json
+import os
+import queue
+import threading
+import uuid
+from concurrent.futures import Future
+from operator import itemgetter
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Type
+
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable, RunnableLambda, RunnablePassthrough
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import BaseModel
+
+from app.services.utils.json_repair import parse_json_lenient
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# GATEWAY (event loop + pool de conexiones)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _env(name: str, legacy: str, default: str) -> str:
+    """Variable de entorno con su nombre anterior como respaldo."""
+    return os.getenv(name) or os.getenv(legacy) or default
+
+
+class _Coalescer:
+    """
+    Retiene las llamadas de una ventana de tiempo y las despacha en ráfaga,
+    una petición por payload distinto.
+    """
+
+    def __init__(self, gateway: "Gateway", window: float):
+        self.gateway = gateway
+        self.window = window
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._flush_scheduled = False
+
+    def submit(self, payload: Dict[str, Any]) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((payload, future))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_later(self.window, self._flush)
+        return future
+
+    def _flush(self) -> None:
+        retenidas, self._pending, self._flush_scheduled = self._pending, [], False
+        groups: Dict[str, List[asyncio.Future]] = {}
+        payloads: Dict[str, Dict[str, Any]] = {}
+        for payload, future in retenidas:
+            key = json.dumps(payload, sort_keys=True, default=str)
+            groups.setdefault(key, []).append(future)
+            payloads[key] = payload
+        for key, futures in groups.items():
+            asyncio.ensure_future(self._dispatch(payloads[key], futures))
+
+    async def _dispatch(self, payload: Dict[str, Any], futures: List[asyncio.Future]) -> None:
+        try:
+            result = await self.gateway.post(payload)
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future in futures:
+            if not future.done():
+                future.set_result(result)
+
+
+class Gateway:
+    """Cliente HTTP compartido para un `base_url`."""
+
+    def __init__(self, base_url: str, api_key: Optional[str] = None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-gateway", daemon=True)
+        self._thread.start()
+        self._client: Optional[httpx.AsyncClient] = None
+        window = float(_env("OPENAI_COMPAT_COALESCE_WINDOW_MS", "OPENAI_COMPAT_BATCH_WINDOW_MS", "0")) / 1000
+        self._coalescer = _Coalescer(self, window) if window > 0 else None
+        self._coalesce_max_chars = int(
+            _env("OPENAI_COMPAT_COALESCE_MAX_CHARS", "OPENAI_COMPAT_BATCH_MAX_CHARS", "2000")
+        )
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Se crea dentro del loop del gateway, al que queda ligado
+        if self._client is None:
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            max_connections = int(os.getenv("OPENAI_COMPAT_MAX_CONNECTIONS", "32"))
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                timeout=float(os.getenv("OPENAI_COMPAT_TIMEOUT", "60")),
+                limits=httpx.Limits(
+                    max_connections=max_connections, max_keepalive_connections=max_connections
+                ),
+            )
+        return self._client
+
+    async def post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        response = await self._get_client().post("/chat/completions", json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    async def _post_stream(self, payload: Dict[str, Any], put) -> None:
+        """POST con `stream: true`; pasa a `put` cada chunk SSE ya decodificado."""
+        async with self._get_client().stream(
+            "POST", "/chat/completions", json={**payload, "stream": True}
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                put(json.loads(data))
+
+    def _coalescible(self, payload: Dict[str, Any]) -> bool:
+        chars = sum(len(str(m.get("content") or "")) for m in payload.get("messages", []))
+        return self._coalescer is not None and not payload.get("tools") and chars <= self._coalesce_max_chars
+
+    async def _chat(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if self._coalescible(payload):
+            return await self._coalescer.submit(payload)  # type: ignore[union-attr]
+        return await self.post(payload)
+
+    def submit(self, payload: Dict[str, Any]) -> Future:
+        """Agenda la llamada en el loop del gateway (seguro desde cualquier hilo)."""
+        return asyncio.run_coroutine_threadsafe(self._chat(payload), self._loop)
+
+    def chat(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return self.submit(payload).result()
+
+    async def achat(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return await asyncio.wrap_future(self.submit(payload))
+
+    def stream(self, payload: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Chunks de la respuesta en streaming, a medida que llegan."""
+        chunks: queue.Queue = queue.Queue()
+        fin = object()
+
+        async def run() -> None:
+            try:
+                await self._post_stream(payload, chunks.put)
+            except Exception as e:
+                chunks.put(e)
+            finally:
+                chunks.put(fin)
+
+        future = asyncio.run_coroutine_threadsafe(run(), self._loop)
+        try:
+            while True:
+                item = chunks.get()
+                if item is fin:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Si el consumidor abandona el stream se cierra la conexión
+            future.cancel()
+
+
+_gateways: Dict[Tuple[str, Optional[str]], Gateway] = {}
+_gateways_lock = threading.Lock()
+
+
+def get_gateway(base_url: str, api_key: Optional[str] = None) -> Gateway:
+    """Gateway compartido del proceso para `base_url`."""
+    with _gateways_lock:
+        gateway = _gateways.get((base_url, api_key))
+        if gateway is None:
+            gateway = Gateway(base_url, api_key)
+            _gateways[(base_url, api_key)] = gateway
+        return gateway
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CHAT MODEL DE LANGCHAIN
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _to_openai_message(message: BaseMessage) -> Dict[str, Any]:
+    if isinstance(message, SystemMessage):
+        return {"role": "system", "content": message.content}
+    if isinstance(message, ToolMessage):
+        return {"role": "tool", "content": message.content, "tool_call_id": message.tool_call_id}
+    if isinstance(message, AIMessage):
+        out: Dict[str, Any] = {"role": "assistant", "content": message.content or ""}
+        if message.tool_calls:
+            out["tool_calls"] = [
+                {
+                    "id": call["id"],
+                    "type": "function",
+                    "function": {"name": call["name"], "arguments": json.dumps(call["args"])},
+                }
+                for call in message.tool_calls
+            ]
+        return out
+    if isinstance(message, HumanMessage):
+        return {"role": "user", "content": message.content}
+    return {"role": "user", "content": str(message.content)}
+
+
+def _usage_metadata(usage: Dict[str, Any]) -> Optional[Dict[str, int]]:
+    if not usage:
+        return None
+    return {
+        "input_tokens": usage.get("prompt_tokens", 0),
+        "output_tokens": usage.get("completion_tokens", 0),
+        "total_tokens": usage.get("total_tokens", 0),
+    }
+
+
+def _to_ai_message(data: Dict[str, Any]) -> AIMessage:
+    message = data["choices"][0]["message"]
+    tool_calls = []
+    for call in message.get("tool_calls") or []:
+        args = call["function"].get("arguments") or "{}"
+        tool_calls.append({
+            "id": call.get("id") or uuid.uuid4().hex,
+            "name": call["function"]["name"],
+            "args": parse_json_lenient(args) if isinstance(args, str) else args,
+        })
+    return AIMessage(
+        content=message.get("content") or "",
+        tool_calls=tool_calls,
+        usage_metadata=_usage_metadata(data.get("usage") or {}),
+        response_metadata={"model_name": data.get("model"), "finish_reason": data["choices"][0].get("finish_reason")},
+    )
+
+
+def _to_ai_chunk(message: AIMessage) -> AIMessageChunk:
+    return AIMessageChunk(
+        content=message.content,
+        tool_call_chunks=[
+            {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+            for i, call in enumerate(message.tool_calls)
+        ],
+        usage_metadata=message.usage_metadata,
+        response_metadata=message.response_metadata,
+    )
+
+
+class ChatOpenAICompatible(BaseChatModel):
+    """
+    Chat model de LangChain sobre un endpoint `/chat/completions` compatible
+    con OpenAI, usando el gateway compartido.
+
+    Acepta también `response_mime_type`/`response_json_schema` (la forma en que
+    `stream_llm` pide JSON a Gemini) y los traduce a `response_format`.
+    """
+
+    model: str
+    base_url: str = "http://127.0.0.1:8001/v1"
+    api_key: Optional[str] = None
+    temperature: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "openai-compatible"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.model, "base_url": self.base_url}
+
+    def _payload(self, messages: List[BaseMessage], stop: Optional[List[str]], **kwargs: Any) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {
+            "model": self.model,
+            "messages": [_to_openai_message(m) for m in messages],
+            "temperature": self.temperature,
+        }
+        if stop:
+            payload["stop"] = stop
+        json_schema = kwargs.pop("response_json_schema", None)
+        if kwargs.pop("response_mime_type", None) == "application/json":
+            payload["response_format"] = (
+                {"type": "json_schema", "json_schema": {"name": "respuesta", "schema": json_schema}}
+                if json_schema else {"type": "json_object"}
+            )
+        kwargs.pop("ls_structured_output_format", None)
+        payload.update(kwargs)
+        return payload
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        data = get_gateway(self.base_url, self.api_key).chat(self._payload(messages, stop, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=_to_ai_message(data))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        data = await get_gateway(self.base_url, self.api_key).achat(self._payload(messages, stop, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=_to_ai_message(data))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        gateway = get_gateway(self.base_url, self.api_key)
+        payload = self._payload(messages, stop, **kwargs)
+        if payload.get("tools"):
+            # Las tool calls llegan repartidas en fragmentos: se piden completas
+            yield ChatGenerationChunk(message=_to_ai_chunk(_to_ai_message(gateway.chat(payload))))
+            return
+        for data in gateway.stream(payload):
+            usage = _usage_metadata(data.get("usage") or {})
+            choices = data.get("choices") or [{}]
+            text = (choices[0].get("delta") or {}).get("content") or ""
+            if not text and usage is None:
+                continue
+            if text and run_manager:
+                run_manager.on_llm_new_token(text)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text, usage_metadata=usage))
+
+    def bind_tools(self, tools: Sequence[Any], *, tool_choice: Optional[str] = None, **kwargs: Any) -> Runnable:
+        formatted = [convert_to_openai_tool(t) for t in tools]
+        if tool_choice == "any":
+            tool_choice = "required"
+        elif tool_choice and tool_choice not in ("auto", "none", "required"):
+            tool_choice = {"type": "function", "function": {"name": tool_choice}}  # type: ignore[assignment]
+        if tool_choice:
+            kwargs["tool_choice"] = tool_choice
+        return self.bind(tools=formatted, **kwargs)
+
+    def with_structured_output(self, schema: Type[BaseModel], *, include_raw: bool = False, **kwargs: Any) -> Runnable:  # type: ignore[override]
+        llm = self.bind(
+            response_format={
+                "type": "json_schema",
+                "json_schema": {"name": schema.__name__, "schema": schema.model_json_schema()},
+            }
+        )
+        parser = RunnableLambda(lambda m: schema.model_validate(parse_json_lenient(str(m.content))))
+        if include_raw:
+            parser_with_fallback = RunnablePassthrough.assign(
+                parsed=itemgetter("raw") | parser, parsing_error=lambda _: None
+            ).with_fallbacks(
+                [RunnablePassthrough.assign(parsed=lambda _: None)],
+                exception_key="parsing_error",
+            )
+            return {"raw": llm} | parser_with_fallback
+        return llm | parser
+
+
+__all__ = ["Gateway", "get_gateway", "ChatOpenAICompatible"]
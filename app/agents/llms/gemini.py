@@ -1,12 +1,95 @@
-import os
+import threading
+from typing import Any, Dict, Hashable, Optional, Tuple, Type
+
 import dotenv
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.runnables import Runnable
+from pydantic import BaseModel
 
-from langchain_google_genai import ChatGoogleGenerativeAI
+from app.agents.llms.providers import create_chat_model, default_model_for_provider
 
 
 dotenv.load_dotenv()
-def get_gemini_model() -> ChatGoogleGenerativeAI:
-    return ChatGoogleGenerativeAI(
-        model=os.environ.get("GEMINI_MODEL", "gemini-2.5-flash-lite"), 
-        api_key=os.environ["GOOGLE_API_KEY"]
-    )
\ No newline at end of file
+
+# Registro de clientes por proceso: un chat model por modelo (Gemini u otro
+# proveedor según LLM_PROVIDER, ver providers.py).
+# Cada instancia mantiene su propio cliente HTTP (pool de conexiones
+# keep-alive), así que reutilizarla evita reconstruir el cliente y repetir
+# el handshake TLS en cada llamada.
+_registry_lock = threading.Lock()
+_models: Dict[str, BaseChatModel] = {}
+_bound: Dict[Tuple[Hashable, ...], Runnable] = {}
+
+
+def default_model_name() -> str:
+    return default_model_for_provider()
+
+
+def get_gemini_model(model: Optional[str] = None) -> BaseChatModel:
+    """Retorna el cliente compartido para `model` (por defecto el modelo del proveedor)."""
+    name = model or default_model_name()
+    client = _models.get(name)
+    if client is None:
+        with _registry_lock:
+            client = _models.get(name)
+            if client is None:
+                client = create_chat_model(name)
+                _models[name] = client
+    return client
+
+
+def get_bound_model(key: Tuple[Hashable, ...], factory) -> Runnable:
+    """
+    Cachea un runnable derivado del cliente (with_structured_output, bind_tools...).
+
+    `factory` solo se ejecuta la primera vez que se pide `key`.
+    """
+    runnable = _bound.get(key)
+    if runnable is None:
+        with _registry_lock:
+            runnable = _bound.get(key)
+        if runnable is None:
+            runnable = factory()
+            with _registry_lock:
+                runnable = _bound.setdefault(key, runnable)
+    return runnable
+
+
+def get_cached_model(cached_content: str, model: Optional[str] = None) -> BaseChatModel:
+    """
+    Copia del cliente de `model` que envía `cached_content` (un CachedContent
+    de Gemini con el prefijo estático, ver prompt_cache.py). Comparte el
+    cliente HTTP del original.
+    """
+    name = model or default_model_name()
+    return get_bound_model(  # type: ignore[return-value]
+        ("cached", name, cached_content),
+        lambda: get_gemini_model(name).model_copy(update={"cached_content": cached_content}),
+    )
+
+
+def get_structured_model(
+    schema: Type[BaseModel], model: Optional[str] = None, cached_content: Optional[str] = None
+) -> Runnable[Any, Any]:
+    """
+    Retorna `get_gemini_model(model).with_structured_output(schema, include_raw=True)`
+    cacheado. La respuesta es un dict con `raw` (AIMessage, con el uso de tokens),
+    `parsed` y `parsing_error`; `invoke_llm` lo desempaqueta.
+    """
+    name = model or default_model_name()
+    if cached_content:
+        return get_bound_model(
+            ("structured", name, schema, cached_content),
+            lambda: get_cached_model(cached_content, name).with_structured_output(schema, include_raw=True),
+        )
+    return get_bound_model(
+        ("structured", name, schema),
+        lambda: get_gemini_model(name).with_structured_output(schema, include_raw=True),
+    )
+
+
+def clear_model_registry() -> None:
+    """Descarta los clientes cacheados (p. ej. tras cambiar la API key)."""
+    with _registry_lock:
+        _models.clear()
+        _bound.clear()
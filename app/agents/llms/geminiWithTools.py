@@ -1,17 +1,21 @@
-from app.agents.llms.gemini import get_gemini_model
+from typing import Optional
+
+from app.agents.llms.gemini import default_model_name, get_bound_model, get_gemini_model
 from langchain_core.language_models import (
     LanguageModelInput,
 )
 from langchain_core.messages import AIMessage
 from langchain_core.runnables import Runnable
-from langgraph.prebuilt import ToolNode
 
 
 def get_gemini_with_tools_model(
     tools: list,
+    model: Optional[str] = None,
 ) -> Runnable[LanguageModelInput, AIMessage]:
-    model = get_gemini_model()
-    gemini_with_tools = model.bind_tools(tools, tool_choice='any')
-    return gemini_with_tools
-
-    
\ No newline at end of file
+    """Retorna el cliente compartido con `tools` ya ligadas (cacheado por nombre de tool)."""
+    name = model or default_model_name()
+    key = ("tools", name, tuple(getattr(t, "name", repr(t)) for t in tools))
+    return get_bound_model(
+        key,
+        lambda: get_gemini_model(name).bind_tools(tools, tool_choice='any'),
+    )
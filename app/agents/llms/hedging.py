@@ -0,0 +1,113 @@
+"""
+Hedging de llamadas al LLM para recortar la latencia de cola.
+
+Si una llamada de un nodo idempotente no respondió tras el percentil
+configurado de la latencia observada de ese nodo, se lanza un duplicado y se
+usa la primera respuesta exitosa. Un presupuesto limita la fracción de
+llamadas que pueden duplicarse, para acotar el costo.
+
+El temporizador arranca cuando el limitador concede el turno y la latencia
+observada es solo la del proveedor: la espera en la cola no dispara
+duplicados, que además pasan por el limitador como cualquier llamada.
+Los nodos por defecto son los que siguen llamando al LLM en la
+configuración por defecto (decicion_node y generate_ast deciden localmente).
+
+Variables de entorno:
+    LLM_HEDGE=0                                  (1 para activarlo)
+    LLM_HEDGE_NODES=preparacion_resultado,build_recurrence,
+        calcular_costo_temporal_iterativo,calcular_costo_espacial_iterativo
+                                                 (nodos idempotentes con salida estructurada)
+    LLM_HEDGE_PERCENTILE=0.95
+    LLM_HEDGE_MIN_SAMPLES=20                     (observaciones antes de estimar el percentil)
+    LLM_HEDGE_BUDGET=0.1                         (máximo de duplicados / llamadas)
+"""
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Optional
+
+from app.constants import env_flag
+from app.services import metrics
+
+_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge")
+
+_budget_lock = threading.Lock()
+_calls = 0
+_hedges = 0
+
+
+DEFAULT_HEDGE_NODES = (
+    "preparacion_resultado,build_recurrence,"
+    "calcular_costo_temporal_iterativo,calcular_costo_espacial_iterativo"
+)
+
+
+def hedge_nodes() -> set:
+    value = os.getenv("LLM_HEDGE_NODES", DEFAULT_HEDGE_NODES)
+    return {n.strip() for n in value.split(",") if n.strip()}
+
+
+def hedge_delay(node: str) -> Optional[float]:
+    """
+    Segundos a esperar antes de duplicar una llamada de `node`, o None si el
+    hedging no aplica (desactivado, nodo no listado o pocas observaciones).
+    """
+    if not env_flag("LLM_HEDGE") or node not in hedge_nodes():
+        return None
+    observed = sorted(metrics.get_observations("llm_provider_latency_seconds", node=node))
+    if len(observed) < int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")):
+        return None
+    percentile = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+    return observed[min(len(observed) - 1, int(percentile * len(observed)))]
+
+
+def _take_hedge() -> bool:
+    """Consume presupuesto para un duplicado si queda."""
+    global _hedges
+    budget = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+    with _budget_lock:
+        if _hedges + 1 > budget * _calls:
+            return False
+        _hedges += 1
+        return True
+
+
+def _first_success(futures: list) -> Any:
+    pending = set(futures)
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return future.result()
+            error = future.exception()
+    raise error  # type: ignore[misc]
+
+
+def call_hedged(
+    node: str,
+    call: Callable[[], Any],
+    delay: Optional[float],
+    duplicate: Optional[Callable[[], Any]] = None,
+) -> Any:
+    """
+    Ejecuta `call()`; si no termina en `delay` segundos y hay presupuesto,
+    lanza `duplicate()` (por defecto otra vez `call`) y retorna la primera
+    respuesta exitosa.
+    """
+    global _calls
+    if delay is None:
+        return call()
+    with _budget_lock:
+        _calls += 1
+    primary: Future = _pool.submit(call)
+    done, _ = wait([primary], timeout=delay)
+    if done or not _take_hedge():
+        return primary.result()
+    metrics.incr("llm_hedges", node=node)
+    return _first_success([primary, _pool.submit(duplicate or call)])
+
+
+__all__ = ["hedge_nodes", "hedge_delay", "call_hedged"]
@@ -0,0 +1,497 @@
+"""
+Capa única de invocación del LLM para todos los nodos.
+
+`invoke_llm` obtiene el runnable cacheado (cliente, salida estructurada o tools)
+y lo invoca con:
+    - Reintentos acotados con backoff exponencial y jitter, solo para errores
+      transitorios (timeouts, conexión, 429, 5xx; ver `is_transient_error`).
+    - Un circuit breaker por modelo: tras varias llamadas seguidas que agotan
+      sus intentos el circuito se abre y las llamadas fallan al instante, sin
+      castigar más al proveedor. Cada llamada cuenta como un solo fallo.
+    - Un fallback determinístico opcional por nodo, usado cuando se agotan los
+      reintentos o el circuito está abierto, para degradar en vez de fallar.
+    - Ruteo por nodo/schema a un nivel de modelo (ver routing.py), con escalado
+      al modelo pesado si la salida estructurada del liviano no parsea.
+    - Reparación local del JSON de una salida estructurada que no parseó
+      (`parse_json_lenient`) antes de escalar o reintentar.
+    - Hedging opcional en nodos idempotentes (ver hedging.py).
+    - Un limitador global de concurrencia y tasa (ver limiter.py).
+    - Grabación y reproducción de respuestas (ver cassette.py).
+    - Caché de contexto del prefijo estático de los mensajes (ver prompt_cache.py).
+    - Memo opcional de salidas estructuradas en la caché compartida entre
+      workers (namespace "llm"), con LLM_MEMO=1 y SHARED_CACHE=sqlite.
+
+`stream_llm` es la variante en streaming para salida estructurada: entrega el
+JSON parcial a medida que llega y, si el stream falla, cae en `invoke_llm`.
+
+Variables de entorno:
+    LLM_MAX_RETRIES=2
+    LLM_RETRY_BASE_DELAY=0.5          (segundos)
+    LLM_RETRY_MAX_DELAY=8
+    LLM_BREAKER_THRESHOLD=5           (fallos seguidos para abrir el circuito)
+    LLM_BREAKER_RESET_SECONDS=30      (tiempo abierto antes de probar de nuevo)
+    LLM_MEMO=0                        (1: reutiliza respuestas estructuradas idénticas)
+"""
+import logging
+import os
+import random
+import re
+import threading
+import time
+import json
+from concurrent.futures import CancelledError
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, Type
+
+from langchain_core.utils.json import parse_partial_json
+from pydantic import BaseModel
+
+from app.agents.llms.cassette import CassetteMissError, RecordingRunnable, ReplayRunnable, recording, replaying
+from app.agents.llms.gemini import get_bound_model, get_cached_model, get_gemini_model, get_structured_model
+from app.agents.llms.geminiWithTools import get_gemini_with_tools_model
+from app.agents.llms.hedging import call_hedged, hedge_delay
+from app.agents.llms.limiter import get_limiter, is_rate_limit_error, llm_slot
+from app.agents.llms.prompt_cache import cached_prefix, discard, observe_prefix
+from app.agents.llms.routing import escalation_model, route_tier, tier_model
+from app.agents.llms.tokens import check_budget, record_usage
+from app.constants import env_flag
+from app.services import metrics
+from app.services.cache import get_shared_cache, make_key
+from app.services.utils.json_repair import parse_json_lenient
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """El circuito del modelo está abierto; la llamada no se envía."""
+
+
+class StructuredOutputError(ValueError):
+    """El modelo respondió, pero su salida no cumple el schema pedido."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker clásico de tres estados (cerrado, abierto, semiabierto).
+
+    Cerrado: las llamadas pasan. Tras `failure_threshold` fallos seguidos se
+    abre durante `reset_timeout` segundos; luego deja pasar una sola llamada de
+    prueba (semiabierto) que lo cierra si tiene éxito o lo reabre si falla.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probe_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(model: str) -> CircuitBreaker:
+    """Circuit breaker compartido por todas las llamadas a `model`."""
+    with _breakers_lock:
+        breaker = _breakers.get(model)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                failure_threshold=int(os.getenv("LLM_BREAKER_THRESHOLD", "5")),
+                reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")),
+            )
+            _breakers[model] = breaker
+        return breaker
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Backoff exponencial con jitter completo."""
+    base = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+    cap = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _get_runnable(
+    node: str,
+    model: str,
+    schema: Optional[Type[BaseModel]],
+    tools: Optional[Sequence[Any]],
+    cached_content: Optional[str] = None,
+):
+    if replaying():
+        return ReplayRunnable(node, schema, tools)
+    if schema is not None:
+        runnable = get_structured_model(schema, model, cached_content)
+    elif tools:
+        runnable = get_gemini_with_tools_model(list(tools), model)
+    elif cached_content:
+        runnable = get_cached_model(cached_content, model)
+    else:
+        runnable = get_gemini_model(model)
+    return RecordingRunnable(node, runnable, schema, tools) if recording() else runnable
+
+
+def _provider_invoke(node: str, runnable: Any, messages: list) -> Any:
+    started = time.monotonic()
+    response = runnable.invoke(messages)
+    # Solo el proveedor, sin la cola del limitador: base del retraso del hedging
+    metrics.observe("llm_provider_latency_seconds", time.monotonic() - started, node=node)
+    return response
+
+
+def _limited_invoke(
+    node: str, runnable: Any, messages: list, tokens: int, delay: Optional[float] = None
+) -> Any:
+    resuelta = threading.Event()
+
+    def duplicate() -> Any:
+        # El duplicado pide su propio turno; si entretanto respondió la
+        # original, no sale al proveedor
+        with llm_slot(tokens, node):
+            if resuelta.is_set():
+                raise CancelledError()
+            return _provider_invoke(node, runnable, messages)
+
+    with llm_slot(tokens, node):
+        # El temporizador del hedge arranca con el turno concedido
+        try:
+            return call_hedged(node, lambda: _provider_invoke(node, runnable, messages), delay, duplicate)
+        finally:
+            resuelta.set()
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    """Código HTTP del error del proveedor, si se puede obtener."""
+    current: Optional[BaseException] = error
+    while current is not None:
+        for value in (
+            getattr(current, "status_code", None),
+            getattr(current, "code", None),
+            getattr(getattr(current, "response", None), "status_code", None),
+        ):
+            if isinstance(value, int) and 100 <= value < 600:
+                return value
+        current = current.__cause__ or current.__context__
+    return None
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Timeouts, errores de conexión, 429 y 5xx: los únicos que se reintentan."""
+    if isinstance(error, (TimeoutError, ConnectionError)) or is_rate_limit_error(error):
+        return True
+    status = _status_code(error)
+    if status is not None:
+        return status in (408, 429) or status >= 500
+    name = type(error).__name__.lower()
+    if any(part in name for part in ("timeout", "deadline", "unavailable", "connect", "internalserver")):
+        return True
+    return re.search(r"\b(50[0-4]|timed? ?out)\b", str(error).lower()) is not None
+
+
+def _on_provider_error(error: Exception) -> None:
+    limiter = get_limiter()
+    if limiter is not None and is_rate_limit_error(error):
+        limiter.throttle()
+
+
+def _unwrap(node: str, schema: Optional[Type[BaseModel]], response: Any) -> Any:
+    """Registra el uso de tokens y extrae la salida estructurada si aplica."""
+    if schema is None:
+        record_usage(node, response)
+        return response
+    if not isinstance(response, dict) or "parsed" not in response:
+        # Runnables que ya devuelven el objeto parseado
+        if response is None:
+            raise StructuredOutputError(f"Salida estructurada vacía para {schema.__name__}")
+        return response
+    record_usage(node, response.get("raw"))
+    if response.get("parsing_error") is not None or response.get("parsed") is None:
+        repaired = _repair_structured(schema, response.get("raw"))
+        if repaired is not None:
+            metrics.incr("llm_json_repair", node=node, kind="local")
+            return repaired
+        raise StructuredOutputError(
+            f"Salida de {schema.__name__} no parseable: {response.get('parsing_error')}"
+        )
+    return response["parsed"]
+
+
+def _repair_structured(schema: Type[BaseModel], raw: Any) -> Optional[BaseModel]:
+    """
+    Reparación local (`parse_json_lenient`) de una salida estructurada que no
+    parseó, antes de escalar de modelo o reintentar. Toma los argumentos de la
+    tool call si el proveedor la usó, o si no el texto de la respuesta.
+    """
+    candidates: list = []
+    for call in getattr(raw, "tool_calls", None) or []:
+        candidates.append(call.get("args"))
+    content = getattr(raw, "content", None)
+    if isinstance(content, str) and content.strip():
+        candidates.append(content)
+    for candidate in candidates:
+        try:
+            data = parse_json_lenient(candidate) if isinstance(candidate, str) else candidate
+            return schema.model_validate(data)
+        except Exception:
+            continue
+    return None
+
+
+def _memo_key(node: str, model: str, schema: Optional[Type[BaseModel]], tools, messages: list) -> Optional[str]:
+    """Clave del memo compartido, o None si no aplica a esta llamada."""
+    if schema is None or tools or not env_flag("LLM_MEMO") or recording() or replaying():
+        return None
+    if get_shared_cache() is None:
+        return None
+    contents = [(type(m).__name__, str(m.content)) for m in messages]
+    return make_key(node, model, schema.__name__, schema.model_json_schema(), contents)
+
+
+def invoke_llm(
+    node: str,
+    messages: list,
+    *,
+    schema: Optional[Type[BaseModel]] = None,
+    tools: Optional[Sequence[Any]] = None,
+    model: Optional[str] = None,
+    fallback: Optional[Callable[[Exception], Any]] = None,
+) -> Any:
+    """
+    Invoca el LLM para `node` con reintentos, circuit breaker y fallback.
+
+    Args:
+        node: Nombre del nodo del grafo que hace la llamada (para logs).
+        messages: Mensajes a enviar.
+        schema: Modelo pydantic para salida estructurada (opcional).
+        tools: Tools a ligar con tool_choice='any' (opcional).
+        model: Modelo a usar; por defecto el que asigna la tabla de ruteo.
+        fallback: Función que recibe la última excepción y retorna un valor
+            equivalente a la respuesta del LLM. Si no se da, se relanza el error.
+
+    Returns:
+        La respuesta del modelo (instancia de `schema`, AIMessage...) o el
+        valor retornado por `fallback`.
+    """
+    tier = "default" if model else route_tier(node, schema)
+    model_name = model or tier_model(tier)
+    breaker = get_breaker(model_name)
+    memo_key = _memo_key(node, model_name, schema, tools, messages)
+    if memo_key is not None:
+        cached = get_shared_cache().get("llm", memo_key)  # type: ignore[union-attr]
+        if cached is not None:
+            metrics.incr("llm_memo", node=node, result="hit")
+            return schema.model_validate(cached)  # type: ignore[union-attr]
+        metrics.incr("llm_memo", node=node, result="miss")
+    tokens = check_budget(node, messages)
+    observe_prefix(node, messages)
+    delay = hedge_delay(node) if schema is not None else None
+    max_retries = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    last_error: Exception = CircuitOpenError(f"Circuito abierto para {model_name}")
+
+    failed_breaker: Optional[CircuitBreaker] = None
+
+    attempt = -1
+    while attempt < max_retries:
+        attempt += 1
+        if not breaker.allow():
+            last_error = CircuitOpenError(f"Circuito abierto para {model_name}")
+            break
+        started = time.monotonic()
+        cached_content: Optional[str] = None
+        try:
+            # El modelo puede cambiar al escalar: el caché es por modelo
+            prefix = None if tools else cached_prefix(node, model_name, messages)
+            if prefix:
+                cached_content, to_send = prefix
+            else:
+                to_send = messages
+            runnable = _get_runnable(node, model_name, schema, tools, cached_content)
+            response = _unwrap(
+                node, schema,
+                _limited_invoke(node, runnable, to_send, tokens, delay),
+            )
+        except Exception as e:
+            metrics.incr("llm_errors", node=node, error=type(e).__name__)
+            last_error = e
+            logger.warning(
+                "LLM falló en %s (intento %d/%d): %s", node, attempt + 1, max_retries + 1, e
+            )
+            if isinstance(e, (StructuredOutputError, CassetteMissError)):
+                # El proveedor respondió (o no hubo proveedor): no cuenta como caída
+                breaker.record_success()
+            else:
+                _on_provider_error(e)
+                if cached_content:
+                    # El siguiente intento recrea el caché o envía el prefijo
+                    discard(cached_content)
+                if not is_transient_error(e):
+                    # 400, credenciales, schema rechazado...: reintentar no
+                    # cambia nada y el proveedor sí respondió
+                    breaker.record_success()
+                    break
+                # Un solo fallo por llamada, al agotar los intentos
+                failed_breaker = breaker
+            if isinstance(e, CassetteMissError):
+                # Reintentar no cambia nada: directo al fallback
+                break
+            escalated = escalation_model(tier, model_name) if isinstance(e, StructuredOutputError) else None
+            if escalated:
+                # Reintento inmediato con el modelo pesado, sin consumir un intento
+                logger.info("Escalando %s de %s a %s", node, model_name, escalated)
+                metrics.incr("llm_escalations", node=node, model=escalated)
+                tier, model_name = "heavy", escalated
+                breaker = get_breaker(model_name)
+                attempt -= 1
+                continue
+            if attempt < max_retries:
+                time.sleep(_backoff_delay(attempt))
+            continue
+        breaker.record_success()
+        elapsed = time.monotonic() - started
+        metrics.observe("llm_latency_seconds", elapsed, node=node)
+        metrics.observe(
+            "llm_latency_by_cache_seconds", elapsed, node=node,
+            cache="explicit" if cached_content else "none",
+        )
+        metrics.incr("llm_calls", node=node, model=model_name)
+        if memo_key is not None and isinstance(response, BaseModel):
+            get_shared_cache().set("llm", memo_key, response.model_dump())  # type: ignore[union-attr]
+        return response
+
+    if failed_breaker is not None:
+        failed_breaker.record_failure()
+    if fallback is None:
+        raise last_error
+    logger.warning("Usando fallback determinístico en %s: %s", node, last_error)
+    metrics.incr("llm_fallbacks", node=node)
+    return fallback(last_error)
+
+
+def _stream_chunks(runnable: Any, messages: list, node: str, started: float, on_partial) -> Iterator[Any]:
+    """Itera el stream entregando a `on_partial` el JSON parcial acumulado."""
+    text = ""
+    for chunk in runnable.stream(messages):
+        if chunk.text:
+            if not text:
+                metrics.observe("llm_first_token_seconds", time.monotonic() - started, node=node)
+            text += chunk.text
+            partial = parse_partial_json(text)
+            if isinstance(partial, dict):
+                on_partial(partial)
+        yield chunk
+
+
+def _get_json_stream_runnable(node: str, model: str, schema: Type[BaseModel], json_schema: Dict[str, Any]):
+    """Cliente en modo JSON con schema: el texto del stream es el JSON de salida."""
+    if replaying():
+        return ReplayRunnable(node, schema, None)
+    runnable = get_bound_model(
+        ("json_stream", model, schema, json.dumps(json_schema, sort_keys=False)),
+        lambda: get_gemini_model(model).bind(
+            response_mime_type="application/json", response_json_schema=json_schema
+        ),
+    )
+    return RecordingRunnable(node, runnable, schema, None) if recording() else runnable
+
+
+def stream_llm(
+    node: str,
+    messages: list,
+    *,
+    schema: Type[BaseModel],
+    on_partial: Callable[[Dict[str, Any]], None],
+    json_schema: Optional[Dict[str, Any]] = None,
+    model: Optional[str] = None,
+    fallback: Optional[Callable[[Exception], Any]] = None,
+) -> Any:
+    """
+    Invoca el LLM en streaming con salida estructurada.
+
+    Args:
+        node: Nombre del nodo del grafo que hace la llamada.
+        messages: Mensajes a enviar.
+        schema: Modelo pydantic con el que se valida la respuesta completa.
+        on_partial: Recibe el dict parcial (JSON incompleto ya parseado) cada
+            vez que llega un fragmento nuevo.
+        json_schema: Schema JSON enviado al proveedor; por defecto el de
+            `schema`. Permite fijar el orden de las propiedades.
+        model: Modelo a usar; por defecto el que asigna la tabla de ruteo.
+        fallback: Igual que en `invoke_llm`.
+
+    Returns:
+        Instancia de `schema`. Si el stream falla, el resultado de `invoke_llm`
+        (sin streaming, con reintentos y fallback).
+    """
+    model_name = model or tier_model(route_tier(node, schema))
+    breaker = get_breaker(model_name)
+    if not breaker.allow():
+        return invoke_llm(node, messages, schema=schema, model=model, fallback=fallback)
+    tokens = check_budget(node, messages)
+    runnable = _get_json_stream_runnable(node, model_name, schema, json_schema or schema.model_json_schema())
+
+    started = time.monotonic()
+    try:
+        with llm_slot(tokens, node):
+            chunks = list(_stream_chunks(runnable, messages, node, started, on_partial))
+        text = "".join(c.text for c in chunks)
+        usage = next((c for c in reversed(chunks) if getattr(c, "usage_metadata", None)), None)
+        response = schema.model_validate_json(text)
+    except Exception as e:
+        if isinstance(e, (ValueError, CassetteMissError)) or not is_transient_error(e):
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+            _on_provider_error(e)
+        metrics.incr("llm_errors", node=node, error=type(e).__name__)
+        logger.warning("Stream falló en %s, reintentando sin streaming: %s", node, e)
+        return invoke_llm(node, messages, schema=schema, model=model, fallback=fallback)
+
+    breaker.record_success()
+    record_usage(node, usage)
+    metrics.observe("llm_latency_seconds", time.monotonic() - started, node=node)
+    metrics.incr("llm_calls", node=node, model=model_name)
+    return response
+
+
+__all__ = [
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "StructuredOutputError",
+    "get_breaker",
+    "is_transient_error",
+    "invoke_llm",
+    "stream_llm",
+]
@@ -0,0 +1,257 @@
+"""
+Limitador global de llamadas al LLM.
+
+Evita las tormentas de 429: cada llamada pide un turno antes de salir al
+proveedor. Un turno se concede cuando:
+    - hay menos de LLM_MAX_IN_FLIGHT llamadas en curso,
+    - el token bucket de peticiones (LLM_RPM por minuto) tiene saldo,
+    - el token bucket de tokens (LLM_TPM por minuto) cubre la estimación.
+Los turnos se sirven en orden de llegada (FIFO), así una llamada grande no
+queda postergada indefinidamente por llamadas pequeñas.
+
+Con LLM_LIMITER_SCOPE=host el estado (buckets y llamadas en curso) vive en un
+SQLite compartido por todos los procesos del host (LLM_LIMITER_DB); el orden
+FIFO se mantiene dentro de cada proceso.
+
+Variables de entorno (0 = sin límite; si todas son 0 el limitador no actúa):
+    LLM_MAX_IN_FLIGHT=0
+    LLM_RPM=0
+    LLM_TPM=0
+    LLM_LIMITER_SCOPE=process            (process | host)
+    LLM_LIMITER_DB=.cache/llm_limiter.sqlite3
+"""
+import collections
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Iterator, Optional, Tuple
+
+from app.services import metrics
+
+# Tiempo máximo que una llamada cuenta como "en curso" en modo host, por si
+# el proceso que la hizo muere sin liberarla
+LEASE_SECONDS = 300
+
+
+class _Bucket:
+    """Token bucket con recarga continua: `per_minute` de capacidad y de recarga."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_for(self, amount: float, now: float) -> float:
+        """Segundos hasta tener `amount` disponible (0 si ya lo hay)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60 / self.capacity
+
+    def take(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+
+class _ProcessBackend:
+    """Estado del limitador en memoria del proceso."""
+
+    def __init__(self, max_in_flight: int, rpm: int, tpm: int):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.requests = _Bucket(rpm) if rpm > 0 else None
+        self.tokens = _Bucket(tpm) if tpm > 0 else None
+
+    def try_acquire(self, tokens: int) -> Tuple[Optional[str], float]:
+        """Retorna (lease, 0) si se concede el turno, o (None, espera sugerida)."""
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            return None, 1.0
+        now = time.monotonic()
+        wait = max(
+            self.requests.wait_for(1, now) if self.requests else 0.0,
+            self.tokens.wait_for(tokens, now) if self.tokens else 0.0,
+        )
+        if wait > 0:
+            return None, wait
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens:
+            self.tokens.take(tokens)
+        self.in_flight += 1
+        return "local", 0.0
+
+    def release(self, lease: str) -> None:
+        self.in_flight = max(0, self.in_flight - 1)
+
+    def throttle(self) -> None:
+        if self.requests:
+            self.requests.level = 0.0
+
+
+class _HostBackend:
+    """Estado del limitador en SQLite, compartido por los procesos del host."""
+
+    def __init__(self, path: str, max_in_flight: int, rpm: int, tpm: int):
+        self.path = path
+        self.max_in_flight = max_in_flight
+        self.rpm = rpm
+        self.tpm = tpm
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL, updated REAL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS leases (id TEXT PRIMARY KEY, expires REAL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @staticmethod
+    def _bucket(conn: sqlite3.Connection, name: str, per_minute: int, now: float) -> float:
+        row = conn.execute("SELECT level, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return float(per_minute)
+        level, updated = row
+        return min(float(per_minute), level + (now - updated) * per_minute / 60)
+
+    def try_acquire(self, tokens: int) -> Tuple[Optional[str], float]:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM leases WHERE expires < ?", (now,))
+            if self.max_in_flight:
+                (in_flight,) = conn.execute("SELECT COUNT(*) FROM leases").fetchone()
+                if in_flight >= self.max_in_flight:
+                    conn.execute("ROLLBACK")
+                    return None, 1.0
+            levels = {}
+            wait = 0.0
+            for name, per_minute, amount in (("requests", self.rpm, 1), ("tokens", self.tpm, tokens)):
+                if per_minute <= 0:
+                    continue
+                amount = min(amount, per_minute)
+                level = self._bucket(conn, name, per_minute, now)
+                levels[name] = (level, amount)
+                if level < amount:
+                    wait = max(wait, (amount - level) * 60 / per_minute)
+            if wait > 0:
+                conn.execute("ROLLBACK")
+                return None, wait
+            for name, (level, amount) in levels.items():
+                conn.execute(
+                    "INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)",
+                    (name, level - amount, now),
+                )
+            lease = uuid.uuid4().hex
+            conn.execute("INSERT INTO leases (id, expires) VALUES (?, ?)", (lease, now + LEASE_SECONDS))
+            conn.execute("COMMIT")
+            return lease, 0.0
+        finally:
+            conn.close()
+
+    def release(self, lease: str) -> None:
+        with contextlib.closing(self._connect()) as conn:
+            conn.execute("DELETE FROM leases WHERE id = ?", (lease,))
+
+    def throttle(self) -> None:
+        if self.rpm <= 0:
+            return
+        with contextlib.closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, level, updated) VALUES ('requests', 0, ?)",
+                (time.time(),),
+            )
+
+
+class LLMLimiter:
+    """Cola FIFO de turnos sobre un backend (proceso o host)."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._cond = threading.Condition()
+        self._queue: collections.deque = collections.deque()
+
+    @contextlib.contextmanager
+    def slot(self, tokens: int = 0, node: str = "") -> Iterator[None]:
+        """Bloquea hasta obtener turno; lo libera al salir del bloque."""
+        ticket = object()
+        started = time.monotonic()
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    if self._queue[0] is ticket:
+                        lease, wait = self.backend.try_acquire(tokens)
+                        if lease is not None:
+                            break
+                    else:
+                        wait = None
+                    self._cond.wait(timeout=wait)
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+        metrics.observe("llm_queue_wait_seconds", time.monotonic() - started, node=node)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.backend.release(lease)
+                self._cond.notify_all()
+
+    def throttle(self) -> None:
+        """El proveedor respondió 429: se vacía el bucket de peticiones."""
+        with self._cond:
+            self.backend.throttle()
+
+
+_limiter: Optional[LLMLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> Optional[LLMLimiter]:
+    """Limitador compartido del proceso, o None si no hay límites configurados."""
+    global _limiter
+    max_in_flight = int(os.getenv("LLM_MAX_IN_FLIGHT", "0"))
+    rpm = int(os.getenv("LLM_RPM", "0"))
+    tpm = int(os.getenv("LLM_TPM", "0"))
+    if not (max_in_flight or rpm or tpm):
+        return None
+    with _limiter_lock:
+        if _limiter is None:
+            if os.getenv("LLM_LIMITER_SCOPE", "process").lower() == "host":
+                path = os.getenv("LLM_LIMITER_DB", ".cache/llm_limiter.sqlite3")
+                backend = _HostBackend(path, max_in_flight, rpm, tpm)
+            else:
+                backend = _ProcessBackend(max_in_flight, rpm, tpm)
+            _limiter = LLMLimiter(backend)
+        return _limiter
+
+
+@contextlib.contextmanager
+def llm_slot(tokens: int = 0, node: str = "") -> Iterator[None]:
+    """`get_limiter().slot(...)`, o un bloque sin espera si no hay límites."""
+    limiter = get_limiter()
+    if limiter is None:
+        yield
+        return
+    with limiter.slot(tokens, node):
+        yield
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Heurística para reconocer un 429 / cuota agotada del proveedor."""
+    text = f"{type(error).__name__} {error}".lower()
+    return "429" in text or "resourceexhausted" in text or "rate limit" in text or "quota" in text
+
+
+__all__ = ["LLMLimiter", "get_limiter", "llm_slot", "is_rate_limit_error"]
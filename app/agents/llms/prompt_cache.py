@@ -0,0 +1,136 @@
+"""
+Prefijo estático de los prompts y caché de contexto del proveedor.
+
+Los nodos arman sus mensajes con todo lo estático al inicio (los
+SystemMessage, con prompts del registro o constantes del módulo) y el
+contenido variable al final, en el HumanMessage. Así el prefijo es idéntico
+byte a byte entre llamadas y el proveedor puede reutilizarlo:
+
+- Gemini aplica caché implícito a prefijos repetidos sin configuración; los
+  tokens servidos desde el caché se registran en `llm_cached_tokens`.
+- Con PROMPT_CACHE=gemini se crea además un CachedContent explícito por
+  prefijo (una vez por modelo, renovado al vencer su TTL) y las llamadas
+  envían solo la parte variable. No aplica a llamadas con tools: la API no
+  permite combinarlas con contenido cacheado.
+
+Variables de entorno:
+    PROMPT_CACHE=off                 off | gemini
+    PROMPT_CACHE_MIN_TOKENS=1024     prefijos más cortos no se cachean
+    PROMPT_CACHE_TTL_SECONDS=3600
+
+Métricas, con etiqueta `node`:
+    llm_prefix_tokens                    tamaño estimado del prefijo estático
+    llm_cached_tokens                    tokens leídos del caché (reportados)
+    llm_latency_by_cache_seconds{cache}  latencia con/sin caché explícito
+    prompt_cache{result}                 created | hit | error
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.messages import SystemMessage
+
+from app.agents.llms.cassette import recording, replaying
+from app.agents.llms.gemini import get_gemini_model
+from app.agents.llms.providers import provider_name
+from app.agents.llms.tokens import estimate_tokens
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# clave del prefijo -> (nombre del CachedContent, vence_en)
+_caches: Dict[str, Tuple[str, float]] = {}
+# clave del prefijo -> no reintentar antes de
+_failures: Dict[str, float] = {}
+
+
+def split_prefix(messages: list) -> Tuple[List[SystemMessage], list]:
+    """Separa los SystemMessage iniciales (prefijo estático) del resto."""
+    i = 0
+    while i < len(messages) and isinstance(messages[i], SystemMessage):
+        i += 1
+    return list(messages[:i]), list(messages[i:])
+
+
+def observe_prefix(node: str, messages: list) -> None:
+    prefix, _ = split_prefix(messages)
+    if prefix:
+        metrics.observe("llm_prefix_tokens", estimate_tokens(prefix), node=node)
+
+
+def _enabled() -> bool:
+    # Las grabaciones se indexan con los mensajes completos
+    return (
+        os.getenv("PROMPT_CACHE", "off").lower() == "gemini"
+        and provider_name() == "gemini"
+        and not recording()
+        and not replaying()
+    )
+
+
+def _create(model: str, prefix: List[SystemMessage], ttl: int) -> str:
+    from google.genai import types
+
+    client = get_gemini_model(model).client
+    cache = client.caches.create(
+        model=model,
+        config=types.CreateCachedContentConfig(
+            system_instruction=types.Content(parts=[types.Part(text=str(m.content)) for m in prefix]),
+            ttl=f"{ttl}s",
+        ),
+    )
+    return cache.name
+
+
+def cached_prefix(node: str, model: str, messages: list) -> Optional[Tuple[str, list]]:
+    """
+    (nombre del CachedContent, mensajes sin el prefijo) si el prefijo de
+    `messages` se puede servir desde el caché explícito; None si no.
+    """
+    if not _enabled():
+        return None
+    prefix, rest = split_prefix(messages)
+    if not prefix or not rest:
+        return None
+    if estimate_tokens(prefix) < int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "1024")):
+        return None
+
+    raw = "\x00".join([model] + [str(m.content) for m in prefix])
+    key = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    now = time.monotonic()
+    with _lock:
+        entry = _caches.get(key)
+        if entry is not None and entry[1] > now:
+            metrics.incr("prompt_cache", node=node, result="hit")
+            return entry[0], rest
+        if _failures.get(key, 0) > now:
+            return None
+
+    ttl = int(os.getenv("PROMPT_CACHE_TTL_SECONDS", "3600"))
+    try:
+        name = _create(model, prefix, ttl)
+    except Exception as e:
+        logger.warning("No se pudo crear el caché de contexto para %s: %s", node, e)
+        metrics.incr("prompt_cache", node=node, result="error")
+        with _lock:
+            _failures[key] = now + 300
+        return None
+    with _lock:
+        # Se renueva antes de que venza en el proveedor
+        _caches[key] = (name, now + ttl * 0.9)
+    metrics.incr("prompt_cache", node=node, result="created")
+    return name, rest
+
+
+def discard(name: str) -> None:
+    """Olvida un CachedContent (p. ej. si el proveedor ya lo borró)."""
+    with _lock:
+        for key in [k for k, (n, _) in _caches.items() if n == name]:
+            del _caches[key]
+
+
+__all__ = ["split_prefix", "observe_prefix", "cached_prefix", "discard"]
@@ -0,0 +1,42 @@
+"""
+Selección del proveedor de LLM (variable LLM_PROVIDER).
+
+    - gemini (por defecto): ChatGoogleGenerativeAI, requiere GOOGLE_API_KEY.
+    - openai: endpoint compatible con OpenAI (ver gateway.py), p. ej. un
+      modelo servido en el mismo host. El modelo por defecto es OPENAI_COMPAT_MODEL.
+
+Los niveles de la tabla de ruteo (GEMINI_MODEL_LIGHT/HEAVY) se aplican igual
+sea cual sea el proveedor.
+"""
+import os
+
+from langchain_core.language_models.chat_models import BaseChatModel
+
+
+def provider_name() -> str:
+    return (os.getenv("LLM_PROVIDER", "gemini") or "gemini").lower()
+
+
+def default_model_for_provider() -> str:
+    if provider_name() == "openai":
+        return os.getenv("OPENAI_COMPAT_MODEL", "default")
+    return os.environ.get("GEMINI_MODEL", "gemini-2.5-flash-lite")
+
+
+def create_chat_model(model: str) -> BaseChatModel:
+    """Construye un chat model nuevo de `model` con el proveedor configurado."""
+    provider = provider_name()
+    if provider == "gemini":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(model=model, api_key=os.environ["GOOGLE_API_KEY"])
+    if provider == "openai":
+        from app.agents.llms.gateway import ChatOpenAICompatible
+        return ChatOpenAICompatible(
+            model=model,
+            base_url=os.getenv("OPENAI_COMPAT_BASE_URL", "http://127.0.0.1:8001/v1"),
+            api_key=os.getenv("OPENAI_COMPAT_API_KEY") or None,
+        )
+    raise RuntimeError(f"LLM_PROVIDER desconocido: {provider}")
+
+
+__all__ = ["provider_name", "default_model_for_provider", "create_chat_model"]
@@ -0,0 +1,88 @@
+"""
+Tabla de ruteo: qué modelo atiende cada nodo o schema.
+
+Las clasificaciones binarias (typeInput, TipoCodigo, ValidationResult) no
+necesitan el mismo modelo que la generación de pseudocódigo o el análisis
+narrativo final. Cada nodo/schema se asigna a un nivel:
+
+    - light:   GEMINI_MODEL_LIGHT (por defecto GEMINI_MODEL)
+    - default: GEMINI_MODEL
+    - heavy:   GEMINI_MODEL_HEAVY (por defecto GEMINI_MODEL)
+
+La búsqueda es: nombre del schema, luego nombre del nodo, luego `default`.
+LLM_ROUTES sobrescribe o amplía la tabla, p. ej.:
+
+    LLM_ROUTES="validate_node=heavy,ValidationResult=light"
+
+Si una llamada ruteada a `light` devuelve salida estructurada no parseable,
+se escala al modelo `heavy` (LLM_ESCALATE_ON_PARSE_ERROR=1, por defecto).
+"""
+import os
+from typing import Dict, Optional, Type
+
+from pydantic import BaseModel
+
+from app.agents.llms.gemini import default_model_name
+from app.constants import env_flag
+
+TIERS = ("light", "default", "heavy")
+
+DEFAULT_ROUTES: Dict[str, str] = {
+    # Clasificaciones cortas
+    "typeInput": "light",
+    "TipoCodigo": "light",
+    "ValidationResult": "light",
+    # Generación de texto o código largo
+    "parse_code": "heavy",
+    "fused_front": "heavy",
+    "preparacion_resultado": "heavy",
+}
+
+
+def _parse_routes(value: str) -> Dict[str, str]:
+    routes = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        key, tier = (part.strip() for part in item.split("=", 1))
+        if tier not in TIERS:
+            raise ValueError(f"Nivel de modelo desconocido en LLM_ROUTES: {tier!r}")
+        routes[key] = tier
+    return routes
+
+
+def get_routes() -> Dict[str, str]:
+    """Tabla efectiva: DEFAULT_ROUTES más lo definido en LLM_ROUTES."""
+    return {**DEFAULT_ROUTES, **_parse_routes(os.getenv("LLM_ROUTES", ""))}
+
+
+def tier_model(tier: str) -> str:
+    """Nombre del modelo configurado para `tier`."""
+    if tier == "light":
+        return os.getenv("GEMINI_MODEL_LIGHT") or default_model_name()
+    if tier == "heavy":
+        return os.getenv("GEMINI_MODEL_HEAVY") or default_model_name()
+    return default_model_name()
+
+
+def route_tier(node: str, schema: Optional[Type[BaseModel]] = None) -> str:
+    """Nivel asignado a la llamada de `node` con `schema`."""
+    routes = get_routes()
+    if schema is not None and schema.__name__ in routes:
+        return routes[schema.__name__]
+    return routes.get(node, "default")
+
+
+def escalation_model(tier: str, model: str) -> Optional[str]:
+    """
+    Modelo al que escalar cuando falla el parseo de la salida estructurada,
+    o None si no corresponde (nivel no `light`, escalado desactivado o el
+    modelo `heavy` es el mismo).
+    """
+    if tier != "light" or not env_flag("LLM_ESCALATE_ON_PARSE_ERROR", True):
+        return None
+    heavy = tier_model("heavy")
+    return heavy if heavy != model else None
+
+
+__all__ = ["DEFAULT_ROUTES", "get_routes", "tier_model", "route_tier", "escalation_model"]
@@ -0,0 +1,125 @@
+"""
+Servidor local de reemplazo con la forma de `/v1/chat/completions` de OpenAI.
+
+Sirve para probar LLM_PROVIDER=openai sin un modelo real:
+
+    uvicorn app.agents.llms.standin_server:app --port 8001
+    LLM_PROVIDER=openai OPENAI_COMPAT_BASE_URL=http://127.0.0.1:8001/v1 uvicorn app.api:app
+
+Respuestas:
+    - Con `response_format` json_schema: un objeto mínimo válido para el schema
+      (primer valor de cada enum, "" en strings, 0 en números...).
+    - Con `tools`: una llamada a la primera tool con argumentos mínimos.
+    - Si no: eco del último mensaje del usuario.
+Con `stream: true` el contenido se envía como Server-Sent Events en
+fragmentos de STREAM_CHUNK_CHARS caracteres.
+`GET /stats` retorna cuántas peticiones recibió (útil para ver la coalescencia).
+"""
+import json
+import time
+import uuid
+from typing import Any, Dict, Iterator
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+app = FastAPI(title="LLM stand-in")
+_stats = {"requests": 0}
+
+STREAM_CHUNK_CHARS = 16
+
+
+def _minimo(schema: Dict[str, Any], defs: Dict[str, Any]) -> Any:
+    """Valor mínimo que cumple `schema`."""
+    if "$ref" in schema:
+        return _minimo(defs[schema["$ref"].split("/")[-1]], defs)
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "const" in schema:
+        return schema["const"]
+    for key in ("anyOf", "oneOf", "allOf"):
+        if key in schema:
+            return _minimo(schema[key][0], defs)
+    kind = schema.get("type", "object")
+    if kind == "object":
+        props = schema.get("properties", {})
+        return {name: _minimo(sub, defs) for name, sub in props.items()}
+    if kind == "array":
+        return []
+    if kind == "string":
+        return ""
+    if kind in ("integer", "number"):
+        return 0
+    if kind == "boolean":
+        return True
+    return None
+
+
+def _completion(model: str, message: Dict[str, Any], prompt_chars: int) -> Dict[str, Any]:
+    content = message.get("content") or ""
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_chars // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": (prompt_chars + len(content)) // 4,
+        },
+    }
+
+
+def _sse(completion: Dict[str, Any]) -> Iterator[str]:
+    """La respuesta en chunks `chat.completion.chunk`, como hace OpenAI con `stream: true`."""
+    content = completion["choices"][0]["message"].get("content") or ""
+    base = {"id": completion["id"], "object": "chat.completion.chunk",
+            "created": completion["created"], "model": completion["model"]}
+    for i in range(0, len(content), STREAM_CHUNK_CHARS):
+        delta = {"content": content[i:i + STREAM_CHUNK_CHARS]}
+        chunk = {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+    final = {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+             "usage": completion["usage"]}
+    yield f"data: {json.dumps(final)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+def chat_completions(body: Dict[str, Any]) -> Any:
+    completion = _responder(body)
+    if body.get("stream"):
+        return StreamingResponse(_sse(completion), media_type="text/event-stream")
+    return completion
+
+
+def _responder(body: Dict[str, Any]) -> Dict[str, Any]:
+    _stats["requests"] += 1
+    messages = body.get("messages", [])
+    prompt_chars = sum(len(str(m.get("content") or "")) for m in messages)
+    model = body.get("model", "standin")
+
+    fmt = body.get("response_format") or {}
+    if fmt.get("type") == "json_schema":
+        schema = fmt["json_schema"]["schema"]
+        content = json.dumps(_minimo(schema, schema.get("$defs", {})), ensure_ascii=False)
+        return _completion(model, {"role": "assistant", "content": content}, prompt_chars)
+
+    if body.get("tools"):
+        function = body["tools"][0]["function"]
+        params = function.get("parameters", {})
+        call = {
+            "id": f"call_{uuid.uuid4().hex[:8]}",
+            "type": "function",
+            "function": {"name": function["name"], "arguments": json.dumps(_minimo(params, params.get("$defs", {})))},
+        }
+        return _completion(model, {"role": "assistant", "content": "", "tool_calls": [call]}, prompt_chars)
+
+    last_user = next((m for m in reversed(messages) if m.get("role") == "user"), {})
+    return _completion(model, {"role": "assistant", "content": str(last_user.get("content", ""))}, prompt_chars)
+
+
+@app.get("/stats")
+def stats() -> Dict[str, int]:
+    return dict(_stats)
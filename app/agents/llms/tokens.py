@@ -0,0 +1,77 @@
+"""
+Conteo de tokens y presupuesto por nodo.
+
+Antes de cada llamada se estima el tamaño del input (≈ 4 caracteres por token,
+sin llamar al proveedor) y se compara con el presupuesto del nodo. Después se
+registran los tokens reales reportados por el proveedor (`usage_metadata`).
+
+Presupuestos (tokens de entrada, 0 = sin límite):
+    LLM_TOKEN_BUDGET=0                       presupuesto por defecto
+    LLM_TOKEN_BUDGET_<NODO>=...              p. ej. LLM_TOKEN_BUDGET_PREPARACION_RESULTADO=4000
+
+Métricas (ver app/services/metrics.py), todas con etiqueta `node`:
+    llm_input_tokens_estimated, llm_input_tokens, llm_output_tokens,
+    llm_cached_tokens, llm_token_budget_exceeded
+"""
+import logging
+import math
+import os
+from typing import Any, Optional
+
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+
+
+def _message_text(message: Any) -> str:
+    content = getattr(message, "content", message)
+    if isinstance(content, dict):
+        content = content.get("content", "")
+    if isinstance(content, list):
+        return "".join(
+            part.get("text", "") if isinstance(part, dict) else str(part) for part in content
+        )
+    return str(content)
+
+
+def estimate_tokens(messages: list) -> int:
+    """Estimación local de tokens de una lista de mensajes."""
+    chars = sum(len(_message_text(m)) for m in messages)
+    return math.ceil(chars / CHARS_PER_TOKEN)
+
+
+def get_token_budget(node: str) -> Optional[int]:
+    """Presupuesto de tokens de entrada para `node`, o None si no hay límite."""
+    value = os.getenv(f"LLM_TOKEN_BUDGET_{node.upper()}") or os.getenv("LLM_TOKEN_BUDGET", "0")
+    budget = int(value)
+    return budget if budget > 0 else None
+
+
+def check_budget(node: str, messages: list) -> int:
+    """Registra la estimación y avisa si el nodo excede su presupuesto."""
+    estimated = estimate_tokens(messages)
+    metrics.observe("llm_input_tokens_estimated", estimated, node=node)
+    budget = get_token_budget(node)
+    if budget is not None and estimated > budget:
+        metrics.incr("llm_token_budget_exceeded", node=node)
+        logger.warning(
+            "El prompt de %s excede su presupuesto: ~%d tokens > %d", node, estimated, budget
+        )
+    return estimated
+
+
+def record_usage(node: str, raw_message: Any) -> None:
+    """Registra los tokens reales si el proveedor los reporta."""
+    usage = getattr(raw_message, "usage_metadata", None)
+    if not usage:
+        return
+    metrics.observe("llm_input_tokens", usage.get("input_tokens", 0), node=node)
+    metrics.observe("llm_output_tokens", usage.get("output_tokens", 0), node=node)
+    # Tokens del prompt servidos desde el caché del proveedor (implícito o explícito)
+    cache_read = (usage.get("input_token_details") or {}).get("cache_read", 0)
+    metrics.observe("llm_cached_tokens", cache_read or 0, node=node)
+
+
+__all__ = ["estimate_tokens", "get_token_budget", "check_budget", "record_usage"]
@@ -1,5 +1,7 @@
 from .ast_node import generate_ast_node
 from .code_description import code_description_node
+from .front_fused import fused_front_node
+from .front_speculative import speculative_front_node
 from .initial_decision import initial_decision_node
 from .iterativo_espacial import costo_espacial_iterativo_node
 from .iterativo_temporal import costo_temporal_iterativo_node
@@ -13,6 +15,8 @@ from .validate import validate_node
 __all__ = [
     "generate_ast_node",
     "code_description_node",
+    "fused_front_node",
+    "speculative_front_node",
     "initial_decision_node",
     "costo_espacial_iterativo_node",
     "costo_temporal_iterativo_node",
@@ -1,37 +1,122 @@
+import logging
+
 from app.agents.state import AnalyzerState
 from pydantic import BaseModel
-from typing import Literal
+from typing import Literal, Optional
 from langchain_core.messages import SystemMessage, HumanMessage
-from app.agents.llms.gemini import get_gemini_model
+from app.agents.llms.invoke import invoke_llm
+from app.agents.utils.chunking import codigo_con_contexto, dividir_funciones, mapear_funciones, usar_chunks
 from app.agents.utils.generate_sum import convertir_a_sumatoria
-from app.agents.utils.generate_ast import generate_ast
+from app.agents.utils.generate_ast import SimpleASTParser, recursive_components
+from app.constants import env_flag
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
 
 
 class TipoCodigo(BaseModel):
     tipo: Literal["recursivo", "iterativo"]
 
 
+def modo_por_grafo(pseudocode: str, parser: Optional[SimpleASTParser] = None) -> Optional[str]:
+    """
+    Modo según el grafo de llamadas: primero el del árbol de la gramática y,
+    si el código no la cumple, el de SimpleASTParser ya usado con `parser`.
+    None si ninguno reconoce subrutinas (un parseo vacío cuenta como fallo).
+    """
+    try:
+        from lark.exceptions import LarkError
+
+        from app.agents.utils.gramatica import arbol_sintactico, grafo_llamadas
+    except ImportError:
+        pass
+    else:
+        try:
+            grafo = grafo_llamadas(arbol_sintactico(pseudocode))
+        except LarkError:
+            grafo = {}
+        if grafo:
+            return "recursivo" if recursive_components(grafo) else "iterativo"
+    if parser is not None and parser.functions:
+        return "recursivo" if parser.is_recursive() else "iterativo"
+    return None
+
+
+def detectar_modo_local(pseudocode: str) -> TipoCodigo:
+    """Detección local de recursión usada cuando el LLM no está disponible."""
+    parser = SimpleASTParser()
+    parser.parse(pseudocode)
+    return TipoCodigo(tipo=modo_por_grafo(pseudocode, parser) or "iterativo")
+
+
+def clasificar(system_prompt: str, pseudocode: str) -> TipoCodigo:
+    """
+    Clasifica el pseudocódigo con el LLM. En programas grandes
+    (CHUNK_BY_FUNCTION=1) consulta cada subrutina por separado y basta con
+    que una sea recursiva.
+    """
+    def consultar(code: str) -> TipoCodigo:
+        messages = [SystemMessage(content=system_prompt), HumanMessage(content=code)]
+        return invoke_llm(
+            "generate_ast", messages,
+            schema=TipoCodigo, fallback=lambda _: detectar_modo_local(code),
+        )
+
+    funciones = dividir_funciones(pseudocode)
+    if not usar_chunks(pseudocode, funciones):
+        return consultar(pseudocode)
+    tipos = mapear_funciones(funciones, lambda f: consultar(codigo_con_contexto(f, funciones)))
+    recursivo = any(t.tipo == "recursivo" for t in tipos)
+    return TipoCodigo(tipo="recursivo" if recursivo else "iterativo")
+
+
+def _verificar_con_llm(system_prompt: str, pseudocode: str, modo: str) -> None:
+    """Compara el modo local con el del LLM (solo registra; gana el local)."""
+    output = clasificar(system_prompt, pseudocode)
+    coincide = output.tipo == modo
+    metrics.incr("mode_crosscheck", result="agree" if coincide else "disagree")
+    if not coincide:
+        logger.warning("generate_ast: el grafo de llamadas dice %s y el LLM %s", modo, output.tipo)
+
+
 def generate_ast_node(state: AnalyzerState) -> AnalyzerState:
-    """Genera el AST a partir del pseudocódigo normalizado en el estado."""
+    """
+    Genera el AST a partir del pseudocódigo normalizado en el estado.
+
+    El modo sale del grafo de llamadas (recursión directa o mutua, ver
+    `recursive_components`), sin LLM: el del árbol de la gramática o, si el
+    código no la cumple, el de SimpleASTParser. Con MODE_LLM_CROSSCHECK=1
+    también se consulta al LLM y se registra si coinciden. Si ninguno
+    reconoce subrutinas (error o parseo vacío) se usa la clasificación del
+    LLM (o el modo que ya traiga el estado).
+
+    Precedencia del modo: el grafo de llamadas manda. El `tipo` del frontend
+    fusionado (state["mode"]) se sobrescribe siempre que el grafo decide y
+    solo se conserva cuando el grafo no reconoce subrutinas.
+    """
     system_prompt = "CLASSIFIQUE EL SIGUIENTE PSEUDOCÓDIGO COMO 'recursivo' O 'iterativo'"
     # Leer el prompt del sistema
 
     pseudocode = state["pseudocode"]  # type: ignore
 
-    # Obtener el modelo LLM con structured output
-    llm = get_gemini_model().with_structured_output(TipoCodigo)
-
-    # Generar el AST usando el LLM
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(
-            content=f"{pseudocode}"
-        ),
-    ]
-
-    output = llm.invoke(messages)
-    # Convertir el output a diccionario para almacenar en el estado
-    state["ast"] = generate_ast(state["pseudocode"])['ast']  # type: ignore
-    state["mode"] = output.tipo  # type: ignore
+    # Con PARSE_CODE_AST=1 el AST y el modo ya vienen validados desde parse_code
+    if not state.get("ast"):
+        parser = SimpleASTParser()
+        try:
+            state["ast"] = parser.parse(pseudocode)  # type: ignore
+        except Exception as e:
+            logger.warning("generate_ast: error al parsear: %s", e)
+            parser.functions = []
+            state["ast"] = []  # type: ignore
+        modo = modo_por_grafo(pseudocode, parser)
+        if modo is None:
+            logger.warning("generate_ast: no se reconocieron subrutinas; se usa el LLM")
+            # En modo fusionado el modo ya viene del primer nodo
+            if state.get("mode") not in ("recursivo", "iterativo"):
+                state["mode"] = clasificar(system_prompt, pseudocode).tipo  # type: ignore
+        else:
+            state["mode"] = modo  # type: ignore
+            if env_flag("MODE_LLM_CROSSCHECK"):
+                _verificar_con_llm(system_prompt, pseudocode, modo)
     state["sumatoria"] = convertir_a_sumatoria(state["ast"]) # type: ignore
     return state
@@ -1,6 +1,6 @@
 from app.agents.state import AnalyzerState
-from app.agents.llms.gemini import get_gemini_model
-from langchain_core.messages import SystemMessage, HumanMessage
+from app.agents.llms.invoke import invoke_llm
+from langchain_core.messages import AIMessage, SystemMessage, HumanMessage
 
 
 
@@ -9,11 +9,15 @@ def code_description_node(state: AnalyzerState) -> AnalyzerState:
     Genera una descripción del código basado en el pseudocódigo normalizado.
     """
     pseudocode = state.get("pseudocode", "")
-    gemini = get_gemini_model()
     PROMPT = "Genere una descripcion corta y concisa del siguiente pseudocódigo que mandara el usuario"
     system_message = SystemMessage(content=PROMPT)
     human_message = HumanMessage(content=pseudocode)
-    llm_response = gemini.invoke([system_message, human_message])
+    llm_response = invoke_llm(
+        "code_description",
+        [system_message, human_message],
+        # Sin LLM, la firma de la primera función sirve como descripción mínima
+        fallback=lambda _: AIMessage(content=pseudocode.strip().split("\n")[0]),
+    )
     description = str(llm_response.content)
     state["nl_description"] = description
     return state
\ No newline at end of file
@@ -0,0 +1,79 @@
+from typing import Literal
+
+from pydantic import BaseModel, Field
+from langchain_core.messages import SystemMessage, HumanMessage
+from app.agents.llms.invoke import invoke_llm
+from app.agents.prompts import get_prompt
+from app.agents.nodes.ast_node import detectar_modo_local
+from app.agents.nodes.initial_decision import clasificar_input_local
+from app.agents.nodes.parse_nl_code import parse_code_node
+from app.agents.state import AnalyzerState
+from app.services import metrics
+
+
+class FrontendAnalysis(BaseModel):
+    """
+    Respuesta única que reemplaza a initial_decision, parse_code/code_description
+    y la clasificación recursivo/iterativo de generate_ast.
+    """
+
+    type_input: Literal["lenguaje_natural", "pseudocódigo"] = Field(
+        ..., description="Dice si el input es en lenguaje natural o pseudocódigo."
+    )
+    pseudocode: str = Field(
+        "",
+        description="Pseudocódigo generado cuando el input es lenguaje natural. Vacío si el input ya es pseudocódigo.",
+    )
+    description: str = Field(
+        ..., description="Descripción corta y concisa del algoritmo."
+    )
+    tipo: Literal["recursivo", "iterativo"] = Field(
+        ..., description="Si el pseudocódigo es recursivo o iterativo."
+    )
+
+
+def _fallback_frontend(text: str, error: Exception) -> FrontendAnalysis:
+    """Sin LLM solo se puede continuar si el input ya es pseudocódigo."""
+    if clasificar_input_local(text).type_input != "pseudocódigo":
+        raise error
+    return FrontendAnalysis(
+        type_input="pseudocódigo",
+        pseudocode="",
+        description=text.strip().split("\n")[0],
+        tipo=detectar_modo_local(text).tipo,
+    )
+
+
+def fused_front_node(state: AnalyzerState) -> AnalyzerState:
+    """
+    Clasifica el input, genera el pseudocódigo (si es NL), lo describe y
+    etiqueta su modo en una sola llamada al LLM.
+
+    El modo es provisional: generate_ast_node lo reemplaza por el del grafo
+    de llamadas y solo lo conserva si el grafo no reconoce subrutinas.
+    """
+    PROMPT = get_prompt("NL_TO_CODE") + "\n\n" + get_prompt("FRONTEND_FUSIONADO")
+    system_message = SystemMessage(content=PROMPT)
+    human_message = HumanMessage(content=state["nl_description"])  # type: ignore
+    response: FrontendAnalysis = invoke_llm(
+        "fused_front", [system_message, human_message], schema=FrontendAnalysis,
+        fallback=lambda e: _fallback_frontend(state["nl_description"], e),  # type: ignore
+    )
+
+    if response.type_input == "pseudocódigo":
+        # Igual que initial_decision + code_description
+        state["pseudocode"] = state["nl_description"]  # type: ignore
+        state["nl_description"] = response.description
+    elif not response.pseudocode.strip():
+        # NL sin pseudocódigo: el camino normal NL→código; el modo de la
+        # respuesta fusionada no describe código alguno
+        metrics.incr("fused_front_fallback", reason="empty_pseudocode")
+        parse_code_node(state)
+        if "mode" not in state:
+            state["mode"] = detectar_modo_local(state["pseudocode"]).tipo  # type: ignore
+        return state
+    else:
+        # Igual que parse_code: se conserva la petición original
+        state["pseudocode"] = response.pseudocode
+    state["mode"] = response.tipo
+    return state
@@ -0,0 +1,61 @@
+"""
+Front-end especulativo (SPECULATIVE_FRONTEND=1).
+
+En el flujo normal `code_description` o `parse_code` no empiezan hasta que
+`decicion_node` responde. Aquí la clasificación local (`clasificar_input_local`)
+adivina el resultado y el sucesor probable se lanza junto con la llamada de
+decisión. Si el LLM confirma la apuesta se usa el resultado ya calculado; si
+no, la rama especulativa se cancela (o su resultado se descarta) y se ejecuta
+la rama correcta.
+"""
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict
+
+from app.agents.nodes.code_description import code_description_node
+from app.agents.nodes.initial_decision import clasificar_input_local, initial_decision_node
+from app.agents.nodes.parse_nl_code import parse_code_node
+from app.agents.state import AnalyzerState
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Pool compartido: una rama descartada sigue corriendo en segundo plano sin
+# bloquear al nodo (un `with ThreadPoolExecutor` esperaría a que termine).
+_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="speculative-front")
+
+
+def _estado_decidido(state: AnalyzerState, es_pseudocodigo: bool) -> Dict[str, Any]:
+    """Estado que dejaría `initial_decision_node` con la decisión dada."""
+    text = state["nl_description"]  # type: ignore
+    if es_pseudocodigo:
+        return {**state, "pseudocode": text, "nl_description": ""}
+    return {**state, "pseudocode": ""}
+
+
+def _sucesor(es_pseudocodigo: bool):
+    return code_description_node if es_pseudocodigo else parse_code_node
+
+
+def speculative_front_node(state: AnalyzerState) -> AnalyzerState:
+    """
+    Equivale a decicion_node → [code_description | parse_code], con el sucesor
+    adivinado corriendo en paralelo a la decisión.
+    """
+    apuesta = clasificar_input_local(state["nl_description"]).type_input == "pseudocódigo"  # type: ignore
+    especulado: Future = _pool.submit(_sucesor(apuesta), _estado_decidido(state, apuesta))
+
+    decidido = initial_decision_node(dict(state))  # type: ignore
+    es_pseudocodigo = decidido.get("pseudocode", "") != ""
+
+    if es_pseudocodigo == apuesta:
+        metrics.incr("speculation", node="speculative_front", result="hit")
+        resultado = especulado.result()
+    else:
+        metrics.incr("speculation", node="speculative_front", result="miss")
+        if not especulado.cancel():
+            logger.info("Descartando rama especulativa en curso (%s)", _sucesor(apuesta).__name__)
+        resultado = _sucesor(es_pseudocodigo)(decidido)
+
+    state.update(resultado)  # type: ignore
+    return state
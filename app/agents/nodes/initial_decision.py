@@ -1,8 +1,12 @@
+import re
 from app.agents.state import AnalyzerState
 from pydantic import BaseModel, Field
 from langchain_core.messages import SystemMessage, HumanMessage
-from app.agents.llms.gemini import get_gemini_model
-from typing import Literal
+from app.agents.llms.invoke import invoke_llm
+from app.constants import ARROW, env_flag
+from app.services import metrics
+from app.services.utils.normalization import KEYWORDS
+from typing import Literal, Tuple
 
 
 class typeInput(BaseModel):
@@ -15,16 +19,107 @@ class typeInput(BaseModel):
     )
 
 
+# ═══════════════════════════════════════════════════════════════════════════════
+# CLASIFICADOR LOCAL
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Con puntaje >= PSEUDOCODIGO_SEGURO o < LENGUAJE_NATURAL_SEGURO la decisión
+# es local; entre ambos se consulta al LLM. Un texto corto sin rasgos de
+# ninguno de los dos ("merge sort") puntúa 0 y también va al LLM.
+PSEUDOCODIGO_SEGURO = 5.0
+LENGUAJE_NATURAL_SEGURO = 0.0
+# Punto de corte cuando no hay LLM (fallback y front-end especulativo)
+CORTE = 2.5
+
+_KEYWORDS = {kw.lower() for kw in KEYWORDS} | {"call", "to"}
+_STOPWORDS = {
+    "de", "la", "el", "que", "en", "un", "una", "para", "los", "las", "por",
+    "con", "del", "se", "dado", "dada", "quiero", "algoritmo", "calcule",
+    "encuentre", "haga", "escriba", "sobre", "cada", "todos", "como", "cual",
+    # Inglés; sin "a", "i", "and", "or", "for", "return": son nombres de
+    # variable o palabras clave del pseudocódigo
+    "the", "of", "that", "given", "an", "in", "on", "over", "with", "from",
+    "into", "is", "are", "which", "this", "its", "it", "by", "find", "finds",
+    "write", "compute", "computes", "algorithm", "each", "using", "want",
+}
+_RASGOS = (
+    # (regex, peso)
+    (re.compile(rf"{ARROW}"), 3.0),
+    (re.compile(r"\bbegin\b[\s\S]*\bend\b", re.I), 3.0),
+    (re.compile(r"\bCALL\s+\w+\s*\("), 2.0),
+    (re.compile(r"^\s*for\b.+\bto\b.+\bdo\b", re.I | re.M), 2.0),
+    (re.compile(r"^\s*while\s*\(.+\)\s*do\b", re.I | re.M), 2.0),
+    (re.compile(r"^\s*if\b.+\bthen\b", re.I | re.M), 1.0),
+    (re.compile(r"^\s*repeat\b[\s\S]*^\s*until\b", re.I | re.M), 2.0),
+    (re.compile(r"^\s*[A-Za-z_]\w*\s*\([^)]*\)\s*$", re.M), 1.0),
+    (re.compile(r"(←|<-|:=)"), 1.0),
+)
+
+
+def puntuar_entrada(text: str) -> float:
+    """
+    Puntaje de "parece pseudocódigo": suma los rasgos de la gramática
+    (flecha, begin/end, CALL, for..to..do...) y la proporción de líneas que
+    empiezan con una palabra clave, y resta si el texto se lee como prosa.
+    """
+    text = text or ""
+    puntaje = sum(peso for regex, peso in _RASGOS if regex.search(text))
+
+    lineas = [l.strip() for l in text.split("\n") if l.strip()]
+    if lineas:
+        con_keyword = sum(
+            1 for l in lineas if re.split(r"[\s(]", l.lower(), maxsplit=1)[0] in _KEYWORDS
+        )
+        puntaje += 2.0 * con_keyword / len(lineas)
+
+    palabras = re.findall(r"[a-záéíóúñ]+", text.lower())
+    if palabras:
+        prosa = sum(1 for p in palabras if p in _STOPWORDS) / len(palabras)
+        if prosa > 0.15:
+            puntaje -= 3.0
+        elif prosa > 0.08:
+            puntaje -= 1.0
+    if len(lineas) <= 2 and re.search(r"[.?!]\s*$", text.strip()):
+        puntaje -= 1.0
+    return puntaje
+
+
+def clasificar_input_heuristico(text: str) -> Tuple[typeInput, bool]:
+    """(clasificación, es_confiable) según `puntuar_entrada`."""
+    puntaje = puntuar_entrada(text)
+    tipo = "pseudocódigo" if puntaje >= CORTE else "lenguaje_natural"
+    confiable = puntaje >= PSEUDOCODIGO_SEGURO or puntaje < LENGUAJE_NATURAL_SEGURO
+    return typeInput(type_input=tipo), confiable
+
+
+def clasificar_input_local(text: str) -> typeInput:
+    """Clasificación local usada cuando el LLM no está disponible."""
+    return clasificar_input_heuristico(text)[0]
+
+
 def initial_decision_node(state: AnalyzerState) -> AnalyzerState:
     """
     Decide si el input es en lenguaje natural o pseudocódigo.
+
+    Si el clasificador local está seguro (INITIAL_DECISION_LOCAL, activo por
+    defecto) no se llama al LLM; la métrica `initial_decision{source}` da la
+    tasa de decisiones locales.
     """
-    gemini = get_gemini_model()
-    PROMPT = "Diga si el siguiente texto es pseudocódigo o una peticion para hacer un codigo en lenguaje natural. Responda solo con 'lenguaje_natural' o 'pseudocódigo'"
-    system_message = SystemMessage(content=PROMPT)
-    human_message = HumanMessage(content=state["nl_description"])  # type: ignore
-    llm_structured_output = gemini.with_structured_output(typeInput)
-    response = llm_structured_output.invoke([system_message, human_message])
+    text = state["nl_description"]  # type: ignore
+    response, confiable = clasificar_input_heuristico(text)
+    if confiable and env_flag("INITIAL_DECISION_LOCAL", True):
+        metrics.incr("initial_decision", source="local", type=response.type_input)
+    else:
+        PROMPT = "Diga si el siguiente texto es pseudocódigo o una peticion para hacer un codigo en lenguaje natural. Responda solo con 'lenguaje_natural' o 'pseudocódigo'"
+        system_message = SystemMessage(content=PROMPT)
+        human_message = HumanMessage(content=text)
+        response = invoke_llm(
+            "decicion_node",
+            [system_message, human_message],
+            schema=typeInput,
+            fallback=lambda _: clasificar_input_local(text),
+        )
+        metrics.incr("initial_decision", source="llm", type=response.type_input)  # type: ignore
     if response.type_input == "pseudocódigo":  # type: ignore
         state["pseudocode"] = state["nl_description"] # type: ignore
         state["nl_description"] = ""
@@ -1,7 +1,6 @@
-from app.agents.tools.tools_iterativas import resolver_sumatorias
-from langchain_core.messages import SystemMessage, HumanMessage
 from app.agents.state import AnalyzerState
-from app.agents.llms.geminiWithTools import get_gemini_with_tools_model
+from app.agents.utils.casos_iterativos import calcular_casos
+from app.agents.utils.compact import compact_ast, compact_pseudocode
 
 
 def costo_espacial_iterativo_node(state: AnalyzerState) -> AnalyzerState:
@@ -19,40 +18,13 @@ def costo_espacial_iterativo_node(state: AnalyzerState) -> AnalyzerState:
             "big_Omega_espacial": "",
         }
     
-    prompts = []
-    folder = "./app/agents/prompts/iterativos/espacial"
-    files = [
-        f"{folder}/CASO_PROMEDIO.md",
-        f"{folder}/MEJOR_CASO.md",
-        f"{folder}/PEOR_CASO.md",
-    ]
-    for file in files:
-        with open(file, "r", encoding="utf-8") as f:
-            prompts.append(f.read())
-    
-    # Ejecutar de manera iterativa
-    results = []
-    for i, prompt in enumerate(prompts):
-        gemini = get_gemini_with_tools_model([resolver_sumatorias])
-        system_message = SystemMessage(content=prompt)
-        human_message = HumanMessage(content=f"Calcule la complejidad espacial de esto: {state['pseudocode']}\n\nAST: {state['ast']}\n\n")  # type: ignore
-        messages = [system_message, human_message]
-        response = gemini.invoke(messages)
-        
-        # Si el modelo llamó a una tool, ejecutarla
-        if hasattr(response, "tool_calls") and response.tool_calls:
-            result = resolver_sumatorias.invoke(response.tool_calls[0]["args"])
-        else:
-            result = response.content
-        
-        results.append((i, result))
-    
-    # Asignar resultados
-    for i, result in results:
-        if i == 2:
-            state["ecuaciones"]["big_O_espacial"] = result  # type: ignore
-        elif i == 1:
-            state["ecuaciones"]["big_Omega_espacial"] = result  # type: ignore
-        elif i == 0:
-            state["ecuaciones"]["big_Theta_espacial"] = result  # type: ignore
+    # Mejor, promedio y peor caso (una llamada fusionada por defecto)
+    casos = calcular_casos(
+        "calcular_costo_espacial_iterativo",
+        "iterativos/espacial",
+        f"Calcule la complejidad espacial de esto: {compact_pseudocode(state['pseudocode'])}\n\nAST: {compact_ast(state['ast'])}\n\n",  # type: ignore
+    )
+    state["ecuaciones"]["big_O_espacial"] = casos["o"]  # type: ignore
+    state["ecuaciones"]["big_Omega_espacial"] = casos["omega"]  # type: ignore
+    state["ecuaciones"]["big_Theta_espacial"] = casos["theta"]  # type: ignore
     return state
@@ -1,8 +1,6 @@
-from app.agents.tools.tools_iterativas import resolver_sumatorias
-from langchain_core.messages import SystemMessage, HumanMessage
-from app.agents.state import AnalyzerState
-from app.agents.llms.geminiWithTools import get_gemini_with_tools_model
 from app.agents.state import AnalyzerState
+from app.agents.utils.casos_iterativos import calcular_casos
+from app.agents.utils.compact import compact_pseudocode
 from app.agents.utils.costo_lineas import analizar_costo_lineas
 
 
@@ -31,50 +29,23 @@ def costo_temporal_iterativo_node(state: AnalyzerState) -> AnalyzerState:
             "costos": [],
         }
     
-    prompts = []
-    folder = "./app/agents/prompts/iterativos/temporal"
-    files = [
-        f"{folder}/CASO_PROMEDIO.md",
-        f"{folder}/MEJOR_CASO.md",
-        f"{folder}/PEOR_CASO.md",
-    ]
-    for file in files:
-        with open(file, "r", encoding="utf-8") as f:
-            prompts.append(f.read())
     context = {
         "code": state["pseudocode"],  # type: ignore
         "ast": state["ast"],  # type: ignore
         "sumatoria": state["sumatoria"],  # type: ignore
     }
-    gemini = get_gemini_with_tools_model([resolver_sumatorias])
-
-    
-    # Execute prompts iteratively
-    results = []
-    for i, prompt in enumerate(prompts):
-        system_message = SystemMessage(content=prompt)
-        human_message = HumanMessage(
-            content=f"Calcule la complejidad temporal de esto: {context['code']}\n\nSumatoria: {context['sumatoria']}"
-        )
-        messages = [system_message, human_message]
-        response = gemini.invoke(messages)
 
-        # Si el modelo llamó a una tool, ejecutarla
-        if hasattr(response, "tool_calls") and response.tool_calls:
-            result = resolver_sumatorias.invoke(response.tool_calls[0]["args"])
-        else:
-            result = response.content
-        
-        results.append((i, result))
-    
-    # Process results
-    for i, result in results:
-        if i == 2:
-            state["ecuaciones"]["big_O_temporal"] = result  # type: ignore
-        elif i == 1:
-            state["ecuaciones"]["big_Omega_temporal"] = result  # type: ignore
-        elif i == 0:
-            state["ecuaciones"]["big_Theta_temporal"] = result  # type: ignore
+    # Mejor, promedio y peor caso (una llamada fusionada por defecto)
+    casos = calcular_casos(
+        "calcular_costo_temporal_iterativo",
+        "iterativos/temporal",
+        f"Calcule la complejidad temporal de esto: {compact_pseudocode(context['code'])}\n\nSumatoria: {context['sumatoria']}",
+        # Sin LLM: la sumatoria de la primera función como cota para los tres casos
+        expresion_respaldo=context["sumatoria"].split("\n")[0].split("=", 1)[-1].strip(),
+    )
+    state["ecuaciones"]["big_O_temporal"] = casos["o"]  # type: ignore
+    state["ecuaciones"]["big_Omega_temporal"] = casos["omega"]  # type: ignore
+    state["ecuaciones"]["big_Theta_temporal"] = casos["theta"]  # type: ignore
     mejor_caso, peor_caso = analizar_costo_lineas(state["pseudocode"])  # type: ignore
     state["costos_mejor"] = mejor_caso  # type: ignore
     state["costos_peor"] = peor_caso  # type: ignore
@@ -1,7 +1,16 @@
+import logging
+
 from pydantic import BaseModel, Field
 from langchain_core.messages import SystemMessage, HumanMessage
-from app.agents.llms.gemini import get_gemini_model
+from app.agents.llms.invoke import invoke_llm
+from app.agents.prompts import get_prompt
 from app.agents.state import AnalyzerState
+from app.agents.utils.ast_json import ASTJson, ast_desde_json, es_recursivo_json, validar_ast_json
+from app.agents.utils.validacion import validar_local
+from app.constants import env_flag
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
 
 
 # https://towardsdev.com/built-with-langgraph-3-structured-outputs-4707284be57e
@@ -16,18 +25,63 @@ class ParceCode(BaseModel):
     )
 
 
+class ParceCodeConAST(ParceCode):
+    """Pseudocódigo junto con su AST en forma plana (ver app/agents/utils/ast_json.py)."""
+
+    ast: ASTJson = Field(
+        ...,
+        description=(
+            "AST del pseudocodigo: por cada subrutina sus parametros y la lista de nodos "
+            "for/while/if/else/call, cada uno con el id de su padre (-1 = cuerpo de la subrutina)."
+        ),
+    )
+
+
+INSTRUCCION_AST = (
+    "Además del pseudocódigo, entrega su AST en el campo 'ast'. Incluye solo los nodos "
+    "for, while, if, else y call (CALL a una subrutina), en el orden en que aparecen; "
+    "un 'else' va justo después de su 'if', con el mismo padre. En un for, 'expresion' "
+    "es el límite superior; en while/if, la condición; en call, el nombre de la subrutina."
+)
+
+
+def _aplicar_ast(state: AnalyzerState, response: ParceCodeConAST) -> bool:
+    """
+    Guarda el AST en el estado si pasa las validaciones locales; así
+    validate_node y generate_ast_node no tienen que volver a llamar al LLM.
+    """
+    errores = validar_ast_json(response.ast)
+    if not errores:
+        _, errores = validar_local(response.code)
+    if errores:
+        logger.info("parse_code: AST estructurado descartado: %s", "; ".join(errores[:3]))
+        metrics.incr("parse_code_ast", result="rejected")
+        return False
+    state["ast"] = ast_desde_json(response.ast)  # type: ignore
+    state["mode"] = "recursivo" if es_recursivo_json(response.ast) else "iterativo"  # type: ignore
+    metrics.incr("parse_code_ast", result="accepted")
+    return True
+
+
 def parse_code_node(state: AnalyzerState) -> AnalyzerState:
     """
     Normaliza el estado del analizador asegurando que todas las claves esperadas estén presentes.
     Si alguna clave falta, se inicializa con un valor predeterminado.
+
+    Con PARSE_CODE_AST=1 la misma llamada devuelve también el AST; si es
+    válido se guarda en state["ast"] junto con el modo.
     """
-    gemini = get_gemini_model()
-    PROMPT = ""
-    with open("./app/agents/prompts/NL_TO_CODE.md", "r", encoding="utf-8") as f:
-        PROMPT = f.read()
-    system_message = SystemMessage(content=PROMPT)
-    human_message = HumanMessage(content=state["nl_description"]) # type: ignore
-    llm_structured_output = gemini.with_structured_output(ParceCode)
-    response = llm_structured_output.invoke([system_message, human_message])
+    PROMPT = get_prompt("NL_TO_CODE")
+    con_ast = env_flag("PARSE_CODE_AST")
+    messages = [SystemMessage(content=PROMPT)]
+    if con_ast:
+        messages.append(SystemMessage(content=INSTRUCCION_AST))
+    messages.append(HumanMessage(content=state["nl_description"]))  # type: ignore
+    # Sin fallback: no hay forma determinística de generar el código
+    response = invoke_llm(
+        "parse_code", messages, schema=ParceCodeConAST if con_ast else ParceCode,
+    )
     state["pseudocode"] = response.code  # type: ignore
+    if con_ast:
+        _aplicar_ast(state, response)  # type: ignore
     return state
@@ -2,12 +2,24 @@
 Nodo para construir la ecuación de recurrencia a partir del AST.
 Este es el primer nodo del flujo recursivo.
 """
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 from pydantic import BaseModel, Field
 from langchain_core.messages import SystemMessage, HumanMessage
+from app.agents.utils.chunking import (
+    FuncionFuente,
+    codigo_con_contexto,
+    dividir_funciones,
+    mapear_funciones,
+    usar_chunks,
+)
+from app.agents.utils.compact import compact_ast, compact_pseudocode
+from app.agents.utils.generate_ast import recursive_components
+from app.agents.utils.recurrencia import extraer_recurrencia
+from app.constants import env_flag
+from app.services import metrics
 
 from app.agents.state import AnalyzerState, RecurrenceInfo, RecurrenceParameters
-from app.agents.llms.gemini import get_gemini_model
+from app.agents.llms.invoke import invoke_llm
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -173,6 +185,61 @@ def get_recurrence_type_name(classification: str) -> str:
 # NODO PRINCIPAL
 # ═══════════════════════════════════════════════════════════════════════════════
 
+# Parte fija de la petición: va en el prefijo estático, antes del código
+INSTRUCCIONES = """Analiza el pseudocódigo que envía el usuario y extrae la ecuación de recurrencia. El AST se incluye como contexto adicional.
+
+Por favor, identifica:
+1. La ecuación de recurrencia T(n) = ...
+2. Los casos base
+3. Los parámetros a, b, f(n)
+4. El tipo de recurrencia"""
+
+
+def _extraer(pseudocode: str, ast: str) -> RecurrenceExtraction:
+    """Pide al LLM la recurrencia del pseudocódigo (ya compactado)."""
+    messages = [
+        SystemMessage(content=SYSTEM_PROMPT),
+        SystemMessage(content=INSTRUCCIONES),
+        HumanMessage(content=f"```\n{pseudocode}\n```\n\nAST:\n{ast}"),
+    ]
+    return invoke_llm("build_recurrence", messages, schema=RecurrenceExtraction)
+
+
+def _extraer_por_funcion(
+    state: AnalyzerState, funciones: List[FuncionFuente]
+) -> Tuple[RecurrenceExtraction, List[str]]:
+    """
+    Extrae la recurrencia de cada subrutina recursiva por separado (en
+    paralelo) y se queda con la de la principal: la primera que ninguna otra
+    subrutina recursiva invoca. Retorna también las líneas de razonamiento de
+    las demás.
+    """
+    en_ciclo = {
+        nombre
+        for componente in recursive_components({f["nombre"]: f["llamadas"] for f in funciones})
+        for nombre in componente
+    }
+    recursivas = [f for f in funciones if f["nombre"] in en_ciclo] or funciones
+    ast_por_nombre = {
+        nombre: funcion for funcion in state.get("ast", []) or [] for nombre in funcion
+    }
+
+    def extraer(funcion: FuncionFuente) -> RecurrenceExtraction:
+        ast = compact_ast([ast_por_nombre[funcion["nombre"]]]) if funcion["nombre"] in ast_por_nombre else ""
+        return _extraer(codigo_con_contexto(funcion, funciones), ast)
+
+    extracciones = mapear_funciones(recursivas, extraer)
+    invocadas = {
+        nombre for f in recursivas for nombre in f["llamadas"] if nombre != f["nombre"]
+    }
+    principal = next((i for i, f in enumerate(recursivas) if f["nombre"] not in invocadas), 0)
+    otras = [
+        f"✓ Recurrencia de {f['nombre']}: {e.recurrence_equation}"
+        for i, (f, e) in enumerate(zip(recursivas, extracciones)) if i != principal
+    ]
+    return extracciones[principal], otras
+
+
 def build_recurrence_node(state: AnalyzerState) -> AnalyzerState:
     """
     Nodo que construye la ecuación de recurrencia a partir del pseudocódigo.
@@ -184,42 +251,30 @@ def build_recurrence_node(state: AnalyzerState) -> AnalyzerState:
     Output al estado:
         - recurrence: RecurrenceInfo con la ecuación y parámetros
         - razonamiento: Pasos del análisis agregados
+
+    Con RECURRENCE_LOCAL=1 (por defecto) las formas estándar (n-k, n/b,
+    mitades de un rango, tipo Fibonacci) se leen del árbol sintáctico sin
+    LLM; ver app/agents/utils/recurrencia.py.
     """
-    pseudocode = state.get("pseudocode", "")
-    ast = state.get("ast", {})
-    
     # Inicializar razonamiento si no existe
     if "razonamiento" not in state:
         state["razonamiento"] = []
     
     state["razonamiento"].append("═══ FASE 1: Construcción de Ecuación de Recurrencia ═══")
     
-    # Obtener modelo LLM con structured output
-    gemini = get_gemini_model()
-    llm_structured = gemini.with_structured_output(RecurrenceExtraction)
-    
-    # Crear mensajes
-    system_message = SystemMessage(content=SYSTEM_PROMPT)
-    human_message = HumanMessage(
-        content=f"""Analiza el siguiente pseudocódigo y extrae la ecuación de recurrencia:
-
-```
-{pseudocode}
-```
-
-AST (para contexto adicional):
-{ast}
-
-Por favor, identifica:
-1. La ecuación de recurrencia T(n) = ...
-2. Los casos base
-3. Los parámetros a, b, f(n)
-4. El tipo de recurrencia"""
-    )
-    
-    # Invocar LLM
     try:
-        extraction: RecurrenceExtraction = llm_structured.invoke([system_message, human_message])
+        pseudocode = state.get("pseudocode", "")
+        funciones = dividir_funciones(pseudocode)
+        otras: List[str] = []
+        local = extraer_recurrencia(pseudocode) if env_flag("RECURRENCE_LOCAL", True) else None
+        metrics.incr("recurrence_extraction", source="local" if local else "llm")
+        if local is not None:
+            extraction = RecurrenceExtraction(**local)
+        elif usar_chunks(pseudocode, funciones):
+            # CHUNK_BY_FUNCTION=1: solo las subrutinas recursivas, por separado
+            extraction, otras = _extraer_por_funcion(state, funciones)
+        else:
+            extraction = _extraer(compact_pseudocode(pseudocode), compact_ast(state.get("ast", {})))
         
         # Determinar si es división o resta
         is_division = extraction.division_factor > 1
@@ -258,6 +313,7 @@ Por favor, identifica:
         state["razonamiento"].append(f"✓ Parámetros: a={extraction.num_recursive_calls}, b={extraction.division_factor}, f(n)={extraction.non_recursive_work}")
         state["razonamiento"].append(f"✓ Clasificación: {classification} - {get_recurrence_type_name(classification)}")
         state["razonamiento"].append(f"✓ Explicación: {extraction.explanation}")
+        state["razonamiento"].extend(otras)
         
     except Exception as e:
         # En caso de error, crear recurrencia por defecto
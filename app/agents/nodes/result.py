@@ -1,7 +1,16 @@
+from typing import Any, Callable, Dict, Optional
+
+import sympy as sp
 from pydantic import BaseModel, Field
-from app.agents.llms.gemini import get_gemini_model
+from app.agents.llms.invoke import invoke_llm, stream_llm
+from app.agents.prompts import get_prompt
 from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.config import get_stream_writer
 from app.agents.state import AnalyzerState
+from app.agents.tools.tools_recursivas import analyze_recurrence
+from app.agents.utils.chunking import dividir_funciones, usar_chunks
+from app.agents.utils.compact import compact_ast, compact_mapping, compact_pseudocode
 
 
 class NotacionesYAnalisis(BaseModel):
@@ -27,19 +36,162 @@ class NotacionesYAnalisis(BaseModel):
     big_Omega_espacial: str
 
 
-def result_node(state: AnalyzerState) -> AnalyzerState:
+def _notacion(valor: Any, simbolo: str) -> str:
+    """Convierte una expresión de costo (sympy o texto) a notación asintótica."""
+    if isinstance(valor, sp.Expr):
+        n = sp.Symbol("n")
+        termino = sp.O(valor, (n, sp.oo)).args[0] if n in valor.free_symbols else 1
+        return f"{simbolo}({termino})"
+    return str(valor)
+
+
+def resultado_local(state: AnalyzerState) -> NotacionesYAnalisis:
+    """
+    Resultado determinístico a partir de lo ya calculado en el estado.
+    Se usa cuando el LLM no está disponible.
+    """
+    ecuaciones = dict(state.get("ecuaciones") or {})
+    recurrence = state.get("recurrence") or {}
+    if recurrence.get("raw") and not ecuaciones.get("big_Theta_temporal"):
+        theta = analyze_recurrence(recurrence["raw"]).primary_result.complexity or ""
+        ecuaciones["big_Theta_temporal"] = theta
+        ecuaciones["big_O_temporal"] = theta.replace("Θ", "O")
+        ecuaciones["big_Omega_temporal"] = theta.replace("Θ", "Ω")
+
+    notacion = {
+        "big_O_temporal": _notacion(ecuaciones.get("big_O_temporal", ""), "O"),
+        "big_O_espacial": _notacion(ecuaciones.get("big_O_espacial", ""), "O"),
+        "big_Theta_temporal": _notacion(ecuaciones.get("big_Theta_temporal", ""), "Θ"),
+        "big_Theta_espacial": _notacion(ecuaciones.get("big_Theta_espacial", ""), "Θ"),
+        "big_Omega_temporal": _notacion(ecuaciones.get("big_Omega_temporal", ""), "Ω"),
+        "big_Omega_espacial": _notacion(ecuaciones.get("big_Omega_espacial", ""), "Ω"),
+    }
+    lineas = [
+        "Análisis generado sin LLM (proveedor no disponible).",
+        "",
+        state.get("pseudocode", ""),
+        "",
+    ]
+    if recurrence.get("raw"):
+        lineas.append(f"Recurrencia: {recurrence['raw']}")
+    lineas += [f"{clave}: {valor}" for clave, valor in notacion.items()]
+    lineas += state.get("razonamiento", [])
+    return NotacionesYAnalisis(analisis="\n".join(lineas), **notacion)
+
+
+NOTACIONES = (
+    "big_O_temporal",
+    "big_O_espacial",
+    "big_Theta_temporal",
+    "big_Theta_espacial",
+    "big_Omega_temporal",
+    "big_Omega_espacial",
+)
+
+
+def _esquema_streaming() -> Dict[str, Any]:
+    """
+    Schema JSON con las notaciones antes que `analisis`: así llegan (y se
+    envían al cliente) primero, y luego se transmite la narrativa.
+    """
+    esquema = NotacionesYAnalisis.model_json_schema()
+    props = esquema["properties"]
+    esquema["properties"] = {k: props[k] for k in (*NOTACIONES, "analisis")}
+    return esquema
+
+
+class EmisorResultado:
+    """
+    Traduce los dicts parciales del stream a eventos para el cliente:
+        {"event": "notation", "field": ..., "value": ...}   (una vez, ya completa)
+        {"event": "analisis", "delta": ...}                 (texto nuevo)
+        {"event": "analisis", "replace": ...}               (texto completo que
+                                                              reemplaza lo enviado)
+    """
+
+    def __init__(self, writer: Callable[[Dict[str, Any]], None]):
+        self.writer = writer
+        self.enviado = ""
+        self.notaciones: Dict[str, Any] = {}
+
+    def _notacion(self, campo: str, valor: Any) -> None:
+        if campo not in self.notaciones and valor:
+            self.notaciones[campo] = valor
+            self.writer({"event": "notation", "field": campo, "value": valor})
+
+    def __call__(self, parcial: Dict[str, Any]) -> None:
+        claves = list(parcial)
+        # Un campo está completo cuando el modelo ya empezó el siguiente
+        for campo in claves[:-1]:
+            if campo in NOTACIONES:
+                self._notacion(campo, parcial[campo])
+        analisis = parcial.get("analisis")
+        if isinstance(analisis, str) and analisis.startswith(self.enviado) and len(analisis) > len(self.enviado):
+            self.writer({"event": "analisis", "delta": analisis[len(self.enviado):]})
+            self.enviado = analisis
+
+    def cerrar(self, response: NotacionesYAnalisis) -> None:
+        """
+        Envía lo que falte de la respuesta final. Si el stream falló a mitad
+        y la respuesta vino del fallback, lo ya enviado no es un prefijo: se
+        reemplaza el texto y se reenvían las notaciones que cambiaron.
+        """
+        for campo in NOTACIONES:
+            valor = getattr(response, campo)
+            if campo in self.notaciones and valor and self.notaciones[campo] != valor:
+                self.notaciones[campo] = valor
+                self.writer({"event": "notation", "field": campo, "value": valor})
+            else:
+                self._notacion(campo, valor)
+        if self.enviado and not response.analisis.startswith(self.enviado):
+            self.writer({"event": "analisis", "replace": response.analisis})
+            self.enviado = response.analisis
+            return
+        self({"analisis": response.analisis})
+
+
+def _codigo_para_resumen(code: str) -> str:
+    """
+    En programas grandes (CHUNK_BY_FUNCTION=1) el resumen recibe solo las
+    firmas de las subrutinas: el AST compacto ya describe su estructura.
+    """
+    funciones = dividir_funciones(code)
+    if usar_chunks(code, funciones):
+        return "Subrutinas:\n" + "\n".join(f["firma"] for f in funciones)
+    return compact_pseudocode(code)
+
+
+def result_node(state: AnalyzerState, config: Optional[RunnableConfig] = None) -> AnalyzerState:
     """
     Genera un resumen en lenguaje natural del análisis realizado.
+
+    Con `configurable.stream_result` (endpoint /api/v2/analyze/stream) la
+    respuesta se pide en streaming y se emite como eventos `custom` del grafo.
     """
-    gemini = get_gemini_model()
-    gemini_structured = gemini.with_structured_output(NotacionesYAnalisis)
-    PROMPT = ""
-    with open("./app/agents/prompts/GENERAR_RESULT.md", "r", encoding="utf-8") as f:
-        PROMPT = f.read()
+    PROMPT = get_prompt("GENERAR_RESULT")
     system_message = SystemMessage(content=PROMPT)
-    human_message = HumanMessage(content=f"El análisis realizado tiene los siguientes resultados:\n\n{state['pseudocode']}\n\n{state['ast']}\n\n{state['ecuaciones']}")  # type: ignore
+    human_message = HumanMessage(
+        content=(
+            "El análisis realizado tiene los siguientes resultados:\n\n"
+            f"{_codigo_para_resumen(state.get('pseudocode', ''))}\n\n"
+            f"AST:\n{compact_ast(state.get('ast'))}\n\n"
+            f"{compact_mapping(state.get('ecuaciones', {}))}"
+        )
+    )
     messages = [system_message, human_message]
-    response = gemini_structured.invoke(messages)
+    if ((config or {}).get("configurable") or {}).get("stream_result"):
+        emisor = EmisorResultado(get_stream_writer())
+        response = stream_llm(
+            "preparacion_resultado", messages,
+            schema=NotacionesYAnalisis, on_partial=emisor, json_schema=_esquema_streaming(),
+            fallback=lambda _: resultado_local(state),
+        )
+        emisor.cerrar(response)
+    else:
+        response = invoke_llm(
+            "preparacion_resultado", messages,
+            schema=NotacionesYAnalisis, fallback=lambda _: resultado_local(state),
+        )
     state["result"] = response.analisis  # type: ignore
     state["notation"] = {
         "big_O_temporal": response.big_O_temporal,  # type: ignore
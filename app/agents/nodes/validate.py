@@ -1,8 +1,25 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional, Tuple
+
 from pydantic import BaseModel
-from app.agents.llms.gemini import get_gemini_model
+from app.agents.llms.invoke import invoke_llm
+from app.agents.prompts import get_prompt
 from app.agents.state import AnalyzerState
+from app.agents.utils.chunking import codigo_con_contexto, dividir_funciones, mapear_funciones, usar_chunks
+from app.agents.utils.reparacion import reparar_local
+from app.agents.utils.validacion import validar_local
+from app.constants import env_flag
+from app.services import metrics
 from langchain_core.messages import SystemMessage, HumanMessage
 
+logger = logging.getLogger(__name__)
+
+# Pool compartido: los candidatos perdedores terminan en segundo plano sin
+# bloquear al nodo
+_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="validate-repair")
+
 class ValidationResult(BaseModel):
     is_valid: bool
     errors: list[str]
@@ -15,31 +32,176 @@ class CodeFixed(BaseModel):
     code: str
 
 
+# Si el LLM no responde, se continúa con el código tal cual
+_skip_validation = lambda _: ValidationResult(is_valid=True, errors=[])
+
+
+def _validar_llm(code: str) -> ValidationResult:
+    return invoke_llm(
+        "validate_node",
+        [SystemMessage(content=get_prompt("SINTAXE")), HumanMessage(content=code)],
+        schema=ValidationResult, fallback=_skip_validation,
+    )
+
+
+def _usar_gramatica() -> bool:
+    """La gramática formal valida sin LLM (VALIDATE_GRAMMAR=0 vuelve al LLM)."""
+    return env_flag("VALIDATE_GRAMMAR", True)
+
+
+def _validar(code: str, usar_local: bool) -> ValidationResult:
+    if usar_local:
+        es_valido, errores = validar_local(code)
+        return ValidationResult(is_valid=es_valido, errors=errores)
+    funciones = dividir_funciones(code)
+    if not usar_chunks(code, funciones):
+        return _validar_llm(code)
+    # Una llamada por subrutina (CHUNK_BY_FUNCTION=1); errores con su origen
+    parciales = mapear_funciones(funciones, lambda f: _validar_llm(codigo_con_contexto(f, funciones)))
+    return ValidationResult(
+        is_valid=all(r.is_valid for r in parciales),
+        errors=[f"{f['nombre']}: {e}" for f, r in zip(funciones, parciales) for e in r.errors],
+    )
+
+
+# Parte fija de la petición de corrección (prefijo estático)
+INSTRUCCION_CORRECCION = (
+    "El usuario envía la descripción de un algoritmo y un código con errores de sintaxis. "
+    "Por favor arregle la sintaxe del código."
+)
+
+
+def _pedir_correccion(state: AnalyzerState, code: str, errores: List[str], variante: int = 0) -> str:
+    contenido = f"Descripción: {state['nl_description']}\n\nCódigo:\n{code}"  # type: ignore
+    if errores:
+        contenido += "\n\nErrores detectados:\n" + "\n".join(f"- {e}" for e in errores)
+    if variante:
+        # Distingue los candidatos paralelos (mismo prompt => misma respuesta)
+        contenido += f"\n\n(Propuesta alternativa #{variante + 1}: usa una corrección distinta si es posible.)"
+    response = invoke_llm(
+        "validate_node",
+        [
+            SystemMessage(content=get_prompt("NL_TO_CODE")),
+            SystemMessage(content=INSTRUCCION_CORRECCION),
+            HumanMessage(content=contenido),
+        ],
+        schema=CodeFixed,
+        # Sin LLM se continúa con el código actual (como _skip_validation)
+        fallback=lambda _: CodeFixed(code=code),
+    )
+    return response.code  # type: ignore
+
+
+def _reparar_serial(state: AnalyzerState, code: str, errores: List[str], rondas: int) -> str:
+    """Corrige y re-valida, una ronda a la vez."""
+    for _ in range(rondas):
+        corregido = _pedir_correccion(state, code, errores)
+        if corregido == code:
+            # Sin cambios (p. ej. el LLM no está disponible): otra ronda no ayuda
+            break
+        code = corregido
+        validacion = _validar(code, env_flag("VALIDATE_LOCAL", _usar_gramatica()))
+        if validacion.is_valid:
+            return code
+        errores = validacion.errors
+    logger.warning("validate_node: código aún inválido tras %d rondas de corrección", rondas)
+    return code
+
+
+def _reparar_paralelo(state: AnalyzerState, code: str, errores: List[str], rondas: int) -> str:
+    """
+    En cada ronda pide N correcciones a la vez y las valida en paralelo
+    (localmente por defecto); gana el primer candidato válido y el resto se
+    cancela o descarta.
+    """
+    n = int(os.getenv("VALIDATE_CANDIDATES", "3"))
+    usar_local = env_flag("VALIDATE_LOCAL", True)
+
+    def candidato(variante: int) -> Tuple[str, ValidationResult]:
+        corregido = _pedir_correccion(state, code, errores, variante)
+        return corregido, _validar(corregido, usar_local)
+
+    for ronda in range(rondas):
+        futuros = [_pool.submit(candidato, i) for i in range(n)]
+        mejor: Optional[Tuple[str, ValidationResult]] = None
+        for futuro in as_completed(futuros):
+            try:
+                corregido, validacion = futuro.result()
+            except Exception as e:
+                logger.warning("validate_node: candidato falló: %s", e)
+                continue
+            if validacion.is_valid:
+                for otro in futuros:
+                    otro.cancel()
+                metrics.incr("validate_repair", mode="parallel", result="valid", round=ronda + 1)
+                return corregido
+            if mejor is None or len(validacion.errors) < len(mejor[1].errors):
+                mejor = (corregido, validacion)
+        if mejor is not None:
+            code, errores = mejor[0], mejor[1].errors
+    metrics.incr("validate_repair", mode="parallel", result="exhausted")
+    logger.warning("validate_node: ningún candidato válido tras %d rondas", rondas)
+    return code
+
+
+def _reparar_local(code: str) -> Tuple[str, ValidationResult, List[str]]:
+    """
+    Correcciones deterministas antes del LLM (VALIDATE_AUTOREPAIR=1). Si no
+    logran un código válido se conservan igual y el corrector recibe los
+    errores restantes.
+    """
+    reparado, cambios = reparar_local(code)
+    es_valido, pendientes = validar_local(reparado)
+    metrics.incr("validate_autorepair", result="fixed" if es_valido else "partial")
+    return reparado, ValidationResult(is_valid=es_valido, errors=pendientes), cambios
+
+
 def validate_node(state: AnalyzerState) -> AnalyzerState:
     """
     Nodo para validar el pseudocódigo proporcionado en el estado del analizador.
     Se ejecutra antes de generar el AST y puede corregir errores menores en el pseudocódigo.
+
+    La corrección tiene un máximo de VALIDATE_MAX_ROUNDS rondas. Con
+    VALIDATE_REPAIR_MODE=parallel cada ronda genera VALIDATE_CANDIDATES
+    correcciones concurrentes en vez de una.
+
+    La validación usa la gramática formal (VALIDATE_GRAMMAR=1, por defecto):
+    un código válido no hace ninguna llamada al LLM y uno inválido manda al
+    corrector solo la lista de errores con línea y columna. Si parse_code ya
+    entregó un AST estructurado (PARSE_CODE_AST=1), también basta con la
+    validación local.
+
+    Antes de llamar al corrector del LLM se aplican las correcciones locales
+    de `reparacion.py`; las aplicadas quedan en state["validation"].
     """ 
     code = state["pseudocode"]  # type: ignore
-    PROMPT_VALIDATE = ""
-    with open("./app/agents/prompts/SINTAXE.md", "r", encoding="utf-8") as f:
-        PROMPT_VALIDATE = f.read()
-    gemini_validate = get_gemini_model()
-    system_message = SystemMessage(content=PROMPT_VALIDATE)
-    human_message = HumanMessage(content=code)
-    output_validated = gemini_validate.with_structured_output(ValidationResult)
-    response = output_validated.invoke([system_message, human_message])
-    PROMPT_FIX = ""
-    with open("./app/agents/prompts/NL_TO_CODE.md", "r", encoding="utf-8") as f:
-        PROMPT_FIX = f.read()
-    gemini_fix = get_gemini_model()
-    output_fix = gemini_fix.with_structured_output(CodeFixed)
-    while not response.is_valid: # type: ignore
-        system_message = SystemMessage(content=PROMPT_FIX)
-        human_message_fix = HumanMessage(content=f"este es un codigo para {state['nl_description']}, por favor arregle la sintaxe:\n {code}") # type: ignore
-        response = output_fix.invoke([system_message, human_message_fix])
-        code = response.code  # type: ignore
-        human_message = HumanMessage(content=code)
-        response = output_validated.invoke([system_message, human_message])
+    if state.get("ast") and validar_local(code)[0]:
+        metrics.incr("validate_skipped", reason="structured_ast")
+        return state
+    usar_gramatica = _usar_gramatica()
+    response = _validar(code, usar_local=usar_gramatica)
+    metrics.incr(
+        "validate_check",
+        source="grammar" if usar_gramatica else "llm",
+        result="valid" if response.is_valid else "invalid",
+    )
+    errores_iniciales = list(response.errors)  # type: ignore
+    correcciones: List[str] = []
+    if not response.is_valid and env_flag("VALIDATE_AUTOREPAIR", True):  # type: ignore
+        code, response, correcciones = _reparar_local(code)
+    if not response.is_valid:  # type: ignore
+        rondas = int(os.getenv("VALIDATE_MAX_ROUNDS", "3"))
+        if os.getenv("VALIDATE_REPAIR_MODE", "serial").lower() == "parallel":
+            code = _reparar_paralelo(state, code, response.errors, rondas)  # type: ignore
+        else:
+            code = _reparar_serial(state, code, response.errors, rondas)  # type: ignore
+    if code != state["pseudocode"]:  # type: ignore
+        # El AST estructurado corresponde al código anterior
+        state.pop("ast", None)
     state["pseudocode"] = code  # type: ignore
-    return state
\ No newline at end of file
+    state["validation"] = {
+        "errors": errores_iniciales,
+        "local_fixes": correcciones,
+        "llm_repair": not response.is_valid,  # type: ignore
+    }
+    return state
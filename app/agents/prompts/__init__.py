@@ -1,31 +1,126 @@
-# app/prompts/__init__.py
+# app/agents/prompts/__init__.py
 """
-Módulo para cargar prompts externos desde archivos .md
+Registro de los prompts externos (.md) de esta carpeta.
+
+Todos los prompts se leen una vez al importar el módulo y quedan en memoria
+ya compactados, con la ruta resuelta respecto a este archivo (no al
+directorio de trabajo). Cada prompt tiene como versión el hash de su
+contenido; `prompts_version()` resume todas y sirve para invalidar cachés
+cuando cambia cualquier prompt.
+
+    PROMPTS_HOT_RELOAD=1   (desarrollo) vuelve a leer un prompt si cambió su mtime
+
+Los nombres son rutas relativas sin extensión: "SINTAXE",
+"iterativos/temporal/CASOS".
 """
-import os
+import hashlib
+import threading
 from pathlib import Path
+from typing import Dict, Tuple
+
+from app.agents.utils.compact import compact_prompt
+from app.constants import env_flag
+
+_BASE = Path(__file__).parent
+
+
+def _nombre(name: str) -> str:
+    name = name.replace("\\", "/").strip("/")
+    return name[:-3] if name.endswith(".md") else name
+
+
+class PromptRegistry:
+    """Prompts en memoria con versión (hash del contenido) y recarga por mtime."""
+
+    def __init__(self, base: Path = _BASE):
+        self.base = base
+        self._lock = threading.Lock()
+        # nombre -> (texto compactado, versión, mtime)
+        self._prompts: Dict[str, Tuple[str, str, float]] = {}
+        for path in sorted(base.rglob("*.md")):
+            self._cargar(_nombre(path.relative_to(base).as_posix()))
+
+    def _ruta(self, name: str) -> Path:
+        return self.base / f"{name}.md"
+
+    def _cargar(self, name: str) -> Tuple[str, str, float]:
+        ruta = self._ruta(name)
+        if not ruta.exists():
+            raise FileNotFoundError(f"Prompt file not found: {ruta}")
+        mtime = ruta.stat().st_mtime
+        texto = compact_prompt(ruta.read_text(encoding="utf-8"))
+        version = hashlib.sha256(texto.encode("utf-8")).hexdigest()[:12]
+        with self._lock:
+            self._prompts[name] = (texto, version, mtime)
+        return self._prompts[name]
+
+    def _entrada(self, name: str) -> Tuple[str, str, float]:
+        name = _nombre(name)
+        entrada = self._prompts.get(name)
+        if entrada is None:
+            return self._cargar(name)
+        if env_flag("PROMPTS_HOT_RELOAD"):
+            try:
+                if self._ruta(name).stat().st_mtime != entrada[2]:
+                    return self._cargar(name)
+            except FileNotFoundError:
+                pass
+        return entrada
+
+    def get(self, name: str) -> str:
+        return self._entrada(name)[0]
+
+    def version(self, name: str) -> str:
+        return self._entrada(name)[1]
+
+    def versions(self) -> Dict[str, str]:
+        return {name: self.version(name) for name in sorted(self._prompts)}
+
+
+_registry = PromptRegistry()
+
+
+def get_registry() -> PromptRegistry:
+    return _registry
+
+
+def get_prompt(name: str) -> str:
+    """Texto compactado del prompt `name` (p. ej. "SINTAXE" o "iterativos/temporal/CASOS")."""
+    return _registry.get(name)
+
+
+def prompt_version(name: str) -> str:
+    """Hash corto del contenido del prompt."""
+    return _registry.version(name)
+
+
+def prompts_version() -> str:
+    """Hash de las versiones de todos los prompts (para claves de caché)."""
+    raw = ",".join(f"{name}={version}" for name, version in _registry.versions().items())
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:12]
 
 
 def load_prompt(name: str) -> str:
     """
     Carga un prompt desde un archivo .md en esta carpeta.
-    
+
     Args:
         name: Nombre del archivo sin extensión (ej: "generate_pseudo" carga "generate_pseudo.md")
-        
+
     Returns:
-        Contenido del archivo como string
-        
+        Contenido del archivo como string (desde el registro en memoria)
+
     Raises:
         FileNotFoundError: Si el archivo no existe
     """
-    prompt_file = Path(__file__).parent / f"{name}.md"
-    
-    if not prompt_file.exists():
-        raise FileNotFoundError(f"Prompt file not found: {prompt_file}")
-    
-    with open(prompt_file, "r", encoding="utf-8") as f:
-        return f.read().strip()
+    return get_prompt(name)
 
 
-__all__ = ["load_prompt"]
+__all__ = [
+    "PromptRegistry",
+    "get_registry",
+    "get_prompt",
+    "prompt_version",
+    "prompts_version",
+    "load_prompt",
+]
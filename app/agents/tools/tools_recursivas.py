@@ -26,6 +26,8 @@ from sympy import symbols, Function, rsolve, simplify, expand, sqrt, Rational, l
 import re
 import math
 
+from app.services.cache import memoize
+
 # ============================================================================
 # CLASIFICACIÓN DE MÉTODOS SEGÚN ADA_24A
 # ============================================================================
@@ -854,6 +856,7 @@ def solve_by_substitution(info: RecurrenceInfo) -> MethodResult:
 # FUNCIÓN PRINCIPAL DE ANÁLISIS
 # ============================================================================
 
+@memoize("sympy")
 def analyze_recurrence(recurrence: str) -> RecurrenceAnalysis:
     """
     Analiza una recurrencia y aplica los métodos apropiados según ADA_24A.
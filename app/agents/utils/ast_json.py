@@ -0,0 +1,130 @@
+"""
+AST en JSON para salida estructurada del LLM.
+
+El AST del proyecto (ver SimpleASTParser) usa tuplas como claves y anidación
+arbitraria, algo que no se puede pedir como schema JSON. Aquí se define una
+forma plana equivalente: cada función tiene una lista de nodos, y cada nodo
+apunta a su padre por id (-1 = cuerpo de la función).
+
+    {"funciones": [{"nombre": "f", "variables": [{"nombre": "A", "dimension": "[n]"}],
+                    "nodos": [{"id": 0, "padre": -1, "tipo": "for", "expresion": "n"},
+                              {"id": 1, "padre": 0, "tipo": "call", "expresion": "g",
+                               "argumentos": [{"nombre": "A", "dimension": "[n]"}]}]}]}
+
+`validar_ast_json` revisa localmente la estructura y `ast_desde_json` la
+convierte al formato de SimpleASTParser.
+"""
+from typing import Any, Dict, List, Literal
+
+from pydantic import BaseModel, Field
+
+from app.agents.utils.generate_ast import recursive_components
+
+
+class VariableAST(BaseModel):
+    nombre: str
+    dimension: str = Field("", description="Dimensión de arreglo, p. ej. '[n]'; vacío para escalares")
+
+
+class NodoAST(BaseModel):
+    id: int
+    padre: int = Field(..., description="id del nodo que lo contiene; -1 si está en el cuerpo de la función")
+    tipo: Literal["for", "while", "if", "else", "call"]
+    expresion: str = Field(
+        "",
+        description="for: límite superior; while/if: condición; call: nombre de la subrutina; else: vacío",
+    )
+    argumentos: List[VariableAST] = Field(default_factory=list, description="Solo para call")
+
+
+class FuncionAST(BaseModel):
+    nombre: str
+    variables: List[VariableAST]
+    nodos: List[NodoAST]
+
+
+class ASTJson(BaseModel):
+    funciones: List[FuncionAST]
+
+
+def validar_ast_json(ast: ASTJson) -> List[str]:
+    """Errores estructurales del AST (lista vacía si es válido)."""
+    errores: List[str] = []
+    if not ast.funciones:
+        return ["El AST no tiene funciones"]
+    for funcion in ast.funciones:
+        vistos: Dict[int, NodoAST] = {}
+        for nodo in funcion.nodos:
+            lugar = f"{funcion.nombre}#{nodo.id}"
+            if nodo.id in vistos or nodo.id < 0:
+                errores.append(f"{lugar}: id repetido o negativo")
+            if nodo.padre != -1:
+                padre = vistos.get(nodo.padre)
+                if padre is None:
+                    errores.append(f"{lugar}: el padre {nodo.padre} no existe o aparece después")
+                elif padre.tipo == "call":
+                    errores.append(f"{lugar}: un call no puede contener nodos")
+            if nodo.tipo in ("for", "while", "if", "call") and not nodo.expresion.strip():
+                errores.append(f"{lugar}: {nodo.tipo} sin expresión")
+            if nodo.tipo == "else":
+                hermanos_if = [
+                    n for n in vistos.values() if n.padre == nodo.padre and n.tipo == "if"
+                ]
+                if not hermanos_if:
+                    errores.append(f"{lugar}: else sin if previo en el mismo bloque")
+            vistos[nodo.id] = nodo
+    return errores
+
+
+def _expresion(nodo: NodoAST) -> str:
+    # SimpleASTParser guarda las condiciones sin los paréntesis externos
+    expresion = nodo.expresion.strip()
+    if nodo.tipo in ("while", "if") and expresion.startswith("(") and expresion.endswith(")"):
+        expresion = expresion[1:-1].strip()
+    return expresion
+
+
+def ast_desde_json(ast: ASTJson) -> List[Dict[str, Any]]:
+    """Convierte el AST plano al formato anidado de SimpleASTParser."""
+    resultado: List[Dict[str, Any]] = []
+    for funcion in ast.funciones:
+        bloques: Dict[int, Dict[Any, Any]] = {-1: {}}
+        for nodo in funcion.nodos:
+            contenedor = bloques.get(nodo.padre, bloques[-1])
+            if nodo.tipo == "call":
+                contenedor["func_call"] = (
+                    nodo.expresion,
+                    [(a.nombre, a.dimension) for a in nodo.argumentos],
+                )
+                continue
+            cuerpo: Dict[Any, Any] = {}
+            clave = "else" if nodo.tipo == "else" else (nodo.tipo, _expresion(nodo))
+            contenedor[clave] = cuerpo
+            bloques[nodo.id] = cuerpo
+        resultado.append({
+            funcion.nombre: {
+                "variables": [(v.nombre, v.dimension) for v in funcion.variables],
+                "code": bloques[-1],
+            }
+        })
+    return resultado
+
+
+def es_recursivo_json(ast: ASTJson) -> bool:
+    """True si hay recursión directa o mutua en el grafo de llamadas."""
+    grafo = {
+        funcion.nombre: [n.expresion for n in funcion.nodos if n.tipo == "call"]
+        for funcion in ast.funciones
+    }
+    return bool(recursive_components(grafo))
+
+
+__all__ = [
+    "VariableAST",
+    "NodoAST",
+    "FuncionAST",
+    "ASTJson",
+    "validar_ast_json",
+    "ast_desde_json",
+    "es_recursivo_json",
+]
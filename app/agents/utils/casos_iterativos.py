@@ -0,0 +1,111 @@
+"""
+Cálculo de mejor, promedio y peor caso para los nodos iterativos.
+
+Modos (variable de entorno ITERATIVE_CASES_MODE):
+    - fused (por defecto): una sola llamada con salida estructurada que retorna
+      las tres expresiones (prompt CASOS.md).
+    - batch: las tres llamadas originales (CASO_PROMEDIO, MEJOR_CASO, PEOR_CASO)
+      se lanzan concurrentemente.
+    - sequential: las tres llamadas originales, una tras otra.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+from langchain_core.messages import SystemMessage, HumanMessage
+
+from app.agents.llms.invoke import invoke_llm
+from app.agents.tools.tools_iterativas import resolver_sumatorias
+from app.agents.prompts import get_prompt
+
+
+# Orden de los prompts por caso y clave de salida
+ARCHIVOS_CASOS = {
+    "theta": "CASO_PROMEDIO.md",
+    "omega": "MEJOR_CASO.md",
+    "o": "PEOR_CASO.md",
+}
+
+
+class CasosComplejidad(BaseModel):
+    """Expresiones SymPy para los tres casos en una sola respuesta."""
+
+    mejor_caso: str = Field(..., description="Expresión SymPy del mejor caso (Ω)")
+    caso_promedio: str = Field(..., description="Expresión SymPy del caso promedio (Θ)")
+    peor_caso: str = Field(..., description="Expresión SymPy del peor caso (O)")
+
+
+def _resolver_expresion(expresion: str) -> Any:
+    """Resuelve la expresión con sympy; si no parsea, retorna el texto tal cual."""
+    try:
+        return resolver_sumatorias.invoke({"sumatoria": expresion})
+    except Exception:
+        return expresion
+
+
+def _resolver_respuesta(response: Any) -> Any:
+    # Si el modelo llamó a una tool, ejecutarla
+    if hasattr(response, "tool_calls") and response.tool_calls:
+        return resolver_sumatorias.invoke(response.tool_calls[0]["args"])
+    return response.content
+
+
+def calcular_casos(
+    node: str,
+    folder: str,
+    contenido: str,
+    expresion_respaldo: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Calcula las expresiones de los tres casos.
+
+    Args:
+        node: Nombre del nodo que llama (para la capa de invocación)
+        folder: Carpeta de los prompts en el registro ("iterativos/temporal" o "iterativos/espacial")
+        contenido: Mensaje del usuario (código, sumatoria, AST...)
+        expresion_respaldo: Expresión usada para los casos que el LLM no pudo
+            calcular (p. ej. la sumatoria del AST). Si no se da, "No determinado".
+
+    Returns:
+        Diccionario con claves "omega", "theta" y "o"
+    """
+    mode = (os.getenv("ITERATIVE_CASES_MODE", "fused") or "fused").lower()
+    human_message = HumanMessage(content=contenido)
+    respaldo = (
+        _resolver_expresion(expresion_respaldo) if expresion_respaldo else "No determinado"
+    )
+
+    if mode == "fused":
+        system_message = SystemMessage(content=get_prompt(f"{folder}/CASOS"))
+        response: Optional[CasosComplejidad] = invoke_llm(
+            node, [system_message, human_message],
+            schema=CasosComplejidad, fallback=lambda _: None,
+        )
+        if response is None:
+            return {"omega": respaldo, "theta": respaldo, "o": respaldo}
+        return {
+            "omega": _resolver_expresion(response.mejor_caso),
+            "theta": _resolver_expresion(response.caso_promedio),
+            "o": _resolver_expresion(response.peor_caso),
+        }
+
+    claves = list(ARCHIVOS_CASOS)
+    mensajes: List[list] = [
+        [SystemMessage(content=get_prompt(f"{folder}/{ARCHIVOS_CASOS[clave]}")), human_message]
+        for clave in claves
+    ]
+
+    def invocar(m: list) -> Any:
+        return invoke_llm(node, m, tools=[resolver_sumatorias], fallback=lambda _: None)
+
+    if mode == "batch":
+        with ThreadPoolExecutor(max_workers=len(mensajes)) as pool:
+            respuestas = list(pool.map(invocar, mensajes))
+    else:
+        respuestas = [invocar(m) for m in mensajes]
+
+    return {
+        clave: _resolver_respuesta(r) if r is not None else respaldo
+        for clave, r in zip(claves, respuestas)
+    }
@@ -0,0 +1,124 @@
+"""
+División del pseudocódigo por subrutinas para consultar al LLM por partes.
+
+En programas con muchas subrutinas, mandar el archivo completo a cada nodo
+hace que la latencia y los tokens crezcan con el tamaño total. Con
+CHUNK_BY_FUNCTION=1 los nodos envían una subrutina por llamada, en paralelo,
+acompañada solo de las firmas de las subrutinas que invoca, y después
+combinan los resultados. El costo queda acotado por la subrutina más grande.
+
+    CHUNK_BY_FUNCTION=1      activa la división (por defecto 0)
+    CHUNK_MIN_CHARS=1500     tamaño mínimo del programa para dividirlo
+    CHUNK_MAX_WORKERS=8      llamadas concurrentes
+"""
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, TypedDict, TypeVar
+
+from app.agents.utils.compact import compact_pseudocode
+from app.agents.utils.generate_ast import SimpleASTParser
+from app.constants import env_flag
+
+T = TypeVar("T")
+
+_RE_CALL = re.compile(r"\bcall\s+(\w+)\s*\(", re.I)
+_RE_NOMBRE = re.compile(r"(\w+)\s*\(")
+_RE_BEGIN = re.compile(r"\bbegin\b", re.I)
+_RE_END = re.compile(r"\bend\b", re.I)
+
+_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("CHUNK_MAX_WORKERS", "8")), thread_name_prefix="chunk"
+)
+
+
+class FuncionFuente(TypedDict):
+    nombre: str
+    firma: str                 # Línea de encabezado, p. ej. "merge(A[n], p, q, r)"
+    codigo: str                # Encabezado + cuerpo con su begin/end
+    llamadas: List[str]        # Subrutinas invocadas con CALL (sin repetir)
+
+
+def dividir_funciones(code: str) -> List[FuncionFuente]:
+    """
+    Separa el texto de cada subrutina con las mismas reglas que
+    SimpleASTParser (encabezado `nombre(...)` y bloque begin/end).
+    """
+    parser = SimpleASTParser()
+    lines = (code or "").strip().split("\n")
+    funciones: List[FuncionFuente] = []
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        match = _RE_NOMBRE.match(line)
+        if not line or line.startswith("►") or not match or not parser._is_function_def(line):
+            i += 1
+            continue
+        inicio = i
+        # Cada begin/end cuenta, también los de `then begin`, `do begin` y
+        # `else begin` en la misma línea que la sentencia
+        depth = 0
+        abierto = False
+        while i < len(lines):
+            texto = lines[i].split("►", 1)[0]
+            depth += len(_RE_BEGIN.findall(texto)) - len(_RE_END.findall(texto))
+            abierto = abierto or depth > 0
+            if abierto and depth <= 0:
+                break
+            i += 1
+        codigo = "\n".join(lines[inicio:i + 1])
+        llamadas = list(dict.fromkeys(_RE_CALL.findall(codigo)))
+        funciones.append({
+            "nombre": match.group(1),
+            "firma": line.replace("begin", "").strip(),
+            "codigo": codigo,
+            "llamadas": llamadas,
+        })
+        i += 1
+    return funciones
+
+
+def usar_chunks(code: str, funciones: List[FuncionFuente]) -> bool:
+    """True si conviene consultar por subrutina en vez del programa completo."""
+    return (
+        env_flag("CHUNK_BY_FUNCTION")
+        and len(funciones) > 1
+        and len(code or "") >= int(os.getenv("CHUNK_MIN_CHARS", "1500"))
+    )
+
+
+def firmas_llamadas(funcion: FuncionFuente, funciones: List[FuncionFuente]) -> List[str]:
+    """Firmas de las subrutinas que `funcion` invoca (sin contarse a sí misma)."""
+    por_nombre = {f["nombre"]: f["firma"] for f in funciones}
+    return [
+        por_nombre[nombre]
+        for nombre in funcion["llamadas"]
+        if nombre != funcion["nombre"] and nombre in por_nombre
+    ]
+
+
+def codigo_con_contexto(funcion: FuncionFuente, funciones: List[FuncionFuente]) -> str:
+    """Código compactado de la subrutina seguido de las firmas que usa."""
+    texto = compact_pseudocode(funcion["codigo"])
+    firmas = firmas_llamadas(funcion, funciones)
+    if firmas:
+        texto += "\n\n► Subrutinas invocadas (definidas aparte):\n" + "\n".join(firmas)
+    return texto
+
+
+def mapear_funciones(funciones: List[FuncionFuente], fn: Callable[[FuncionFuente], T]) -> List[T]:
+    """Aplica `fn` a cada subrutina en paralelo; conserva el orden de entrada."""
+    if len(funciones) <= 1:
+        return [fn(f) for f in funciones]
+    futuros = [_pool.submit(fn, f) for f in funciones]
+    return [futuro.result() for futuro in futuros]
+
+
+__all__ = [
+    "FuncionFuente",
+    "dividir_funciones",
+    "usar_chunks",
+    "firmas_llamadas",
+    "codigo_con_contexto",
+    "mapear_funciones",
+]
@@ -0,0 +1,78 @@
+"""
+Compactación de los datos que se envían en los prompts.
+
+El `repr` del AST (claves tupla, comillas, listas de tuplas) y el pseudocódigo
+con comentarios y líneas vacías ocupan muchos tokens sin aportar información
+al LLM. Estas funciones producen representaciones equivalentes más cortas.
+"""
+import re
+from typing import Any, Dict, List
+
+
+def compact_pseudocode(code: str) -> str:
+    """
+    Quita comentarios (►), espacios finales y líneas vacías del pseudocódigo.
+    La indentación se conserva porque ayuda a leer los bloques.
+    """
+    lines = []
+    for line in (code or "").split("\n"):
+        line = line.split("►", 1)[0].rstrip()
+        if line.strip():
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def compact_prompt(text: str) -> str:
+    """Quita espacios finales y colapsa líneas vacías repetidas en un prompt estático."""
+    text = "\n".join(line.rstrip() for line in (text or "").split("\n"))
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def _compact_vars(variables: List[Any]) -> str:
+    return ",".join(f"{v[0]}{v[1]}" for v in variables)
+
+
+def _compact_block(block: Dict[Any, Any]) -> str:
+    parts = []
+    for key, value in block.items():
+        if isinstance(key, tuple):
+            kind, arg = key[0], key[1]
+            if kind == "for":
+                head = f"for ..{arg}"
+            else:
+                head = f"{kind}({arg})"
+            parts.append(f"{head}{{{_compact_block(value or {})}}}")
+        elif key == "else":
+            parts.append(f"else{{{_compact_block(value or {})}}}")
+        elif key == "func_call":
+            name, args = value[0], value[1]
+            parts.append(f"call {name}({_compact_vars(args)})")
+    return ";".join(parts)
+
+
+def compact_ast(ast: Any) -> str:
+    """
+    Codifica el AST de SimpleASTParser en una línea por función:
+
+        nombre(A[n],x): for ..n{if(A[i] == x){}};call g(A[n])
+
+    - `for ..lim{...}` es un for hasta `lim`
+    - `while(cond){...}`, `if(cond){...}`, `else{...}`
+    - `call f(args)` es una llamada a función
+    """
+    if not isinstance(ast, list):
+        return str(ast)
+    lines = []
+    for func in ast:
+        for name, data in func.items():
+            variables = _compact_vars(data.get("variables", []))
+            lines.append(f"{name}({variables}): {_compact_block(data.get('code', {}))}")
+    return "\n".join(lines)
+
+
+def compact_mapping(values: Dict[str, Any]) -> str:
+    """Formatea un diccionario plano como líneas `clave: valor`."""
+    return "\n".join(f"{k}: {v}" for k, v in (values or {}).items())
+
+
+__all__ = ["compact_pseudocode", "compact_prompt", "compact_ast", "compact_mapping"]
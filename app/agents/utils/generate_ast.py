@@ -1,7 +1,60 @@
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Iterable, Set, Tuple, Optional
 import re
 
 
+def recursive_components(call_graph: Dict[str, Iterable[str]]) -> List[List[str]]:
+    """
+    Componentes fuertemente conexas recursivas del grafo de llamadas (Tarjan):
+    las de más de una función (recursión mutua) y las de una función que se
+    llama a sí misma. Las llamadas a funciones no definidas se ignoran.
+    """
+    graph = {f: [c for c in calls if c in call_graph] for f, calls in call_graph.items()}
+    index: Dict[str, int] = {}
+    lowlink: Dict[str, int] = {}
+    stack: List[str] = []
+    on_stack: Set[str] = set()
+    components: List[List[str]] = []
+
+    for root in graph:
+        if root in index:
+            continue
+        # DFS iterativo: (nodo, iterador de sucesores)
+        work = [(root, iter(graph[root]))]
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, successors = work[-1]
+            advanced = False
+            for succ in successors:
+                if succ not in index:
+                    index[succ] = lowlink[succ] = len(index)
+                    stack.append(succ)
+                    on_stack.add(succ)
+                    work.append((succ, iter(graph[succ])))
+                    advanced = True
+                    break
+                if succ in on_stack:
+                    lowlink[node] = min(lowlink[node], index[succ])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                if len(component) > 1 or node in graph[node]:
+                    components.append(sorted(component))
+    return components
+
+
 class SimpleASTParser:
     """Parser simple que procesa pseudocódigo línea por línea"""
     
@@ -36,7 +89,8 @@ class SimpleASTParser:
         # Debe tener paréntesis y no ser una llamada, if, while o for
         if '(' not in line or ')' not in line:
             return False
-        if any(keyword in line.lower() for keyword in ['call', 'if', 'while', 'for']):
+        # Palabras completas: "verificar_orden(...)" o "buscar_while(...)" sí son definiciones
+        if re.search(r'\b(call|if|while|for)\b', line, re.I):
             return False
         return True
     
@@ -85,6 +139,12 @@ class SimpleASTParser:
         
         # Construir el código
         code = self._parse_body(body_lines, variables)
+
+        # El AST solo guarda los CALL en línea propia; para el grafo de
+        # llamadas cuentan también los de return, else, expresiones...
+        for callee in re.findall(r'\bcall\s+(\w+)\s*\(', "\n".join(body_lines), re.IGNORECASE):
+            if callee not in self.function_calls[func_name]:
+                self.function_calls[func_name].append(callee)
         
         # Crear la estructura de la función
         func_structure = {
@@ -394,12 +454,17 @@ class SimpleASTParser:
         
         return (func_name, args)
     
+    def call_graph(self) -> Dict[str, List[str]]:
+        """Grafo de llamadas: función -> funciones que invoca"""
+        return {func_name: list(calls) for func_name, calls in self.function_calls.items()}
+
+    def recursive_functions(self) -> Set[str]:
+        """Funciones que participan en recursión directa o mutua"""
+        return {f for component in recursive_components(self.function_calls) for f in component}
+
     def is_recursive(self) -> bool:
-        """Determina si alguna función es recursiva"""
-        for func_name, calls in self.function_calls.items():
-            if func_name in calls:
-                return True
-        return False
+        """Determina si alguna función es recursiva (directa o mutuamente)"""
+        return bool(recursive_components(self.function_calls))
 
 
 def generate_ast(pseudocode: str) -> Dict[str, List]:
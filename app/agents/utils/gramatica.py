@@ -0,0 +1,160 @@
+"""
+Validador del pseudocódigo con la gramática formal (Lark, LALR).
+
+La gramática está en `pseudocodigo.lark` (versión completa del borrador de
+`lark.txt`, según SINTAXE.md). `validar_gramatica` retorna errores con línea
+y columna, listos para mandarlos al corrector:
+
+    Línea 7, columna 9: carácter inesperado '←' (la asignación debe usar '🡨')
+    Línea 8, columna 1: se encontró 'end'; se esperaba: nombre, procedimiento
+"""
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.constants import ARROW
+
+_GRAMATICA = Path(__file__).parent / "pseudocodigo.lark"
+# Errores de sintaxis a reportar como máximo (después suelen ser en cascada)
+MAX_ERRORES = 5
+
+_lock = threading.Lock()
+_parser: Optional[Any] = None
+
+_NOMBRES = {
+    "NAME": "nombre",
+    "NUMBER": "número",
+    "BUILTIN": "length",
+    "STRING": "texto",
+    "ARROW": ARROW,
+    "RELOP": "operador relacional",
+    "ADDOP": "'+' o '-'",
+    "$END": "fin del código",
+}
+
+
+def _get_parser() -> Any:
+    global _parser
+    if _parser is None:
+        with _lock:
+            if _parser is None:
+                from lark import Lark
+
+                # La flecha de asignación es configurable (PSEUDO_ARROW)
+                texto = _GRAMATICA.read_text(encoding="utf-8").replace(
+                    'ARROW: "🡨"', f"ARROW: {json.dumps(ARROW, ensure_ascii=False)}"
+                )
+                _parser = Lark(
+                    texto,
+                    parser="lalr",
+                    propagate_positions=True,
+                )
+    return _parser
+
+
+def _terminal(nombre: str) -> str:
+    if nombre in _NOMBRES:
+        return _NOMBRES[nombre]
+    try:
+        pattern = _get_parser().get_terminal(nombre).pattern
+    except KeyError:
+        return nombre
+    return pattern.value if pattern.type == "str" else nombre.lower()
+
+
+def _esperados(expected: Any) -> str:
+    # Primero las palabras clave y nombres, después los símbolos
+    nombres = sorted({_terminal(e) for e in expected}, key=lambda n: (not n[:1].isalpha(), n.lower()))
+    if len(nombres) > 6:
+        nombres = nombres[:6] + ["..."]
+    return ", ".join(nombres)
+
+
+def _describir(error: Any) -> str:
+    from lark.exceptions import UnexpectedCharacters, UnexpectedEOF, UnexpectedToken
+
+    if isinstance(error, UnexpectedCharacters):
+        caracter = error.char
+        texto = f"Línea {error.line}, columna {error.column}: carácter inesperado '{caracter}'"
+        if caracter in ("←", "<", ":", "="):
+            texto += f" (la asignación debe usar '{ARROW}')"
+        return texto
+    if isinstance(error, UnexpectedEOF):
+        return f"Fin inesperado del código; se esperaba: {_esperados(error.expected)}"
+    if isinstance(error, UnexpectedToken):
+        token = error.token
+        encontrado = "fin del código" if token.type == "$END" else f"'{token}'"
+        lugar = f"Línea {error.line}, columna {error.column}" if error.line > 0 else "Al final"
+        texto = f"{lugar}: se encontró {encontrado}; se esperaba: {_esperados(error.expected)}"
+        # Casi siempre es `nombre(...)` sin CALL, en una sentencia o en una expresión
+        if token == "(":
+            texto += " (para llamar una subrutina use 'CALL nombre(...)')"
+        return texto
+    return str(error)
+
+
+def _revisar_arbol(tree: Any) -> List[str]:
+    """Reglas que la gramática acepta por simplicidad y se revisan aquí."""
+    errores = []
+    for nodo in tree.find_data("vector_declaration"):
+        lvalue = nodo.children[0]
+        if not any(getattr(c, "data", None) == "index_selector" for c in lvalue.children):
+            nombre = lvalue.children[0]
+            errores.append(
+                f"Línea {nodo.meta.line}, columna {nodo.meta.column}: sentencia incompleta "
+                f"'{nombre}' (falta la asignación con '{ARROW}' o CALL para llamar subrutinas)"
+            )
+    return errores
+
+
+def arbol_sintactico(code: str) -> Any:
+    """Árbol de Lark del código; lanza lark.exceptions.UnexpectedInput si es inválido."""
+    return _get_parser().parse(code)
+
+
+def grafo_llamadas(tree: Any) -> Dict[str, List[str]]:
+    """Subrutina -> subrutinas definidas que invoca (con CALL o en expresiones)."""
+    procedimientos = {str(p.children[0]): p.children[-1] for p in tree.find_data("procedure_def")}
+    return {
+        nombre: list(dict.fromkeys(
+            str(n.children[0]) for n in bloque.iter_subtrees_topdown()
+            if n.data in ("call", "function_call") and str(n.children[0]) in procedimientos
+        ))
+        for nombre, bloque in procedimientos.items()
+    }
+
+
+def validar_gramatica(code: str) -> Tuple[bool, List[str]]:
+    """
+    Retorna (es_válido, errores). Reporta todos los caracteres inválidos
+    (hasta MAX_ERRORES) y el primer error sintáctico.
+    """
+    from lark.exceptions import UnexpectedCharacters, UnexpectedInput
+
+    if not (code or "").strip():
+        return False, ["El código está vacío"]
+    errores: List[str] = []
+
+    def on_error(error: Any) -> bool:
+        # Los caracteres inválidos se saltan y se sigue buscando más; tras el
+        # primer error sintáctico el resto suele ser en cascada
+        if isinstance(error, UnexpectedCharacters):
+            errores.append(_describir(error))
+            return len(errores) < MAX_ERRORES
+        if not errores:
+            errores.append(_describir(error))
+        return False
+
+    try:
+        tree = _get_parser().parse(code, on_error=on_error)
+    except UnexpectedInput as e:
+        if not errores:
+            errores.append(_describir(e))
+        tree = None
+    if tree is not None and not errores:
+        errores.extend(_revisar_arbol(tree))
+    return not errores, errores[:MAX_ERRORES]
+
+
+__all__ = ["validar_gramatica", "arbol_sintactico", "grafo_llamadas", "MAX_ERRORES"]
@@ -0,0 +1,322 @@
+"""
+Extracción determinista de la ecuación de recurrencia (sin LLM).
+
+Se recorre el árbol de la gramática (`gramatica.py`) y se analiza la forma
+de los argumentos de cada llamada recursiva respecto a los parámetros:
+
+    CALL f(n-1)                          resta:    T(n) = T(n-1) + f(n)
+    fib(n-1) + fib(n-2)                  múltiple: T(n) = T(n-1) + T(n-2) + f(n)
+    CALL f(A, p, q), CALL f(A, q+1, r)   división: T(n) = 2T(n/2) + f(n)
+      con q 🡨 (p+r)/2 antes
+    CALL f(n/2), CALL f(n div 3)         división: T(n) = aT(n/b) + f(n)
+
+Las llamadas en ramas excluyentes de un if/else cuentan una sola vez (a es
+el máximo de llamadas por camino). f(n) sale de los ciclos for de la
+subrutina y de las subrutinas no recursivas que invoca: n^(profundidad).
+
+Solo cuentan como tamaño los pares lo/hi que acotan un rango y los
+parámetros comparados con una constante en una condición; los contadores y
+acumuladores (`nivel + 1`, `acc * n`) se ignoran.
+
+Retorna None ante cualquier forma no reconocida (recursión mutua, llamadas
+dentro de ciclos, while/repeat, argumentos de tamaño ambiguos, subrutinas no
+definidas...) para que build_recurrence_node use el LLM.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.agents.utils.generate_ast import recursive_components
+
+# Reducción del tamaño en un argumento: ("resta", k) o ("division", b)
+Reduccion = Tuple[str, int]
+
+_RE_RESTA = r"^{p}([+-])(\d+)$"
+_RE_DIVISION = r"^{p}/(\d+)$"
+_RE_CASO_BASE = re.compile(r"^(\w+)(<=|≤|<|==|=)(\d+)$")
+
+
+class _NoReconocida(Exception):
+    """La subrutina tiene una forma que el análisis local no cubre."""
+
+
+def _es_arbol(nodo: Any) -> bool:
+    return hasattr(nodo, "data")
+
+
+def _expr(nodo: Any) -> str:
+    """Texto normalizado de una expresión (sin espacios, `div` como `/`)."""
+    if nodo is None:
+        return ""
+    if not _es_arbol(nodo):
+        return str(nodo)
+    data = nodo.data
+    if data in ("floor", "ceiling"):
+        # Para el tamaño del subproblema ┌n/2┐ y └n/2┘ son n/2
+        return _expr(nodo.children[0])
+    if data == "mulop":
+        operador = str(nodo.children[0]).lower()
+        return "/" if operador == "div" else operador
+    if data == "term":
+        return "".join(
+            f"({_expr(c)})" if _es_arbol(c) and c.data == "arith_expr" else _expr(c)
+            for c in nodo.children
+        )
+    if data in ("function_call", "call"):
+        return f"{nodo.children[0]}({_expr(nodo.children[1])})"
+    if data == "argument_list":
+        return ",".join(_expr(c) for c in nodo.children)
+    if data == "index_selector":
+        return f"[{_expr(nodo.children[0])}]"
+    if data == "field_selector":
+        return f".{nodo.children[0]}"
+    if data == "index":
+        return "..".join(_expr(c) for c in nodo.children if c is not None)
+    return "".join(_expr(c) for c in nodo.children)
+
+
+def _parametros(procedimiento: Any) -> List[str]:
+    lista = next((c for c in procedimiento.children if _es_arbol(c) and c.data == "parameter_list"), None)
+    if lista is None:
+        return []
+    # object_param es "Clase nombre": el nombre va al final
+    return [str(p.children[-1] if p.data == "object_param" else p.children[0]) for p in lista.children]
+
+
+def _llamadas_a(nodo: Any, nombres: set) -> List[Any]:
+    return [
+        n for n in nodo.iter_subtrees_topdown()
+        if n.data in ("function_call", "call") and str(n.children[0]) in nombres
+    ]
+
+
+def _por_camino(nodo: Any, nombre: str) -> int:
+    """Máximo de llamadas a `nombre` en un camino de ejecución."""
+    if not _es_arbol(nodo):
+        return 0
+    if nodo.data == "if_statement":
+        condicion, entonces, sino = nodo.children
+        return _por_camino(condicion, nombre) + max(_por_camino(entonces, nombre), _por_camino(sino, nombre))
+    if nodo.data in ("for_loop", "while_loop", "repeat_loop"):
+        if _llamadas_a(nodo, {nombre}):
+            raise _NoReconocida("llamada recursiva dentro de un ciclo")
+        return 0
+    propia = int(nodo.data in ("function_call", "call") and str(nodo.children[0]) == nombre)
+    return propia + sum(_por_camino(c, nombre) for c in nodo.children)
+
+
+def _grado(nodo: Any, nombre: str, bloques: Dict[str, Any], visitando: Tuple[str, ...]) -> int:
+    """Grado del trabajo no recursivo: ciclos for anidados, incluidas las subrutinas invocadas."""
+    if not _es_arbol(nodo):
+        return 0
+    if nodo.data in ("while_loop", "repeat_loop"):
+        raise _NoReconocida("ciclo while/repeat")
+    if nodo.data == "for_loop":
+        inicio, fin, cuerpo = nodo.children[2], nodo.children[3], nodo.children[4]
+        constante = all(_es_arbol(c) and c.data == "number" for c in (inicio, fin))
+        return (0 if constante else 1) + _grado(cuerpo, nombre, bloques, visitando)
+    grado = max((_grado(c, nombre, bloques, visitando) for c in nodo.children), default=0)
+    if nodo.data in ("function_call", "call"):
+        invocada = str(nodo.children[0])
+        if invocada == nombre:
+            return grado
+        if invocada not in bloques or invocada in visitando:
+            raise _NoReconocida(f"costo desconocido de {invocada}")
+        grado = max(grado, _grado(bloques[invocada], nombre, bloques, visitando + (invocada,)))
+    return grado
+
+
+def _puntos_medios(bloque: Any, parametros: List[str]) -> Dict[str, Tuple[str, str]]:
+    """Variables asignadas como punto medio de dos parámetros: q 🡨 (p+r)/2."""
+    medios: Dict[str, Tuple[str, str]] = {}
+    for asignacion in bloque.find_data("assignment"):
+        lvalue, _, valor = asignacion.children
+        if len(lvalue.children) != 1:
+            continue
+        texto = _expr(valor)
+        for lo in parametros:
+            for hi in parametros:
+                if lo != hi and texto in (f"({lo}+{hi})/2", f"{lo}+({hi}-{lo})/2"):
+                    medios[str(lvalue.children[0])] = (lo, hi)
+    return medios
+
+
+def _grupos_tamano(bloque: Any, parametros: List[str], medios: Dict[str, Tuple[str, str]]) -> List[Tuple[str, ...]]:
+    """
+    Parámetros que miden el tamaño del problema: pares lo/hi que acotan un
+    rango (punto medio o comparación `p < r`) y parámetros comparados con
+    una constante (`n <= 1`). Los demás (contadores, acumuladores) no cuentan.
+    """
+    pares: List[Tuple[str, ...]] = []
+    guardados: List[str] = []
+    for lo, hi in medios.values():
+        if {lo, hi} not in [set(par) for par in pares]:
+            pares.append((lo, hi))
+    for comparacion in bloque.find_data("comparison"):
+        izquierda, _, derecha = (_expr(c) for c in comparacion.children)
+        if izquierda in parametros and derecha in parametros and izquierda != derecha:
+            if {izquierda, derecha} not in [set(par) for par in pares]:
+                pares.append((izquierda, derecha))
+        elif izquierda in parametros and derecha.isdigit():
+            guardados.append(izquierda)
+        elif derecha in parametros and izquierda.isdigit():
+            guardados.append(derecha)
+    sueltos = [(p,) for p in dict.fromkeys(guardados) if not any(p in par for par in pares)]
+    return pares + sueltos
+
+
+def _reduccion(argumento: str, parametro: str, medios: Dict[str, Tuple[str, str]], en_rango: bool) -> Optional[Reduccion]:
+    """Cómo reduce el tamaño un argumento respecto al parámetro de su posición."""
+    p = re.escape(parametro)
+    match = re.match(_RE_RESTA.format(p=p), argumento)
+    if match:
+        # lo+k achica un rango; n+k con n comparado contra una constante, no
+        if match.group(1) == "+" and not en_rango:
+            return None
+        return "resta", int(match.group(2))
+    match = re.match(_RE_DIVISION.format(p=p), argumento)
+    if match:
+        return "division", int(match.group(1))
+    if en_rango and re.sub(r"[+-]1$", "", argumento) in medios:
+        return "division", 2
+    return None
+
+
+def _reduccion_llamada(
+    llamada: Any, parametros: List[str], medios: Dict[str, Tuple[str, str]], grupos: List[Tuple[str, ...]]
+) -> Tuple[Reduccion, Tuple[str, ...]]:
+    """Reducción del tamaño en una llamada y el grupo de parámetros que la mide."""
+    argumentos = [_expr(a) for a in llamada.children[1].children] if llamada.children[1] else []
+    if len(argumentos) != len(parametros):
+        raise _NoReconocida("cantidad de argumentos distinta a la de parámetros")
+    reducciones: List[Reduccion] = []
+    usados = set()
+    for argumento, parametro in zip(argumentos, parametros):
+        grupo = next((g for g in grupos if parametro in g), None)
+        if argumento == parametro or grupo is None:
+            continue
+        reduccion = _reduccion(argumento, parametro, medios, len(grupo) == 2)
+        if reduccion is None:
+            raise _NoReconocida(f"argumento de tamaño ambiguo: {argumento}")
+        reducciones.append(reduccion)
+        usados.add(grupo)
+    tipos = {tipo for tipo, _ in reducciones}
+    if len(tipos) != 1 or len(usados) != 1:
+        raise _NoReconocida("la llamada no reduce el tamaño de forma reconocible")
+    grupo = usados.pop()
+    if tipos == {"resta"}:
+        # p+1 y r-1 en la misma llamada reducen el rango en 2
+        return ("resta", sum(k for _, k in reducciones)), grupo
+    factores = {b for _, b in reducciones}
+    if len(factores) != 1 or factores == {1}:
+        raise _NoReconocida("factores de división distintos")
+    return ("division", factores.pop()), grupo
+
+
+def _casos_base(bloque: Any, nombre: str, parametros: List[str], paso_maximo: int) -> List[str]:
+    """Casos base a partir de condiciones `n <= c` cuyo if no hace llamadas recursivas."""
+    for condicional in bloque.find_data("if_statement"):
+        condicion, entonces, _ = condicional.children
+        if _llamadas_a(entonces, {nombre}):
+            continue
+        match = _RE_CASO_BASE.match(_expr(condicion))
+        if match and match.group(1) in parametros:
+            operador = match.group(2)
+            tope = int(match.group(3)) - (1 if operador == "<" else 0)
+            # Con n <= c y pasos de hasta k, los casos base son T(c-k+1) .. T(c)
+            desde = tope if operador in ("=", "==") else max(tope - paso_maximo + 1, 0)
+            return [f"T({v}) = Θ(1)" for v in range(desde, tope + 1)]
+    return ["T(1) = Θ(1)"]
+
+
+def _termino(a: int, argumento: str) -> str:
+    return f"{a if a > 1 else ''}T({argumento})"
+
+
+def _trabajo(grado: int) -> str:
+    return "1" if grado == 0 else "n" if grado == 1 else f"n^{grado}"
+
+
+def extraer_recurrencia(code: str) -> Optional[Dict[str, Any]]:
+    """
+    Campos de RecurrenceExtraction (ver recursivo_recurrence.py) para la
+    subrutina recursiva del código, o None si su forma no es reconocida.
+    """
+    try:
+        from lark.exceptions import LarkError
+
+        from app.agents.utils.gramatica import arbol_sintactico, grafo_llamadas
+    except ImportError:
+        return None
+    try:
+        arbol = arbol_sintactico(code)
+    except LarkError:
+        return None
+
+    procedimientos = {str(p.children[0]): p for p in arbol.find_data("procedure_def")}
+    bloques = {nombre: p.children[-1] for nombre, p in procedimientos.items()}
+    componentes = recursive_components(grafo_llamadas(arbol))
+    # Solo recursión directa de una única subrutina
+    if len(componentes) != 1 or len(componentes[0]) != 1:
+        return None
+    nombre = componentes[0][0]
+    bloque = bloques[nombre]
+    parametros = _parametros(procedimientos[nombre])
+
+    try:
+        a = _por_camino(bloque, nombre)
+        medios = _puntos_medios(bloque, parametros)
+        grupos = _grupos_tamano(bloque, parametros, medios)
+        por_llamada = [_reduccion_llamada(c, parametros, medios, grupos) for c in _llamadas_a(bloque, {nombre})]
+        grado = _grado(bloque, nombre, bloques, (nombre,))
+    except _NoReconocida:
+        return None
+    reducciones = [reduccion for reduccion, _ in por_llamada]
+    # Todas las llamadas deben achicar el mismo tamaño
+    if len({grupo for _, grupo in por_llamada}) != 1:
+        return None
+    if a == 0 or {tipo for tipo, _ in reducciones} not in ({"resta"}, {"division"}):
+        return None
+
+    trabajo = _trabajo(grado)
+    llamadas = ", ".join(f"{nombre}({_expr(c.children[1])})" for c in _llamadas_a(bloque, {nombre}))
+    pasos = sorted({k for _, k in reducciones})
+    if reducciones[0][0] == "division":
+        if len(pasos) != 1:
+            return None
+        b = pasos[0]
+        ecuacion = f"T(n) = {_termino(a, f'n/{b}')} + {trabajo}"
+        tipo, division, resta = "divide_and_conquer", b, 0
+        casos = ["T(1) = Θ(1)"]
+        forma = f"divide el tamaño entre {b}"
+    elif len(pasos) == 1:
+        k = pasos[0]
+        ecuacion = f"T(n) = {_termino(a, f'n-{k}')} + {trabajo}"
+        tipo = "decrease_and_conquer" if a == 1 else "decrease_and_lose"
+        division, resta = 1, k
+        casos = _casos_base(bloque, nombre, parametros, k)
+        forma = f"resta {k} al tamaño"
+    else:
+        # Pasos distintos en un mismo camino (tipo Fibonacci)
+        if len(reducciones) != a or len(pasos) != a:
+            return None
+        ecuacion = "T(n) = " + " + ".join(f"T(n-{k})" for k in pasos) + f" + {trabajo}"
+        tipo, division, resta = "multiple_recursive", 1, pasos[0]
+        casos = _casos_base(bloque, nombre, parametros, pasos[-1])
+        forma = "resta " + " y ".join(str(k) for k in pasos) + " al tamaño"
+
+    return {
+        "recurrence_equation": ecuacion,
+        "base_cases": casos,
+        "num_recursive_calls": a,
+        "division_factor": division,
+        "subtraction_factor": resta,
+        "non_recursive_work": trabajo,
+        "recurrence_type": tipo,
+        "explanation": (
+            f"Análisis local de {nombre}: llamadas {llamadas}; a={a} por camino de ejecución, "
+            f"cada llamada {forma}; trabajo no recursivo f(n)={trabajo} (ciclos for y subrutinas invocadas)."
+        ),
+    }
+
+
+__all__ = ["extraer_recurrencia"]
@@ -0,0 +1,163 @@
+"""
+Corrección local (sin LLM) de los errores de sintaxis más comunes.
+
+Antes de pedirle una corrección al LLM, validate_node intenta arreglar el
+código con reglas deterministas:
+
+1. Normalizaciones de `app/services/utils/normalization.py`: flechas `->` y
+   `←`, palabras clave en minúscula, CALL en mayúscula y `end` faltantes.
+2. Correcciones guiadas por la gramática: se valida, se toma la línea del
+   primer error y se aplican las reglas de abajo a esa línea y a la
+   anterior, hasta que el código sea válido o ninguna regla cambie nada.
+   - asignación con `<-`, `:=` o `=` en vez de 🡨
+   - llamada a subrutina sin CALL (como sentencia o dentro de una expresión)
+   - for/while sin `do`, if sin `then`
+   - cuerpo de for/while de una sola sentencia sin begin/end
+
+Cada corrección aplicada queda descrita en la lista que se retorna.
+"""
+import re
+from typing import List, Optional, Tuple
+
+from app.agents.utils.validacion import validar_local
+from app.constants import ARROW
+from app.services.utils.normalization import balance_begin_end, quick_normalize
+
+# Pasadas de corrección guiada por errores como máximo
+MAX_PASADAS = 20
+
+_CONTROL = {"for", "while", "if", "else", "repeat", "until", "begin", "end", "return", "call"}
+_LVALUE = r"[A-Za-z_]\w*(?:\s*\[[^\]]*\]|\.\w+)*"
+
+_RE_LINEA = re.compile(r"^Línea (\d+)")
+_RE_ASIGNACION = re.compile(rf"^(\s*(?:for\s+)?{_LVALUE})\s*(<-|:=|=(?!=))\s*", re.I)
+_RE_LLAMADA = re.compile(r"^(\s*)([A-Za-z_]\w*)\s*\(.*\)\s*$")
+_RE_ENCABEZADO = re.compile(r"^\s*(?:procedimiento\s+)?([A-Za-z_]\w*)\s*\(.*\)\s*(?:begin)?\s*$", re.I)
+_RE_FOR = re.compile(r"^\s*for\b.*\bto\b", re.I)
+_RE_WHILE = re.compile(r"^\s*while\b", re.I)
+_RE_IF = re.compile(r"^\s*(?:else\s+)?if\b", re.I)
+_RE_DO = re.compile(r"\bdo\s*(begin)?\s*$", re.I)
+_RE_SIMPLE = re.compile(rf"^\s*(?:return\b|CALL\b|{_LVALUE}\s*{ARROW})", re.I)
+
+
+def _primera_palabra(line: str) -> str:
+    return re.split(r"[\s(\[]", line.strip().lower(), maxsplit=1)[0]
+
+
+def _sin_comentario(line: str) -> str:
+    return line.split("►", 1)[0].rstrip()
+
+
+def _anterior(lines: List[str], i: int) -> Optional[int]:
+    """Índice de la línea no vacía anterior a `i`."""
+    j = i - 1
+    while j >= 0 and not _sin_comentario(lines[j]).strip():
+        j -= 1
+    return j if j >= 0 else None
+
+
+def _siguiente(lines: List[str], i: int) -> Optional[int]:
+    j = i + 1
+    while j < len(lines) and not _sin_comentario(lines[j]).strip():
+        j += 1
+    return j if j < len(lines) else None
+
+
+def _profundidad(lines: List[str], i: int) -> int:
+    """Bloques begin abiertos antes de la línea `i`."""
+    texto = "\n".join(_sin_comentario(line) for line in lines[:i]).lower()
+    return len(re.findall(r"\bbegin\b", texto)) - len(re.findall(r"\bend\b", texto))
+
+
+def _subrutinas(lines: List[str]) -> List[str]:
+    """Nombres de las subrutinas definidas (encabezados fuera de todo bloque)."""
+    return [
+        match.group(1) for i, line in enumerate(lines)
+        for match in [_RE_ENCABEZADO.match(_sin_comentario(line))]
+        if match and match.group(1).lower() not in _CONTROL and _profundidad(lines, i) == 0
+    ]
+
+
+def _corregir_linea(lines: List[str], i: int) -> Optional[str]:
+    """Aplica la primera regla que cambie la línea `i`; retorna su descripción."""
+    line = _sin_comentario(lines[i])
+    comentario = lines[i][len(line):]
+    n = i + 1
+    primera = _primera_palabra(line)
+
+    match = _RE_ASIGNACION.match(line)
+    if match and ARROW not in line and primera not in _CONTROL - {"for"}:
+        lines[i] = f"{match.group(1)} {ARROW} {line[match.end():]}{comentario}"
+        return f"Línea {n}: asignación con '{match.group(2)}' reemplazada por '{ARROW}'"
+
+    match = _RE_LLAMADA.match(line)
+    if match and match.group(2).lower() not in _CONTROL and _profundidad(lines, i) > 0:
+        lines[i] = f"{match.group(1)}CALL {line.strip()}{comentario}"
+        return f"Línea {n}: se añadió CALL a la llamada de '{match.group(2)}'"
+
+    if _profundidad(lines, i) > 0:
+        for nombre in _subrutinas(lines):
+            patron = rf"(?<!CALL )\b{re.escape(nombre)}\s*\("
+            if re.search(patron, line):
+                lines[i] = re.sub(patron, f"CALL {nombre}(", line) + comentario
+                return f"Línea {n}: se añadió CALL a las llamadas de '{nombre}'"
+
+    if (_RE_FOR.match(line) or _RE_WHILE.match(line)) and not _RE_DO.search(line):
+        if re.search(r"\bbegin\s*$", line, re.I):
+            lines[i] = re.sub(r"\s*\bbegin\s*$", " do begin", line, flags=re.I) + comentario
+        else:
+            lines[i] = f"{line} do{comentario}"
+        return f"Línea {n}: se añadió 'do' a {primera}"
+
+    if _RE_IF.match(line) and not re.search(r"\bthen\b", line, re.I):
+        if ARROW in line or re.search(r"\b(return|CALL)\b", line, re.I):
+            return None
+        lines[i] = f"{line} then{comentario}"
+        return f"Línea {n}: se añadió 'then' al if"
+
+    if _RE_DO.search(line) and not re.search(r"\bbegin\s*$", line, re.I):
+        j = _siguiente(lines, i)
+        if j is not None and _RE_SIMPLE.match(_sin_comentario(lines[j])):
+            sangria = re.match(r"^\s*", line).group(0)
+            lines[j + 1:j + 1] = [f"{sangria}end"]
+            lines[i + 1:i + 1] = [f"{sangria}begin"]
+            return f"Línea {n}: cuerpo de {primera} envuelto en begin/end"
+    return None
+
+
+def _corregir_por_errores(code: str, errores: List[str]) -> Tuple[str, List[str]]:
+    lines = code.split("\n")
+    for error in errores:
+        match = _RE_LINEA.match(error)
+        if not match:
+            continue
+        i = int(match.group(1)) - 1
+        # Un 'do' o 'then' faltante se reporta en la línea siguiente
+        for k in (i, _anterior(lines, i)):
+            if k is not None and 0 <= k < len(lines):
+                cambio = _corregir_linea(lines, k)
+                if cambio:
+                    return "\n".join(lines), [cambio]
+    return code, []
+
+
+def reparar_local(code: str) -> Tuple[str, List[str]]:
+    """
+    Retorna (código corregido, correcciones aplicadas). El código puede
+    seguir siendo inválido si quedan errores que las reglas no cubren.
+    """
+    code, cambios = quick_normalize(code)
+    code, notas = balance_begin_end(code)
+    cambios.extend(notas)
+    for _ in range(MAX_PASADAS):
+        es_valido, errores = validar_local(code)
+        if es_valido:
+            break
+        code, aplicados = _corregir_por_errores(code, errores)
+        if not aplicados:
+            break
+        cambios.extend(aplicados)
+    return code, cambios
+
+
+__all__ = ["reparar_local", "MAX_PASADAS"]
@@ -0,0 +1,93 @@
+"""
+Validación local (sin LLM) de la sintaxis del pseudocódigo.
+
+Por defecto usa la gramática formal (`gramatica.py`, Lark LALR), que cubre
+SINTAXE.md completa y reporta línea y columna de cada error. Sin lark, o con
+VALIDATE_GRAMMAR=0, revisa solo las reglas que se pueden comprobar línea a
+línea: bloques begin/end y repeat/until balanceados, forma de for/while/if,
+asignación con 🡨 y que exista al menos una subrutina.
+"""
+import logging
+import re
+from typing import List, Tuple
+
+from app.constants import ARROW, env_flag
+
+logger = logging.getLogger(__name__)
+
+_KEYWORDS = {"for", "while", "if", "else", "repeat", "until", "begin", "end", "return", "call"}
+
+_RE_FOR = re.compile(rf"^for\s+\w+\s*{ARROW}\s*.+\s+to\s+.+\s+do\b", re.I)
+_RE_WHILE = re.compile(r"^while\s*\(.+\)\s*do\b", re.I)
+_RE_IF = re.compile(r"^(else\s+)?if\b.+\bthen\b", re.I)
+_RE_SUBRUTINA = re.compile(r"^([A-Za-z_]\w*)\s*\(.*\)\s*(begin)?\s*$")
+_RE_ASIGNACION_INVALIDA = re.compile(rf"^[\w\[\]\.\s,+\-*/]+?\s*(←|<-|:=|=)(?!=)[^{ARROW}]*$")
+
+
+def _lineas(code: str) -> List[Tuple[int, str]]:
+    """(número, línea sin comentario) de las líneas no vacías."""
+    out = []
+    for i, line in enumerate((code or "").split("\n"), start=1):
+        line = line.split("►", 1)[0].strip()
+        if line:
+            out.append((i, line))
+    return out
+
+
+def validar_lineas(code: str) -> Tuple[bool, List[str]]:
+    """
+    Retorna (es_válido, errores). Cada error indica la línea y el problema.
+    """
+    errores: List[str] = []
+    lineas = _lineas(code)
+    if not lineas:
+        return False, ["El código está vacío"]
+
+    begins = ends = repeats = untils = 0
+    subrutinas = 0
+    for n, line in lineas:
+        lower = line.lower()
+        first = re.split(r"[\s(]", lower, maxsplit=1)[0]
+        begins += len(re.findall(r"\bbegin\b", lower))
+        ends += len(re.findall(r"\bend\b", lower))
+        repeats += len(re.findall(r"\brepeat\b", lower))
+        untils += len(re.findall(r"\buntil\b", lower))
+
+        if first == "for" and not _RE_FOR.match(line):
+            errores.append(f"Línea {n}: for mal formado (esperado 'for i {ARROW} a to b do')")
+        elif first == "while" and not _RE_WHILE.match(line):
+            errores.append(f"Línea {n}: while mal formado (esperado 'while (condición) do')")
+        elif first in ("if", "else") and re.match(r"^(else\s+)?if\b", lower) and not _RE_IF.match(line):
+            errores.append(f"Línea {n}: if sin 'then'")
+        elif first not in _KEYWORDS and _RE_ASIGNACION_INVALIDA.match(line):
+            errores.append(f"Línea {n}: la asignación debe usar '{ARROW}'")
+
+        match = _RE_SUBRUTINA.match(line)
+        if match and match.group(1).lower() not in _KEYWORDS and match.group(1).upper() != "CALL":
+            subrutinas += 1
+
+    if begins != ends:
+        errores.append(f"Bloques desbalanceados: {begins} 'begin' y {ends} 'end'")
+    if repeats != untils:
+        errores.append(f"Bloques desbalanceados: {repeats} 'repeat' y {untils} 'until'")
+    if subrutinas == 0:
+        errores.append("No se encontró ninguna definición de subrutina 'nombre(parámetros)'")
+    return not errores, errores
+
+
+def validar_local(code: str) -> Tuple[bool, List[str]]:
+    """
+    Retorna (es_válido, errores) con la gramática formal, o con las reglas
+    por línea si la gramática no está disponible.
+    """
+    if env_flag("VALIDATE_GRAMMAR", True):
+        from app.agents.utils.gramatica import validar_gramatica
+
+        try:
+            return validar_gramatica(code)
+        except ImportError as e:
+            logger.warning("Validación por gramática no disponible (%s); se usan reglas por línea", e)
+    return validar_lineas(code)
+
+
+__all__ = ["validar_local", "validar_lineas"]
@@ -1,15 +1,22 @@
 # app/api.py
+import json
 import os
+import uuid
 # Deshabilitar LangSmith tracing para mejor performance en API
 os.environ["LANGSMITH_TRACING"] = "false"
 
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, Any, Dict, List
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.agents.graph import build_graph
+from app.agents.checkpoint import delete_thread, thread_config, track_thread
+from app.agents.graph import compile_graph
+from app.agents.prompts import prompts_version
 from app.agents.state import AnalyzerState
+from app.services import metrics
+from app.services.cache import get_shared_cache, make_key
 
 app = FastAPI(
     title="Complexity Agents API",
@@ -30,6 +37,37 @@ app.add_middleware(
 class AnalyzeIn(BaseModel):
     text: str
     language_hint: Optional[str] = "es"
+    # Identificador del análisis. Si un intento anterior con el mismo token
+    # falló o expiró, el grafo se reanuda desde el último nodo completado.
+    resume_token: Optional[str] = None
+
+
+# Variables que cambian el análisis devuelto: forman parte de la clave de la
+# caché de resultados junto con el texto y la versión de los prompts
+RESULT_KEY_ENV = (
+    "LLM_PROVIDER", "GEMINI_MODEL", "GEMINI_MODEL_LIGHT", "GEMINI_MODEL_HEAVY", "LLM_ROUTES",
+    "LLM_ESCALATE_ON_PARSE_ERROR", "OPENAI_COMPAT_BASE_URL", "OPENAI_COMPAT_MODEL", "LLM_CASSETTE_DIR",
+    "FUSED_FRONTEND", "SPECULATIVE_FRONTEND", "INITIAL_DECISION_LOCAL", "PARSE_CODE_AST",
+    "CHUNK_BY_FUNCTION", "CHUNK_MIN_CHARS", "ITERATIVE_CASES_MODE", "RECURRENCE_LOCAL",
+    "VALIDATE_GRAMMAR", "VALIDATE_AUTOREPAIR", "VALIDATE_LOCAL", "VALIDATE_REPAIR_MODE",
+    "VALIDATE_CANDIDATES", "VALIDATE_MAX_ROUNDS", "PSEUDO_ARROW",
+)
+
+
+def result_cache_key(text: str) -> str:
+    """Clave del resultado: texto, prompts, proveedor/modelos y flags del pipeline."""
+    return make_key(text, prompts_version(), {name: os.getenv(name) for name in RESULT_KEY_ENV})
+
+
+_graph = None
+
+
+def get_graph():
+    """Grafo compilado una sola vez por proceso (comparte el checkpointer)."""
+    global _graph
+    if _graph is None:
+        _graph = compile_graph()
+    return _graph
 
 
 def make_json_serializable(obj: Any) -> Any:
@@ -65,19 +103,140 @@ def make_json_serializable(obj: Any) -> Any:
         return str(obj)
 
 
+def graph_input(in_: AnalyzeIn, graph, config) -> Optional[AnalyzerState]:
+    """
+    Input para el grafo: None si hay un análisis pendiente con ese
+    resume_token (se reanuda desde el último nodo completado), o el estado
+    inicial con el texto del usuario. Un resume_token de un análisis con otro
+    texto se rechaza (409).
+    """
+    if graph.checkpointer is not None:
+        track_thread(config["configurable"]["thread_id"])
+    if in_.resume_token and graph.checkpointer is not None:
+        snapshot = graph.get_state(config)
+        if snapshot.next:
+            # El resultado se guarda en caché con la clave de in_.text
+            if snapshot.values.get("nl_description") != in_.text:
+                raise HTTPException(
+                    status_code=409,
+                    detail="El resume_token corresponde a un análisis con otro texto",
+                )
+            return None
+    state = AnalyzerState()
+    state["nl_description"] = f"{in_.text}"
+    return state
+
+
+def resume_headers(graph, thread_id: str) -> Dict[str, str]:
+    """Cabecera X-Resume-Token, solo si hay checkpointer con el que reanudar."""
+    if graph is None or graph.checkpointer is None:
+        return {}
+    return {"X-Resume-Token": thread_id}
+
+
+def finish_analysis(graph, thread_id: str, cache, cache_key: str, result: Any) -> Any:
+    """Libera el checkpoint, serializa el resultado y lo guarda en caché."""
+    if graph.checkpointer is not None:
+        delete_thread(thread_id)
+
+    # Convertir el resultado a un formato JSON-serializable
+    serializable_result = make_json_serializable(result)
+    if cache is not None:
+        cache.set("result", cache_key, serializable_result)
+    return serializable_result
+
+
 @app.post("/api/v2/analyze")
 def analyze(in_: AnalyzeIn):
+    cache = get_shared_cache()
+    cache_key = result_cache_key(in_.text)
+    if cache is not None:
+        cached = cache.get("result", cache_key)
+        if cached is not None:
+            return cached
+
+    thread_id = in_.resume_token or uuid.uuid4().hex
+    config = thread_config(thread_id)
+    graph = None
     try:
-        state = AnalyzerState()
-        state["nl_description"] = f"{in_.text}"
-        graph = build_graph().compile()
-        result = graph.invoke(state)
-        
-        # Convertir el resultado a un formato JSON-serializable
-        serializable_result = make_json_serializable(result)        
-        return serializable_result
+        graph = get_graph()
+        result = graph.invoke(graph_input(in_, graph, config), config)
+        return finish_analysis(graph, thread_id, cache, cache_key, result)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(
+            status_code=500,
+            detail=str(e),
+            headers=resume_headers(graph, thread_id),
+        )
+
+def sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/api/v2/analyze/stream")
+def analyze_stream(in_: AnalyzeIn):
+    """
+    Igual que /api/v2/analyze, pero como Server-Sent Events:
+        event: node       {"node": ...}                  al terminar cada nodo
+        event: notation   {"field": ..., "value": ...}   notaciones del resultado
+        event: analisis   {"delta": ...}                 fragmentos de la narrativa
+        event: analisis   {"replace": ...}               narrativa completa que reemplaza
+                                                         lo recibido (el stream falló a mitad)
+        event: result     {...}                          estado final (como /analyze)
+        event: error      {"detail": ..., "resume_token": ...}
+
+    `resume_token` y la cabecera X-Resume-Token solo se envían con
+    CHECKPOINTER activo (sin checkpointer no hay nada que reanudar).
+    """
+    cache = get_shared_cache()
+    cache_key = result_cache_key(in_.text)
+    thread_id = in_.resume_token or uuid.uuid4().hex
+    config = thread_config(thread_id)
+    config["configurable"]["stream_result"] = True
+    # Antes de la respuesta: las cabeceras dependen del checkpointer
+    graph = get_graph()
+    headers = resume_headers(graph, thread_id)
+
+    def events():
+        if cache is not None:
+            cached = cache.get("result", cache_key)
+            if cached is not None:
+                yield sse("result", cached)
+                return
+        try:
+            result: Dict[str, Any] = {}
+            stream = graph.stream(
+                graph_input(in_, graph, config), config, stream_mode=["updates", "custom", "values"]
+            )
+            for mode, chunk in stream:
+                if mode == "custom":
+                    payload = dict(chunk)
+                    yield sse(payload.pop("event"), payload)
+                elif mode == "updates":
+                    for node in chunk:
+                        yield sse("node", {"node": node})
+                else:
+                    result = chunk
+            yield sse("result", finish_analysis(graph, thread_id, cache, cache_key, result))
+        except Exception as e:
+            error = {"detail": str(e)}
+            if headers:
+                error["resume_token"] = thread_id
+            yield sse("error", error)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={**headers, "Cache-Control": "no-cache"},
+    )
+
+
+@app.get("/api/v2/metrics")
+def get_metrics():
+    """Contadores y resúmenes (p50/p95/p99) de llamadas, latencia y tokens por nodo."""
+    return metrics.snapshot()
 
 @app.get("/health")
 def health():
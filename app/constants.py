@@ -5,4 +5,13 @@ import os
 # Símbolo de asignación esperado por la gramática y los normalizadores.
 ARROW = os.getenv("PSEUDO_ARROW", "🡨")
 
-__all__ = ["ARROW"]
+
+def env_flag(name: str, default: bool = False) -> bool:
+    """Lee una variable de entorno booleana ("1", "true", "yes", "on")."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+__all__ = ["ARROW", "env_flag"]
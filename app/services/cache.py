@@ -0,0 +1,234 @@
+# app/services/cache.py
+"""
+Caché compartida entre workers de un mismo host.
+
+Cada worker de uvicorn es un proceso independiente, así que cualquier memo en
+memoria se duplica (y se enfría) por worker. Este módulo expone un backend en
+SQLite con WAL que todos los procesos del host pueden leer y escribir a la vez:
+lo que calcula un worker queda disponible para los demás.
+
+Se activa con variables de entorno:
+    SHARED_CACHE=sqlite                  (por defecto desactivada)
+    SHARED_CACHE_PATH=.cache/agent_cache.sqlite3
+    SHARED_CACHE_MAX_MB=256              (tamaño máximo antes de desalojar)
+    SHARED_CACHE_TTL_SECONDS=86400       (edad máxima de una entrada)
+"""
+from __future__ import annotations
+
+import functools
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+_MISSING = object()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    namespace  TEXT    NOT NULL,
+    key        TEXT    NOT NULL,
+    value      BLOB    NOT NULL,
+    size       INTEGER NOT NULL,
+    created_at REAL    NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS cache_created_at ON cache(created_at);
+"""
+
+
+def make_key(*parts: Any) -> str:
+    """
+    Construye una clave estable a partir de valores arbitrarios.
+
+    Los valores se serializan con JSON cuando es posible (orden de claves fijo)
+    y con repr() en otro caso, y se resumen con SHA-256.
+    """
+    try:
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=repr)
+    except (TypeError, ValueError):
+        raw = repr(parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SharedCache:
+    """
+    Caché clave/valor en SQLite (modo WAL) compartida por todos los procesos.
+
+    Las entradas se agrupan por `namespace` (p. ej. "result", "llm", "sympy")
+    y se desalojan por edad (`ttl_seconds`) y por tamaño total (`max_bytes`),
+    eliminando primero las más antiguas.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl_seconds: float = 24 * 3600,
+        evict_every: int = 64,
+    ):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.evict_every = evict_every
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Una conexión por hilo; SQLite no permite compartirlas entre hilos."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        """Retorna el valor guardado o `default` si no existe o expiró."""
+        row = self._connect().execute(
+            "SELECT value, created_at FROM cache WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        if row is None:
+            return default
+        value, created_at = row
+        if self.ttl_seconds and time.time() - created_at > self.ttl_seconds:
+            self.delete(namespace, key)
+            return default
+        try:
+            return pickle.loads(value)
+        except Exception:
+            # Entrada corrupta o de una versión incompatible: se descarta
+            self.delete(namespace, key)
+            return default
+
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        """Guarda un valor (debe ser serializable con pickle)."""
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        self._connect().execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, size, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (namespace, key, blob, len(blob), time.time()),
+        )
+        with self._lock:
+            self._writes += 1
+            should_evict = self._writes % self.evict_every == 0
+        if should_evict:
+            self.evict()
+
+    def delete(self, namespace: str, key: str) -> None:
+        self._connect().execute(
+            "DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+        )
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        """Vacía la caché completa o solo un namespace."""
+        conn = self._connect()
+        if namespace is None:
+            conn.execute("DELETE FROM cache")
+        else:
+            conn.execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+
+    def evict(self) -> None:
+        """Elimina entradas expiradas y, si se excede `max_bytes`, las más antiguas."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self.ttl_seconds:
+                conn.execute(
+                    "DELETE FROM cache WHERE created_at < ?",
+                    (time.time() - self.ttl_seconds,),
+                )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                freed = 0
+                victims = []
+                for namespace, key, size in conn.execute(
+                    "SELECT namespace, key, size FROM cache ORDER BY created_at ASC"
+                ):
+                    victims.append((namespace, key))
+                    freed += size
+                    if freed >= excess:
+                        break
+                conn.executemany(
+                    "DELETE FROM cache WHERE namespace = ? AND key = ?", victims
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+_shared_cache: Optional[SharedCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> Optional[SharedCache]:
+    """
+    Retorna la caché compartida del proceso, o None si está desactivada.
+
+    Todos los workers que apunten al mismo SHARED_CACHE_PATH comparten datos.
+    """
+    global _shared_cache
+    if (os.getenv("SHARED_CACHE", "") or "").lower() not in ("sqlite", "1", "true", "yes"):
+        return None
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = SharedCache(
+                    os.getenv("SHARED_CACHE_PATH", ".cache/agent_cache.sqlite3"),
+                    max_bytes=int(float(os.getenv("SHARED_CACHE_MAX_MB", "256")) * 1024 * 1024),
+                    ttl_seconds=float(os.getenv("SHARED_CACHE_TTL_SECONDS", "86400")),
+                )
+    return _shared_cache
+
+
+def memoize(namespace: str, key_fn: Optional[Callable[..., Any]] = None):
+    """
+    Decorador que memoiza una función en la caché compartida.
+
+    Args:
+        namespace: Grupo de la caché (p. ej. "sympy").
+        key_fn: Función opcional que recibe los mismos argumentos y retorna
+            los valores a usar como clave. Por defecto se usan todos.
+
+    Si la caché está desactivada, la función se ejecuta sin cambios.
+    """
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        qualname = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            cache = get_shared_cache()
+            if cache is None:
+                return func(*args, **kwargs)
+            parts = key_fn(*args, **kwargs) if key_fn else (args, kwargs)
+            key = make_key(qualname, parts)
+            cached = cache.get(namespace, key, _MISSING)
+            if cached is not _MISSING:
+                return cached
+            value = func(*args, **kwargs)
+            cache.set(namespace, key, value)
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+__all__ = ["SharedCache", "get_shared_cache", "make_key", "memoize"]
@@ -4,6 +4,9 @@ import os, json, re
 from typing import Any, Dict
 from dotenv import load_dotenv
 
+from app.services import metrics
+from app.services.utils.json_repair import repair_json
+
 # Carga .env de la raíz (langgraph dev no lo hace solo)
 load_dotenv()  # si tu .env no está en la raíz, pásale dotenv_path
 
@@ -15,6 +18,14 @@ def strip_code_fences(text: str) -> str:
         t = _re.sub(r"^(json|js|javascript|python|pseudocode)\s*", "", t, flags=_re.I)
     return t.strip()
 
+# Nombre de las grabaciones de llm_json_call en LLM_CASSETTE_DIR
+CASSETTE_NODE = "llm_json"
+
+def _grabar(llm):
+    """Con LLM_RECORD=1 graba las respuestas para reproducirlas con LLM_PROVIDER=replay."""
+    from app.agents.llms.cassette import RecordingRunnable, recording
+    return RecordingRunnable(CASSETTE_NODE, llm, None, None) if recording() else llm
+
 def get_llm(temperature: float = 0.0, model: str | None = None):
     provider = (os.getenv("LLM_PROVIDER", "gemini") or "gemini").lower()
 
@@ -26,6 +37,11 @@ def get_llm(temperature: float = 0.0, model: str | None = None):
                 return AIMessage(content='{"ok": true}')
         return _Stub()
 
+    if provider == "replay":
+        # Respuestas grabadas con LLM_RECORD=1 (ver app/agents/llms/cassette.py)
+        from app.agents.llms.cassette import ReplayRunnable
+        return ReplayRunnable(CASSETTE_NODE, None, None)
+
     if provider == "gemini":
         # Import perezoso para no romper si usas stub
         from langchain_google_genai import ChatGoogleGenerativeAI
@@ -34,15 +50,30 @@ def get_llm(temperature: float = 0.0, model: str | None = None):
             raise RuntimeError("GOOGLE_API_KEY no configurada en el entorno")
         model = model or os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
         # LangChain lee GOOGLE_API_KEY directamente del entorno
-        return ChatGoogleGenerativeAI(
+        return _grabar(ChatGoogleGenerativeAI(
             model=model,
             temperature=temperature,
             convert_system_message_to_human=True,
-        )
+        ))
+
+    if provider == "openai":
+        # Endpoint compatible con OpenAI (p. ej. un modelo local), vía el gateway compartido
+        from app.agents.llms.gateway import ChatOpenAICompatible
+        return _grabar(ChatOpenAICompatible(
+            model=model or os.getenv("OPENAI_COMPAT_MODEL", "default"),
+            base_url=os.getenv("OPENAI_COMPAT_BASE_URL", "http://127.0.0.1:8001/v1"),
+            api_key=os.getenv("OPENAI_COMPAT_API_KEY") or None,
+            temperature=temperature,
+        ))
 
     raise RuntimeError(f"LLM_PROVIDER desconocido: {provider}")
 
 def llm_json_call(system: str, user: str, temperature: float = 0.0) -> Dict[str, Any]:
+    """
+    Pide JSON al LLM. Si la respuesta no parsea se repara localmente
+    (`repair_json`) y solo si eso falla se pide al modelo que la corrija.
+    Métrica `llm_json_repair{kind=none|local|remote}`.
+    """
     llm = get_llm(temperature=temperature)
     msgs = [{"role": "system", "content": system}, {"role": "user", "content": user}]
     raw = strip_code_fences(llm.invoke(msgs).content)
@@ -55,11 +86,26 @@ def llm_json_call(system: str, user: str, temperature: float = 0.0) -> Dict[str,
         return json.loads(s)
 
     try:
-        return _try_parse(raw)
+        result = _try_parse(raw)
+        metrics.incr("llm_json_repair", kind="none")
+        return result
     except Exception:
-        repair = [
-            {"role": "system", "content": system},
-            {"role": "user", "content": f"El siguiente JSON no parsea. Arréglalo y responde SOLO JSON válido:\n\n{raw}"},
-        ]
-        fixed = strip_code_fences(llm.invoke(repair).content)
+        pass
+    try:
+        result = json.loads(repair_json(raw))
+        if isinstance(result, dict):
+            metrics.incr("llm_json_repair", kind="local")
+            return result
+    except ValueError:
+        pass
+
+    metrics.incr("llm_json_repair", kind="remote")
+    repair = [
+        {"role": "system", "content": system},
+        {"role": "user", "content": f"El siguiente JSON no parsea. Arréglalo y responde SOLO JSON válido:\n\n{raw}"},
+    ]
+    fixed = strip_code_fences(llm.invoke(repair).content)
+    try:
         return _try_parse(fixed)
+    except ValueError:
+        return json.loads(repair_json(fixed))
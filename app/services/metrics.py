@@ -0,0 +1,87 @@
+# app/services/metrics.py
+"""
+Métricas en memoria del proceso (contadores y observaciones).
+
+Pensado para inspección rápida vía `GET /api/v2/metrics`, no como sustituto
+de un sistema de monitoreo. Las etiquetas se aplanan en el nombre de la serie:
+    incr("llm_calls", node="generate_ast")  ->  "llm_calls{node=generate_ast}"
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, List
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_observations: Dict[str, List[float]] = {}
+
+# Máximo de observaciones guardadas por serie (se descartan las más antiguas)
+MAX_OBSERVATIONS = 1000
+
+
+def _series(name: str, labels: Dict[str, Any]) -> str:
+    if not labels:
+        return name
+    inner = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{inner}}}"
+
+
+def incr(name: str, value: float = 1, **labels: Any) -> None:
+    """Incrementa un contador."""
+    key = _series(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    """Registra una observación (latencia, tokens...)."""
+    key = _series(name, labels)
+    with _lock:
+        values = _observations.setdefault(key, [])
+        values.append(value)
+        if len(values) > MAX_OBSERVATIONS:
+            del values[: len(values) - MAX_OBSERVATIONS]
+
+
+def get_observations(name: str, **labels: Any) -> List[float]:
+    """Copia de las observaciones de una serie."""
+    with _lock:
+        return list(_observations.get(_series(name, labels), []))
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    count = len(ordered)
+
+    def pct(p: float) -> float:
+        return ordered[min(count - 1, int(p * count))]
+
+    return {
+        "count": count,
+        "sum": sum(ordered),
+        "mean": sum(ordered) / count,
+        "p50": pct(0.50),
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+        "max": ordered[-1],
+    }
+
+
+def snapshot() -> Dict[str, Any]:
+    """Estado actual de todas las métricas."""
+    with _lock:
+        counters = dict(_counters)
+        observations = {k: list(v) for k, v in _observations.items() if v}
+    return {
+        "counters": counters,
+        "observations": {k: _summary(v) for k, v in observations.items()},
+    }
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _observations.clear()
+
+
+__all__ = ["incr", "observe", "get_observations", "snapshot", "reset"]
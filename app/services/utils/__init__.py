@@ -8,6 +8,7 @@ from app.services.utils.normalization import (
     balance_begin_end,
     quick_normalize,
 )
+from app.services.utils.json_repair import repair_json, parse_json_lenient
 
 __all__ = [
     "normalize_arrows",
@@ -15,4 +16,6 @@ __all__ = [
     "ensure_final_newline",
     "balance_begin_end",
     "quick_normalize",
+    "repair_json",
+    "parse_json_lenient",
 ]
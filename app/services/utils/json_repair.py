@@ -0,0 +1,137 @@
+# app/services/utils/json_repair.py
+"""
+Reparación local de JSON mal formado devuelto por el LLM.
+
+Corrige los defectos más comunes sin pedir otra respuesta al modelo:
+    - Bloques ```json ... ``` en cualquier parte del texto y texto alrededor
+    - Comillas simples en claves y valores, claves sin comillas
+    - Comas finales antes de } o ]
+    - Literales de Python (True, False, None)
+    - Strings truncados y llaves/corchetes sin cerrar (respuesta cortada)
+"""
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+_FENCE = re.compile(r"```[a-zA-Z]*\s*\n?(.*?)(?:```|$)", re.S)
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def _extract(text: str) -> str:
+    """Contenido del primer bloque de código (si hay) desde el primer { o [."""
+    t = (text or "").strip()
+    match = _FENCE.search(t)
+    if match and ("{" in match.group(1) or "[" in match.group(1)):
+        t = match.group(1)
+    starts = [i for i in (t.find("{"), t.find("[")) if i != -1]
+    return t[min(starts):] if starts else t
+
+
+def _close(out: List[str], stack: List[str], in_string: bool) -> str:
+    body = "".join(out)
+    if in_string:
+        if body.endswith("\\"):
+            body = body[:-1]
+        body += '"'
+    body = body.rstrip()
+    if body.endswith(","):
+        body = body[:-1]
+    elif body.endswith(":"):
+        body += "null"
+    return body + "".join("}" if c == "{" else "]" for c in reversed(stack))
+
+
+def repair_json(text: str) -> str:
+    """
+    Retorna una versión reparada de `text` que debería parsear con json.loads.
+    No garantiza validez: el llamador debe intentar parsear el resultado.
+    """
+    src = _extract(text)
+    out: List[str] = []
+    stack: List[str] = []
+    quote: Optional[str] = None
+    # Posición en `out` y estado de la pila tras cada coma fuera de strings,
+    # para poder descartar un último miembro incompleto
+    commas: List[Tuple[int, List[str]]] = []
+    i = 0
+    while i < len(src):
+        ch = src[i]
+        if quote:
+            if ch == "\\" and i + 1 < len(src):
+                nxt = src[i + 1]
+                # \' no es un escape válido en JSON
+                out.append("'" if nxt == "'" else ch + nxt)
+                i += 2
+                continue
+            if ch == quote:
+                out.append('"')
+                quote = None
+            elif ch == '"':
+                out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            else:
+                out.append(ch)
+        elif ch in "\"'":
+            quote = ch
+            out.append('"')
+        elif ch in "{[":
+            stack.append(ch)
+            out.append(ch)
+        elif ch in "}]":
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            if stack:
+                stack.pop()
+                out.append(ch)
+            if not stack:
+                # Fin del valor raíz: se ignora lo que siga
+                return "".join(out)
+        elif ch == ",":
+            out.append(ch)
+            commas.append((len(out) - 1, list(stack)))
+        elif ch.isalpha():
+            j = i
+            while j < len(src) and (src[j].isalnum() or src[j] == "_"):
+                j += 1
+            word = src[i:j]
+            if src[j:].lstrip().startswith(":"):
+                # Clave sin comillas
+                word = f'"{word}"'
+            out.append(_LITERALS.get(word, word))
+            i = j
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    candidate = _close(out, stack, quote is not None)
+    try:
+        json.loads(candidate)
+        return candidate
+    except ValueError:
+        pass
+    # Respuesta cortada a mitad de un miembro: se descarta desde la última coma
+    for pos, saved in reversed(commas):
+        candidate = _close(out[:pos], saved, False)
+        try:
+            json.loads(candidate)
+            return candidate
+        except ValueError:
+            continue
+    return candidate
+
+
+def parse_json_lenient(text: str) -> Any:
+    """json.loads directo y, si falla, sobre `repair_json(text)`."""
+    try:
+        return json.loads(_extract(text))
+    except ValueError:
+        return json.loads(repair_json(text))
+
+
+__all__ = ["repair_json", "parse_json_lenient"]
@@ -24,6 +24,14 @@ def normalize_arrows(code: str) -> str:
     return code.replace("->", ARROW).replace("←", ARROW)
 
 
+# Palabras clave de la gramática que se escriben en minúscula (CALL va aparte)
+KEYWORDS = (
+    "BEGIN", "END", "FOR", "WHILE", "IF", "ELSE",
+    "REPEAT", "UNTIL", "RETURN", "AND", "OR",
+    "NOT", "DO", "THEN", "PROCEDIMIENTO",
+)
+
+
 def normalize_keywords(code: str) -> str:
     """
     Normaliza palabras clave a minúsculas (excepto CALL que va en mayúsculas).
@@ -37,13 +45,7 @@ def normalize_keywords(code: str) -> str:
     result = code
     
     # Palabras clave a minúscula
-    keywords_to_lower = [
-        "BEGIN", "END", "FOR", "WHILE", "IF", "ELSE",
-        "REPEAT", "UNTIL", "RETURN", "AND", "OR",
-        "NOT", "DO", "THEN", "PROCEDIMIENTO",
-    ]
-    
-    for kw in keywords_to_lower:
+    for kw in KEYWORDS:
         if kw in result:
             result = re.sub(rf"\b{kw}\b", kw.lower(), result)
     
@@ -124,6 +126,7 @@ def quick_normalize(code: str) -> Tuple[str, List[str]]:
 
 
 __all__ = [
+    "KEYWORDS",
     "normalize_arrows",
     "normalize_keywords",
     "ensure_final_newline",
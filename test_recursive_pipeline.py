@@ -1,6 +1,10 @@
 """
 Test del pipeline recursivo con diferentes ecuaciones de recurrencia.
 Prueba algoritmos canónicos: factorial, búsqueda binaria, merge sort, fibonacci, etc.
+
+Ejecución determinística y sin red:
+    LLM_RECORD=1 python test_recursive_pipeline.py        (una vez, con GOOGLE_API_KEY)
+    LLM_PROVIDER=replay python test_recursive_pipeline.py (usa las grabaciones de cassettes/)
 """
 import json
 from typing import Dict, Any
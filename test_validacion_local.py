@@ -0,0 +1,343 @@
+"""
+Pruebas de la validación, la reparación y el análisis locales (sin LLM):
+    - validar_gramatica: ejemplos de SINTAXE.md, programas de ALGORITMOS_TEST.md
+      y errores comunes que deben rechazarse.
+    - reparar_local: código con errores frecuentes que debe quedar válido.
+    - extraer_recurrencia: recurrencias canónicas y casos que no deben
+      producir una (tamaño que crece, dos parámetros de tamaño).
+    - recursive_components: recursión directa, mutua y grafos sin ciclos.
+    - dividir_funciones: límites de cada subrutina con `then begin`/`do begin`.
+
+Ejecución (no requiere red ni API key):
+    python test_validacion_local.py
+"""
+import re
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from app.agents.utils.chunking import dividir_funciones
+from app.agents.utils.generate_ast import recursive_components
+from app.agents.utils.gramatica import validar_gramatica
+from app.agents.utils.recurrencia import extraer_recurrencia
+from app.agents.utils.reparacion import reparar_local
+from app.agents.utils.validacion import validar_local
+
+RAIZ = Path(__file__).resolve().parent
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# GRAMÁTICA
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Construcciones descritas en app/agents/prompts/SINTAXE.md
+SINTAXE_VALIDOS: Dict[str, str] = {
+    "Rangos de arreglo": """f(A[1..n], n)
+begin
+    B[1..n]
+    x 🡨 A[1..j]
+    CALL f(A[1..n], n)
+end""",
+    "Clases, objetos, NULL, length y operadores": """Nodo {valor siguiente}
+recorrer(Nodo cabeza, A[n]..[m], n)
+begin
+    Nodo actual
+    actual 🡨 cabeza ► comentario
+    k 🡨 length(A)
+    while (actual ≠ NULL and T) do
+    begin
+        actual 🡨 actual.siguiente
+    end
+    repeat
+        k 🡨 k - 1
+    until (k ≤ 0)
+    If (n mod 2 = 0) then
+    begin
+        k 🡨 ┌n / 2┐ + └n div 3┘ + 1.5
+    end
+    else
+    begin
+        k 🡨 0
+    end
+    for i 🡨 1 to n do
+    begin
+        CALL recorrer(cabeza, A, i)
+    end
+end""",
+    "Recursión con CALL en expresiones": """fib(n)
+begin
+    if n <= 1 then return n
+    return CALL fib(n-1) + CALL fib(n-2)
+end""",
+}
+
+# (código, fragmento esperado en el primer error)
+INVALIDOS: Dict[str, Tuple[str, str]] = {
+    "Asignación con ←": (
+        "suma(n)\nbegin\n  s ← 0\n  return s\nend",
+        "🡨",
+    ),
+    "Llamada sin CALL en una expresión": (
+        "fib(n)\nbegin\n if n <= 1 then return n\n return fib(n-1) + fib(n-2)\nend",
+        "CALL nombre(...)",
+    ),
+    "Llamada sin CALL como sentencia": (
+        "f(n)\nbegin\n x 🡨 1\n g(x)\nend",
+        "CALL nombre(...)",
+    ),
+    "While sin do": (
+        "f(n)\nbegin\n while (n > 0)\n begin n 🡨 n - 1 end\nend",
+        "do",
+    ),
+    "Falta el end final": (
+        "f(n)\nbegin\n x 🡨 1\n",
+        "fin del código",
+    ),
+}
+
+
+def _programas_algoritmos_test() -> List[str]:
+    texto = (RAIZ / "ALGORITMOS_TEST.md").read_text(encoding="utf-8")
+    return re.findall(r"```(?:\w*)\n(.*?)```", texto, re.S)
+
+
+def test_sintaxe_validos() -> None:
+    for nombre, code in SINTAXE_VALIDOS.items():
+        es_valido, errores = validar_gramatica(code)
+        assert es_valido, f"{nombre}: {errores}"
+
+
+def test_algoritmos_test_validos() -> None:
+    programas = _programas_algoritmos_test()
+    assert programas, "ALGORITMOS_TEST.md sin bloques de código"
+    for i, code in enumerate(programas, 1):
+        es_valido, errores = validar_local(code)
+        assert es_valido, f"programa {i}: {errores}"
+
+
+def test_invalidos() -> None:
+    for nombre, (code, esperado) in INVALIDOS.items():
+        es_valido, errores = validar_gramatica(code)
+        assert not es_valido, f"{nombre}: aceptado"
+        assert esperado in errores[0], f"{nombre}: {errores[0]}"
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# REPARACIÓN LOCAL
+# ═══════════════════════════════════════════════════════════════════════════════
+
+REPARABLES: Dict[str, str] = {
+    "Flechas, mayúsculas y end faltante": (
+        "suma(n)\nbegin\n  s <- 0\n  FOR i := 1 TO n DO\n  begin\n    s ← s + i\n  end\n  return s\n"
+    ),
+    "Asignación con =, while sin do, if sin then y llamada sin CALL": (
+        "f(A[n], n)\nbegin\n x = 1\n while (x < n)\n x 🡨 x * 2\n g(x)\n if x > 3\n begin\n"
+        "  return x\n end\nend\ng(x)\nbegin\n return x\nend"
+    ),
+    "Llamadas recursivas sin CALL en una expresión": (
+        "fib(n)\nbegin\n if n <= 1 then return n\n return fib(n-1) + fib(n - 2)\nend"
+    ),
+}
+
+
+def test_reparar_local() -> None:
+    for nombre, code in REPARABLES.items():
+        reparado, cambios = reparar_local(code)
+        es_valido, errores = validar_local(reparado)
+        assert es_valido, f"{nombre}: {errores}\n{reparado}"
+        assert cambios, f"{nombre}: sin correcciones registradas"
+
+
+def test_reparar_local_agrega_call() -> None:
+    reparado, _ = reparar_local(REPARABLES["Llamadas recursivas sin CALL en una expresión"])
+    assert "CALL fib(n-1)" in reparado and "CALL fib(n - 2)" in reparado, reparado
+
+
+def test_reparar_local_no_toca_codigo_valido() -> None:
+    code = SINTAXE_VALIDOS["Recursión con CALL en expresiones"]
+    reparado, _ = reparar_local(code)
+    # Las normalizaciones pueden añadir la nueva línea final, nada más
+    assert reparado.strip() == code.strip(), reparado
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# RECURRENCIAS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# (código, ecuación esperada, casos base esperados)
+RECURRENCIAS: Dict[str, Tuple[str, str, List[str]]] = {
+    "Factorial": (
+        "factorial(n)\nbegin\n if n <= 1 then return 1\n return n * CALL factorial(n-1)\nend",
+        "T(n) = T(n-1) + 1",
+        ["T(1) = Θ(1)"],
+    ),
+    "Búsqueda binaria": (
+        """busquedaBinaria(A, x, low, high)
+begin
+    if low > high then return -1
+    mid 🡨 (low + high) / 2
+    if A[mid] = x then return mid
+    else if A[mid] > x then return CALL busquedaBinaria(A, x, low, mid - 1)
+    else return CALL busquedaBinaria(A, x, mid + 1, high)
+end""",
+        "T(n) = T(n/2) + 1",
+        ["T(1) = Θ(1)"],
+    ),
+    "Merge sort": (
+        """mergeSort(A[n], p, r)
+begin
+    if p < r then
+    begin
+        q 🡨 └(p + r) / 2┘
+        CALL mergeSort(A, p, q)
+        CALL mergeSort(A, q+1, r)
+        CALL merge(A, p, q, r)
+    end
+end
+merge(A[n], p, q, r)
+begin
+    for i 🡨 p to r do
+    begin
+        A[i] 🡨 A[i]
+    end
+end""",
+        "T(n) = 2T(n/2) + n",
+        ["T(1) = Θ(1)"],
+    ),
+    "Fibonacci": (
+        SINTAXE_VALIDOS["Recursión con CALL en expresiones"],
+        "T(n) = T(n-1) + T(n-2) + 1",
+        ["T(0) = Θ(1)", "T(1) = Θ(1)"],
+    ),
+    "Hanoi": (
+        "hanoi(n, a, b, c)\nbegin\n if n = 0 then return 0\n CALL hanoi(n-1, a, c, b)\n"
+        " CALL hanoi(n-1, c, b, a)\nend",
+        "T(n) = 2T(n-1) + 1",
+        ["T(0) = Θ(1)"],
+    ),
+    "Contador que no es tamaño": (
+        "gen(n, nivel)\nbegin\n if n = 0 then return 0\n CALL gen(n - 1, nivel + 1)\n"
+        " CALL gen(n - 1, nivel + 1)\nend",
+        "T(n) = 2T(n-1) + 1",
+        ["T(0) = Θ(1)"],
+    ),
+    "Acumulador": (
+        "f(n, acc)\nbegin\n if n = 0 then return acc\n return CALL f(n-1, acc+1)\nend",
+        "T(n) = T(n-1) + 1",
+        ["T(0) = Θ(1)"],
+    ),
+}
+
+# Sin recurrencia local: se deja al LLM
+SIN_RECURRENCIA: Dict[str, str] = {
+    "Tamaño que crece": "f(n)\nbegin\n if n >= 100 then return 0\n return CALL f(n+1)\nend",
+    "Dos parámetros de tamaño (Ackermann)": (
+        "ack(m, n)\nbegin\n if m = 0 then return n\n if n = 0 then return CALL ack(m-1, 1)\n"
+        " return CALL ack(m, n-1)\nend"
+    ),
+}
+
+
+def test_recurrencias_canonicas() -> None:
+    for nombre, (code, ecuacion, base) in RECURRENCIAS.items():
+        recurrencia = extraer_recurrencia(code)
+        assert recurrencia is not None, f"{nombre}: sin recurrencia"
+        assert recurrencia["recurrence_equation"] == ecuacion, f"{nombre}: {recurrencia['recurrence_equation']}"
+        assert recurrencia["base_cases"] == base, f"{nombre}: {recurrencia['base_cases']}"
+
+
+def test_sin_recurrencia() -> None:
+    for nombre, code in SIN_RECURRENCIA.items():
+        recurrencia = extraer_recurrencia(code)
+        assert recurrencia is None, f"{nombre}: {recurrencia and recurrencia['recurrence_equation']}"
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# COMPONENTES RECURSIVAS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _normalizar(componentes: List[List[str]]) -> List[List[str]]:
+    return sorted(sorted(c) for c in componentes)
+
+
+def test_recursive_components() -> None:
+    casos: List[Tuple[Dict[str, List[str]], List[List[str]]]] = [
+        ({"fact": ["fact"]}, [["fact"]]),
+        ({"par": ["impar"], "impar": ["par"], "main": ["par"]}, [["impar", "par"]]),
+        ({"mergeSort": ["mergeSort", "merge"], "merge": []}, [["mergeSort"]]),
+        ({"a": ["b"], "b": ["c"], "c": []}, []),
+        ({}, []),
+    ]
+    for grafo, esperado in casos:
+        assert _normalizar(recursive_components(grafo)) == esperado, grafo
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# DIVISIÓN POR SUBRUTINAS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+BLOQUES_EN_LINEA = """f(n)
+begin
+    if (n <= 1) then begin
+        return 1
+    end
+    return CALL g(n-1)
+end
+g(n) begin
+    for i 🡨 1 to n do begin
+        x 🡨 i
+    end
+    if (x > 0) then begin
+        x 🡨 0
+    end
+    else begin
+        x 🡨 1
+    end
+    return x
+end"""
+
+
+def test_dividir_funciones_bloques_en_linea() -> None:
+    funciones = dividir_funciones(BLOQUES_EN_LINEA)
+    assert [f["nombre"] for f in funciones] == ["f", "g"], [f["nombre"] for f in funciones]
+    f, g = funciones
+    assert f["codigo"].rstrip().endswith("return CALL g(n-1)\nend"), f["codigo"]
+    assert f["llamadas"] == ["g"], f["llamadas"]
+    assert g["codigo"].rstrip().endswith("return x\nend"), g["codigo"]
+    assert g["firma"] == "g(n)", g["firma"]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# EJECUCIÓN
+# ═══════════════════════════════════════════════════════════════════════════════
+
+TESTS: List[Callable[[], Any]] = [
+    test_sintaxe_validos,
+    test_algoritmos_test_validos,
+    test_invalidos,
+    test_reparar_local,
+    test_reparar_local_agrega_call,
+    test_reparar_local_no_toca_codigo_valido,
+    test_recurrencias_canonicas,
+    test_sin_recurrencia,
+    test_recursive_components,
+    test_dividir_funciones_bloques_en_linea,
+]
+
+
+def run_all_tests() -> bool:
+    fallos = 0
+    for test in TESTS:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            fallos += 1
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{len(TESTS) - fallos}/{len(TESTS)} pruebas exitosas")
+    return fallos == 0
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(0 if run_all_tests() else 1)